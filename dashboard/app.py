@@ -4,12 +4,18 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from decimal import Decimal
 import subprocess
 import json
 import os
 import requests
 
+from dynamo_reader import (
+    add_to_sketch, estimate_distinct, merge_sketches, new_sketch, query_instance_history,
+    raw_scan_days, read_rollups, read_table, summarize_rollups
+)
+from frames import ADVANCED_SCHEMA, COST_SCHEMA, SCAN_SCHEMA, items_to_frame, parse_timestamps
+from history_cache import load_history
+
 # Page config
 st.set_page_config(
     page_title="AWS Cost Optimizer",
@@ -22,16 +28,17 @@ st.set_page_config(
 def get_dynamodb():
     return boto3.resource('dynamodb')
 
+# Low-level client for bulk reads - items are decoded straight into columns
+@st.cache_resource
+def get_dynamodb_client():
+    return boto3.client('dynamodb')
+
 dynamodb = get_dynamodb()
+dynamodb_client = get_dynamodb_client()
 scans_table = dynamodb.Table('CostOptimizerScans')
 costs_table = dynamodb.Table('CostAnalysisHistory')
 advanced_scans_table = dynamodb.Table('AdvancedResourceScans')
-# Decimal to float
-def decimal_to_float(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
-
+rollups_table = dynamodb.Table('CostOptimizerRollups')
 # AI Query Function
 def query_ollama(question, data_context):
     """Query Ollama with dashboard data context - works in Docker and locally"""
@@ -102,80 +109,131 @@ elif date_range == "Last 30 Days":
 else:
     days_back = 365
 
-# Fetch scan data
+# Instance details show raw scans, so they cover a short recent window
+detail_days = st.sidebar.selectbox(
+    "Instance Detail Window",
+    [1, 3, 7],
+    format_func=lambda d: "Today" if d == 1 else f"Last {d} Days"
+)
+
+# Columns used by the scan views - only these are read from the local cache
+SCAN_COLUMNS = [
+    'scan_date', 'scan_timestamp', 'scan_hour', 'account_id', 'region',
+    'instance_id', 'instance_name', 'instance_type', 'instance_state',
+    'avg_cpu', 'is_idle'
+]
+
+# Fetch scan data for the given days - closed days come from the local
+# Parquet cache, only today and yesterday are re-queried from DynamoDB
 @st.cache_data(ttl=300)
-def get_scan_data(days_back):
+def get_scan_data(days):
+    # Consecutive days are loaded as one range
+    ranges = []
+    for day in sorted(datetime.strptime(d, '%Y-%m-%d').date() for d in days):
+        if ranges and ranges[-1][1] == day - timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    
+    frames = [
+        load_history(scans_table, start_date, end_date, columns=SCAN_COLUMNS, schema=SCAN_SCHEMA, client=dynamodb_client)
+        for start_date, end_date in ranges
+    ]
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# Fetch daily rollups written by the scanner - one row per account/region and
+# day instead of every scan. Also returns the days whose raw scans are still
+# needed: days without rollups and the part of a day before rollups began.
+@st.cache_data(ttl=300)
+def get_rollup_data(days_back):
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=days_back)
     
-    all_scans = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        try:
-            response = scans_table.query(
-                KeyConditionExpression='scan_date = :date',
-                ExpressionAttributeValues={':date': str(current_date)}
-            )
-            all_scans.extend(response['Items'])
-        except:
-            pass
-        current_date += timedelta(days=1)
-    
-    return all_scans
+    # The day before the window shows whether the window's first day was fully rolled up
+    rows = read_rollups(rollups_table, start_date - timedelta(days=1), end_date)
+    in_window = [row for row in rows if row['rollup_date'] >= str(start_date)]
+    return summarize_rollups(in_window), raw_scan_days(rows, start_date, end_date)
+
+# Every day of the window, none of them rolled up
+def all_days(days_back):
+    end_date = datetime.utcnow().date()
+    return {str(end_date - timedelta(days=offset)): {} for offset in range(days_back, -1, -1)}
 
-# Fetch cost data
+# Fetch cost data (parallel segmented scan over every page)
 @st.cache_data(ttl=300)
 def get_cost_data():
-    try:
-        response = costs_table.scan()
-        return response['Items']
-    except:
-        return []
+    return read_table(costs_table)
+
+# Fetch one instance's scan history (single query on the instance history index)
+@st.cache_data(ttl=300)
+def get_instance_history(instance_id, days):
+    return query_instance_history(scans_table, instance_id, days)
 
-# Fetch advanced scan data
+# Fetch advanced scan data through the same local cache
 @st.cache_data(ttl=300)
 def get_advanced_scan_data(days_back):
-    try:
-        end_date = datetime.utcnow().date()
-        start_date = end_date - timedelta(days=days_back)
-        
-        all_findings = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            try:
-                response = advanced_scans_table.query(
-                    KeyConditionExpression='scan_date = :date',
-                    ExpressionAttributeValues={':date': str(current_date)}
-                )
-                all_findings.extend(response['Items'])
-            except:
-                pass
-            current_date += timedelta(days=1)
-        
-        return all_findings
-    except:
-        return []
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=days_back)
+    
+    return load_history(advanced_scans_table, start_date, end_date, schema=ADVANCED_SCHEMA, client=dynamodb_client)
 
 # Load data
 with st.spinner("Loading data..."):
-    scans = get_scan_data(days_back)
-    costs = get_cost_data()
-
-# Convert to DataFrames
-if scans:
-    df_scans = pd.DataFrame(scans)
-    df_scans['avg_cpu'] = df_scans['avg_cpu'].apply(decimal_to_float)
-    df_scans['scan_datetime'] = pd.to_datetime(df_scans['scan_timestamp'])
-else:
-    df_scans = pd.DataFrame()
+    try:
+        rollup_daily, raw_days = get_rollup_data(days_back)
+    except Exception as e:
+        st.warning(f"Rollups unavailable, computing totals from scan data: {str(e)}")
+        rollup_daily, raw_days = {}, all_days(days_back)
+    try:
+        df_unrolled = get_scan_data(tuple(raw_days))
+    except Exception as e:
+        st.error(f"Failed to load scan data: {str(e)}")
+        df_unrolled = pd.DataFrame()
+    try:
+        costs = get_cost_data()
+    except Exception as e:
+        st.error(f"Failed to load cost data: {str(e)}")
+        costs = []
+
+# Raw scans only count where no rollup covers them
+if not df_unrolled.empty:
+    covered = pd.Series(False, index=df_unrolled.index)
+    for day, first_scans in raw_days.items():
+        for (account_id, region), first_scan in first_scans.items():
+            covered |= (
+                (df_unrolled['scan_date'] == day)
+                & (df_unrolled['account_id'].astype('string') == account_id)
+                & (df_unrolled['region'].astype('string') == region)
+                & (df_unrolled['scan_timestamp'] >= first_scan)
+            )
+    df_unrolled = df_unrolled[~covered]
+
+# Daily totals - rollups where they exist, raw scans for what they do not cover
+daily_rows = [
+    {'scan_date': day, 'scan_count': t['scan_count'], 'idle_count': t['idle_count'], 'cpu_sum': t['cpu_sum']}
+    for day, t in rollup_daily.items()
+]
+instance_sketch = new_sketch()
+for totals in rollup_daily.values():
+    merge_sketches(instance_sketch, totals['sketch'])
+if not df_unrolled.empty:
+    for day, group in df_unrolled.groupby('scan_date', observed=True):
+        daily_rows.append({
+            'scan_date': day,
+            'scan_count': len(group),
+            'idle_count': int(group['is_idle'].fillna(False).sum()),
+            'cpu_sum': float(group['avg_cpu'].sum())
+        })
+    add_to_sketch(instance_sketch, df_unrolled['instance_id'].dropna().unique())
+df_daily = pd.DataFrame(daily_rows, columns=['scan_date', 'scan_count', 'idle_count', 'cpu_sum'])
+df_daily = df_daily.groupby('scan_date', as_index=False).sum().sort_values('scan_date')
+total_scans = int(df_daily['scan_count'].sum())
+total_idle = int(df_daily['idle_count'].sum())
+unique_instances = estimate_distinct(instance_sketch)
 
 if costs:
-    df_costs = pd.DataFrame(costs)
-    df_costs['total_cost'] = df_costs['total_cost'].apply(decimal_to_float)
-    df_costs['potential_savings'] = df_costs['potential_savings'].apply(decimal_to_float)
-    df_costs['analysis_date'] = pd.to_datetime(df_costs['analysis_date'])
+    df_costs = items_to_frame(costs, COST_SCHEMA)
 else:
     df_costs = pd.DataFrame()
 
@@ -183,24 +241,15 @@ else:
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    if not df_scans.empty:
-        total_scans = len(df_scans)
-        st.metric("Total Scans", total_scans)
-    else:
-        st.metric("Total Scans", 0)
+    st.metric("Total Scans", total_scans)
 
 with col2:
-    if not df_scans.empty:
-        unique_instances = df_scans['instance_id'].nunique()
-        st.metric("Unique Instances", unique_instances)
-    else:
-        st.metric("Unique Instances", 0)
+    st.metric("Unique Instances (approx.)", f"~{unique_instances}", help="HyperLogLog estimate from the daily rollups' instance sketches, within about 2%")
 
 with col3:
-    if not df_scans.empty:
-        idle_count = df_scans['is_idle'].sum()
-        idle_pct = (idle_count/len(df_scans)*100)
-        st.metric("Idle Instances Found", idle_count, delta=f"{idle_pct:.1f}%")
+    if total_scans:
+        idle_pct = (total_idle/total_scans*100)
+        st.metric("Idle Instances Found", total_idle, delta=f"{idle_pct:.1f}%")
     else:
         st.metric("Idle Instances Found", 0)
 
@@ -223,14 +272,14 @@ else:
     st.caption("Running locally")
 
 # Create data context for AI
-if not df_scans.empty:
+if total_scans:
     savings_amount = df_costs['potential_savings'].sum() if not df_costs.empty else 0
     data_context = f"""
-Total Scans: {len(df_scans)}
-Unique Instances: {df_scans['instance_id'].nunique()}
-Idle Rate: {(df_scans['is_idle'].sum()/len(df_scans)*100):.1f}%
+Total Scans: {total_scans}
+Unique Instances (approximate): ~{unique_instances}
+Idle Rate: {(total_idle/total_scans*100):.1f}%
 Potential Savings: ${savings_amount:.2f}
-Average CPU: {df_scans['avg_cpu'].mean():.2f}%
+Average CPU: {(df_daily['cpu_sum'].sum()/total_scans):.2f}%
 """
 else:
     data_context = "No scan data available yet."
@@ -269,12 +318,9 @@ col_left, col_right = st.columns(2)
 
 with col_left:
     st.subheader("Scan Activity Over Time")
-    if not df_scans.empty:
-        # Group by date and count scans
-        scans_per_day = df_scans.groupby('scan_date').size().reset_index(name='scan_count')
-        
+    if not df_daily.empty:
         fig = px.bar(
-            scans_per_day,
+            df_daily,
             x='scan_date',
             y='scan_count',
             title='Daily Scan Count',
@@ -304,7 +350,17 @@ with col_right:
 st.markdown("---")
 st.subheader("Instance Details")
 
+with st.spinner("Loading instance details..."):
+    try:
+        df_scans = get_scan_data(tuple(all_days(detail_days - 1)))
+    except Exception as e:
+        st.error(f"Failed to load scan data: {str(e)}")
+        df_scans = pd.DataFrame()
+
 if not df_scans.empty:
+    df_scans = df_scans.copy()
+    df_scans['scan_datetime'] = parse_timestamps(df_scans['scan_timestamp'])
+    
     # Filter controls
     col1, col2, col3 = st.columns(3)
     
@@ -378,6 +434,39 @@ if not df_scans.empty:
     fig.add_vline(x=5, line_dash="dash", line_color="red", annotation_text="Idle Threshold (5%)")
     st.plotly_chart(fig, use_container_width=True)
     
+    # Per-instance drill-down
+    st.subheader("Instance History")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        selected_instance = st.selectbox(
+            "Instance",
+            sorted(df_scans['instance_id'].unique())
+        )
+    
+    with col2:
+        history_days = st.selectbox("History Window", [30, 90, 365], format_func=lambda d: f"Last {d} Days")
+    
+    history = get_instance_history(selected_instance, history_days)
+    
+    if history:
+        df_history = items_to_frame(history, SCAN_SCHEMA)
+        df_history['scan_datetime'] = parse_timestamps(df_history['scan_timestamp'])
+        
+        fig = px.line(
+            df_history,
+            x='scan_datetime',
+            y='avg_cpu',
+            title=f'CPU History for {selected_instance}',
+            labels={'scan_datetime': 'Scan Time', 'avg_cpu': 'Average CPU (%)'},
+            markers=True
+        )
+        fig.add_hline(y=5, line_dash="dash", line_color="red", annotation_text="Idle Threshold (5%)")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No history found for this instance.")
+    
 else:
     st.info("No scan data available. Your scanner will collect data every 6 hours automatically.")
 
@@ -386,11 +475,14 @@ st.markdown("---")
 st.subheader("Advanced Resource Findings")
 
 with st.spinner("Loading advanced scan data..."):
-    advanced_findings = get_advanced_scan_data(days_back)
+    try:
+        df_advanced = get_advanced_scan_data(days_back)
+    except Exception as e:
+        st.error(f"Failed to load advanced scan data: {str(e)}")
+        df_advanced = pd.DataFrame()
 
-if advanced_findings:
-    # Convert to DataFrame
-    df_advanced = pd.DataFrame(advanced_findings)
+if not df_advanced.empty:
+    df_advanced = df_advanced.copy()
     
     # Summary metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -405,7 +497,6 @@ if advanced_findings:
     
     with col3:
         if 'estimated_monthly_cost' in df_advanced.columns:
-            df_advanced['estimated_monthly_cost'] = df_advanced['estimated_monthly_cost'].apply(decimal_to_float)
             total_potential_savings = df_advanced['estimated_monthly_cost'].sum()
             st.metric("Potential Monthly Savings", f"${total_potential_savings:.2f}")
         else:
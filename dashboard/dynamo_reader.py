@@ -0,0 +1,320 @@
+"""
+Read helpers for the cost optimizer DynamoDB tables.
+Shared by the dashboard and the scripts in scripts/.
+"""
+import hashlib
+import math
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from boto3.dynamodb.conditions import Key
+
+# GSI on CostOptimizerScans keyed by instance_id + scan_timestamp
+INSTANCE_HISTORY_INDEX = 'InstanceHistoryIndex'
+
+# Concurrent per-day queries in a date-range read
+DEFAULT_RANGE_WORKERS = 8
+
+# Parallel Scan segments for full-table reads
+DEFAULT_SCAN_SEGMENTS = 4
+
+# Rollup rows maintained by the EC2 scanner (see lambda/scanner/rollups.py)
+ROLLUP_DAY_PREFIX = 'DAY#'
+ROLLUP_INSTANCES_PREFIX = 'INSTANCES#'
+
+# HyperLogLog precision of the rollups' instance_sketch - must match rollups.SKETCH_PRECISION
+SKETCH_PRECISION = 11
+
+_DONE = object()
+
+
+def query_instance_history(table, instance_id: str, days: int = 30) -> List[Dict]:
+    """
+    Get an instance's scan records for the last `days` days, oldest first.
+    Uses one paginated Query on the instance history index instead of one
+    query per day.
+    """
+    start_timestamp = (datetime.utcnow() - timedelta(days=days)).isoformat()
+
+    query_kwargs = {
+        'IndexName': INSTANCE_HISTORY_INDEX,
+        'KeyConditionExpression': Key('instance_id').eq(instance_id) & Key('scan_timestamp').gte(start_timestamp)
+    }
+
+    items = []
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response['Items'])
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return items
+
+
+def iter_date_range(table, start_date: date, end_date: date, key_name: str = 'scan_date', max_workers: int = DEFAULT_RANGE_WORKERS, sort_key_condition=None, **query_kwargs) -> Iterator[List[Dict]]:
+    """
+    Stream every item whose date partition key lies in [start_date, end_date].
+    Runs one query per day on a bounded thread pool, follows
+    LastEvaluatedKey, and yields pages of items as they arrive (in no
+    particular order). sort_key_condition (e.g. Key('sk').begins_with(...))
+    narrows every day's query; extra keyword arguments such as
+    ProjectionExpression are passed to every query. Query errors are raised
+    to the caller.
+    """
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(str(current_date))
+        current_date += timedelta(days=1)
+
+    return iter_days(table, days, key_name, max_workers, sort_key_condition, **query_kwargs)
+
+
+def iter_days(table, days: List[str], key_name: str = 'scan_date', max_workers: int = DEFAULT_RANGE_WORKERS, sort_key_condition=None, **query_kwargs) -> Iterator[List[Dict]]:
+    """Like iter_date_range, for an explicit (possibly non-contiguous) list of days"""
+    requests = []
+    for day in days:
+        key_condition = Key(key_name).eq(day)
+        if sort_key_condition is not None:
+            key_condition = key_condition & sort_key_condition
+        requests.append(dict(query_kwargs, TableName=table.name, KeyConditionExpression=key_condition))
+
+    # The resource's client is thread-safe and still converts Python types
+    return iter_query_pages(table.meta.client, requests, max_workers)
+
+
+def iter_query_pages(client, requests: List[Dict], max_workers: int = DEFAULT_RANGE_WORKERS) -> Iterator[List[Dict]]:
+    """
+    Run many Query requests concurrently on a bounded thread pool and yield
+    each response page's Items as it arrives, following LastEvaluatedKey.
+    Works with a resource's client (Python types) or a plain low-level
+    client (wire-format attribute maps). Errors are raised to the caller.
+    """
+    return _iter_pages(client.query, requests, max_workers)
+
+
+def iter_scan_pages(client, table_name: str, total_segments: int = DEFAULT_SCAN_SEGMENTS, max_workers: int = None, **scan_kwargs) -> Iterator[List[Dict]]:
+    """
+    Stream a whole table with a parallel Scan: one Segment/TotalSegments
+    request per segment, each paginated on its own worker thread. Pages are
+    yielded as they arrive (in no particular order). Like iter_query_pages,
+    client may be a resource's client or a low-level client.
+    """
+    requests = [
+        dict(scan_kwargs, TableName=table_name, Segment=segment, TotalSegments=total_segments)
+        for segment in range(total_segments)
+    ]
+    return _iter_pages(client.scan, requests, max_workers or total_segments)
+
+
+def _iter_pages(operation, requests: List[Dict], max_workers: int) -> Iterator[List[Dict]]:
+    """Paginate each request of a Query/Scan operation concurrently, yielding pages"""
+    if not requests:
+        return
+
+    pages = queue.Queue(maxsize=max_workers * 4)
+    stop = threading.Event()
+
+    def put(value):
+        # Give up if the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run_request(request):
+        try:
+            kwargs = dict(request)
+            while not stop.is_set():
+                response = operation(**kwargs)
+                put(response['Items'])
+
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(requests))))
+    try:
+        for request in requests:
+            executor.submit(run_request, request)
+
+        remaining = len(requests)
+        while remaining:
+            value = pages.get()
+            if value is _DONE:
+                remaining -= 1
+            elif isinstance(value, Exception):
+                raise value
+            else:
+                yield value
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_date_range(table, start_date: date, end_date: date, **kwargs) -> List[Dict]:
+    """All items in the date range as one list (see iter_date_range)"""
+    items = []
+    for page in iter_date_range(table, start_date, end_date, **kwargs):
+        items.extend(page)
+    return items
+
+
+def parallel_scan(table, total_segments: int = DEFAULT_SCAN_SEGMENTS, max_workers: int = None, **scan_kwargs) -> Iterator[List[Dict]]:
+    """Stream every item of a resource Table in pages with a parallel Scan (see iter_scan_pages)"""
+    return iter_scan_pages(table.meta.client, table.name, total_segments, max_workers, **scan_kwargs)
+
+
+def read_table(table, **kwargs) -> List[Dict]:
+    """Every item of the table as one list, read with a parallel Scan"""
+    items = []
+    for page in parallel_scan(table, **kwargs):
+        items.extend(page)
+    return items
+
+
+def read_rollups(table, start_date: date, end_date: date, prefix: str = ROLLUP_DAY_PREFIX, **kwargs) -> List[Dict]:
+    """Day rollup rows (one per account/region and date) for the date range"""
+    return read_date_range(
+        table, start_date, end_date,
+        key_name='rollup_date',
+        sort_key_condition=Key('rollup_key').begins_with(prefix),
+        **kwargs
+    )
+
+
+def summarize_rollups(day_rows: List[Dict]) -> Dict[str, Dict]:
+    """
+    Combine day rollup rows into per-date totals:
+    {date: {'scan_count', 'idle_count', 'cpu_sum', 'cpu_min', 'cpu_max', 'sketch'}}
+    where sketch is the day's merged instance HyperLogLog registers.
+    """
+    totals = {}
+    for row in day_rows:
+        day = totals.setdefault(row['rollup_date'], {
+            'scan_count': 0, 'idle_count': 0, 'cpu_sum': 0.0, 'cpu_min': None, 'cpu_max': None,
+            'sketch': new_sketch()
+        })
+        day['scan_count'] += int(row.get('scan_count', 0))
+        day['idle_count'] += int(row.get('idle_count', 0))
+        day['cpu_sum'] += float(row.get('cpu_sum', 0))
+        for bound, pick in (('cpu_min', min), ('cpu_max', max)):
+            if row.get(bound) is not None:
+                value = float(row[bound])
+                day[bound] = value if day[bound] is None else pick(day[bound], value)
+        merge_sketch_entries(day['sketch'], row.get('instance_sketch', ()))
+    return totals
+
+
+def summarize_instance_rollups(instance_rows: List[Dict]) -> Dict[str, Dict]:
+    """
+    Combine per-instance rollup rows (INSTANCES#...) into per-instance totals:
+    {instance_id: {'name', 'type', 'scan_count', 'idle_count', 'cpu_sum', 'cpu_min', 'cpu_max'}}
+    """
+    totals = {}
+    for row in instance_rows:
+        for instance_id, (scans, idle, cpu_sum, cpu_min, cpu_max, name, instance_type) in row.get('instances', {}).items():
+            instance = totals.get(instance_id)
+            if instance is None:
+                totals[instance_id] = {
+                    'name': name, 'type': instance_type, 'scan_count': int(scans), 'idle_count': int(idle),
+                    'cpu_sum': float(cpu_sum), 'cpu_min': float(cpu_min), 'cpu_max': float(cpu_max)
+                }
+                continue
+            instance['scan_count'] += int(scans)
+            instance['idle_count'] += int(idle)
+            instance['cpu_sum'] += float(cpu_sum)
+            instance['cpu_min'] = min(instance['cpu_min'], float(cpu_min))
+            instance['cpu_max'] = max(instance['cpu_max'], float(cpu_max))
+    return totals
+
+
+def is_rolled_up(scan: Dict, first_scans: Dict[Tuple[str, str], str]) -> bool:
+    """Whether a raw scan of a raw_scan_days day is already counted by its account/region's rollup"""
+    first_scan = first_scans.get((scan.get('account_id'), scan.get('region')))
+    return first_scan is not None and scan['scan_timestamp'] >= first_scan
+
+
+def raw_scan_days(day_rows: List[Dict], start_date: date, end_date: date) -> Dict[str, Dict[Tuple[str, str], str]]:
+    """
+    Days in [start_date, end_date] whose raw scans are needed on top of the
+    rollups, mapped to the rolled-up part of the day: {(account, region):
+    first rolled-up scan timestamp}. Raw scans of a listed day count unless
+    their account/region has a rollup from a scan at or before theirs.
+
+    Days without rollups map to {}. A day with rollups is listed when one of
+    its account/regions had no rollup the day before - the day the rollup
+    writer was deployed or a region was added - since scans earlier that
+    day were not rolled up. day_rows (DAY or INSTANCES rows) must include
+    the day before start_date.
+    """
+    rolled = {}
+    for row in day_rows:
+        # Instance rollups have several shard rows per account/region; the first scan covers every shard
+        targets = rolled.setdefault(row['rollup_date'], {})
+        target = (row.get('account_id'), row.get('region'))
+        first_scan = row.get('first_scan', '')
+        targets[target] = min(targets.get(target, first_scan), first_scan)
+
+    days = {}
+    current_date = start_date
+    while current_date <= end_date:
+        day = str(current_date)
+        previous = rolled.get(str(current_date - timedelta(days=1)), {})
+        if day not in rolled:
+            days[day] = {}
+        elif any(target not in previous for target in rolled[day]):
+            days[day] = rolled[day]
+        current_date += timedelta(days=1)
+    return days
+
+
+def new_sketch() -> List[int]:
+    """Empty HyperLogLog registers"""
+    return [0] * (1 << SKETCH_PRECISION)
+
+
+def merge_sketch_entries(registers: List[int], entries: Iterable):
+    """Merge stored register * 64 + rank entries (a rollup's instance_sketch) into registers"""
+    for entry in entries:
+        register, rank = divmod(int(entry), 64)
+        if rank > registers[register]:
+            registers[register] = rank
+
+
+def add_to_sketch(registers: List[int], instance_ids: Iterable[str]):
+    """Add instance ids, hashed exactly like lambda/scanner/rollups.sketch_entries"""
+    width = 64 - SKETCH_PRECISION
+    for instance_id in instance_ids:
+        hashed = int.from_bytes(hashlib.sha1(instance_id.encode('utf-8')).digest()[:8], 'big')
+        register = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > registers[register]:
+            registers[register] = rank
+
+
+def merge_sketches(into: List[int], other: List[int]):
+    """Merge other's registers into into (the union of both sets of ids)"""
+    for register, rank in enumerate(other):
+        if rank > into[register]:
+            into[register] = rank
+
+
+def estimate_distinct(registers: List[int]) -> int:
+    """HyperLogLog estimate, with linear counting for small cardinalities"""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -rank for rank in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
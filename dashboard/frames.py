@@ -0,0 +1,117 @@
+"""
+Typed DataFrame construction for DynamoDB items.
+
+boto3 returns numbers as Decimal, so pd.DataFrame(items) produces object
+columns that then need a per-value .apply(float) and a separate
+pd.to_datetime pass. items_to_frame lets pandas gather only the needed
+columns from the item dicts in one C-level pass, then converts each column
+once, in place, to its final dtype: float32/float64 for numerics, bool for
+flags, categoricals for low-cardinality strings and datetime64 for ISO
+timestamps. The object columns are released as they are replaced.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Column schemas: column -> 'float32' | 'float64' | 'bool' | 'category' | 'datetime' | 'string'
+SCAN_SCHEMA = {
+    'scan_date': 'string',
+    'scan_timestamp': 'string',
+    'scan_hour': 'category',
+    'account_id': 'category',
+    'region': 'category',
+    'instance_id': 'string',
+    'instance_name': 'string',
+    'instance_type': 'category',
+    'instance_state': 'category',
+    'avg_cpu': 'float32',
+    'is_idle': 'bool'
+}
+
+ADVANCED_SCHEMA = {
+    'scan_date': 'string',
+    'scan_timestamp': 'string',
+    'account_id': 'category',
+    'region': 'category',
+    'resource_type': 'category',
+    'resource_id': 'string',
+    'severity': 'category',
+    'issue': 'category',
+    'estimated_monthly_cost': 'float64'
+}
+
+COST_SCHEMA = {
+    'analysis_date': 'datetime',
+    'total_cost': 'float64',
+    'potential_savings': 'float64'
+}
+
+
+def items_to_frame(items: List[Dict], schema: Dict[str, str] = None, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Build a typed DataFrame from DynamoDB items.
+    Columns in schema get that dtype; other columns are inferred (float64
+    for numbers, bool for flags, strings otherwise). columns limits the
+    frame to those attributes. Missing values become NaN / False / <NA>.
+    """
+    schema = schema or {}
+    if columns is None:
+        present = set().union(*items) if items else set()
+        columns = [c for c in schema if c in present] + sorted(present - set(schema))
+
+    df = pd.DataFrame.from_records(items, columns=columns) if items else pd.DataFrame(columns=columns)
+
+    for name in columns:
+        df[name] = to_column(df[name], schema.get(name) or infer_kind(df[name]))
+
+    return df
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """Cast an existing frame's columns (e.g. read from Parquet) to the schema's dtypes"""
+    casts = {name: to_column(df[name], kind) for name, kind in schema.items() if name in df.columns}
+    return df.assign(**casts) if casts else df
+
+
+def to_column(values: pd.Series, kind: str):
+    """One column converted to the given kind"""
+    if kind in ('float32', 'float64'):
+        if values.dtype != object:
+            return values.astype(kind)
+        # Decimal -> float in one pass; missing values are already NaN or None
+        return np.fromiter(
+            (np.nan if v is None else float(v) for v in values.to_numpy(dtype=object)),
+            dtype=kind,
+            count=len(values)
+        )
+    if kind == 'bool':
+        return values.fillna(False).astype(bool)
+    if kind == 'category':
+        return values.astype('category')
+    if kind == 'datetime':
+        return parse_timestamps(values)
+    if kind == 'null':
+        return pd.Series(None, index=values.index, dtype=object)
+    if kind == 'string' and pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        # Stray non-string values (maps, numbers) are stringified so Parquet gets one type
+        return values.map(lambda v: v if v is None or isinstance(v, str) or (isinstance(v, float) and np.isnan(v)) else str(v))
+    return values
+
+
+def infer_kind(values: pd.Series) -> str:
+    """Kind for a column that is not in the schema"""
+    if values.isna().all():
+        # Stays an untyped null column, which unifies with any type in Parquet
+        return 'null'
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'boolean':
+        return 'bool'
+    if inferred in ('decimal', 'integer', 'floating', 'mixed-integer-float'):
+        return 'float64'
+    return 'string'
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """ISO-8601 strings to datetime64 with the format given up front instead of inferred per value"""
+    return pd.to_datetime(values, format='ISO8601')
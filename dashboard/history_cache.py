@@ -0,0 +1,176 @@
+"""
+Local Parquet cache of DynamoDB scan history, partitioned by scan_date.
+
+Each day is stored as <cache dir>/<table>/scan_date=YYYY-MM-DD/part.parquet.
+Days before yesterday are closed and treated as immutable once cached;
+today and yesterday are always re-fetched because scans may still land in
+them. Reads use column projection, so views only load what they display.
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dynamo_reader import iter_days
+from frames import apply_schema, items_to_frame
+from wire_reader import read_days_frame
+
+CACHE_DIR = os.environ.get(
+    'HISTORY_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'aws-cost-optimizer')
+)
+
+# Marks a closed day that had no items, so it is not fetched again
+EMPTY_MARKER = '_EMPTY'
+
+
+def load_history(table, start_date: date, end_date: date, columns: List[str] = None, key_name: str = 'scan_date', schema: Dict[str, str] = None, client=None) -> pd.DataFrame:
+    """
+    History for [start_date, end_date] as a DataFrame.
+    Fetches only days that are open (today, yesterday) or not cached yet,
+    writes them to the cache, then reads the requested columns from Parquet.
+    schema (see frames.py) sets the returned dtypes, e.g. categoricals.
+    With a low-level client (boto3.client('dynamodb')) fetched days are
+    decoded from the wire format straight into columns (see wire_reader.py).
+    """
+    table_dir = os.path.join(CACHE_DIR, table.name)
+    refresh_from = datetime.utcnow().date() - timedelta(days=1)
+
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(current_date)
+        current_date += timedelta(days=1)
+
+    to_fetch = [
+        str(day) for day in days
+        if day >= refresh_from or not _is_cached(_partition_dir(table_dir, key_name, str(day)))
+    ]
+
+    if to_fetch:
+        if client is not None:
+            frames_by_day = _fetch_columns(client, table.name, to_fetch, key_name)
+        else:
+            frames_by_day = _fetch_items(table, to_fetch, key_name)
+
+        for day in to_fetch:
+            _write_partition(_partition_dir(table_dir, key_name, day), frames_by_day.get(day))
+
+    files = [
+        os.path.join(_partition_dir(table_dir, key_name, str(day)), 'part.parquet')
+        for day in days
+    ]
+    files = [f for f in files if os.path.exists(f)]
+
+    if not files:
+        return pd.DataFrame(columns=columns or [])
+
+    # Columns can be missing on some days (e.g. finding-specific fields), and a
+    # column's inferred type can differ between days (e.g. all-null vs float, or
+    # a field written as a number one day and a string the next)
+    arrow_schema = _canonical_schema([pq.read_schema(f) for f in files])
+
+    if columns is not None:
+        columns = [c for c in columns if c in arrow_schema.names]
+        arrow_schema = pa.schema([arrow_schema.field(c) for c in columns])
+
+    table = pa.concat_tables([_read_partition(f, arrow_schema) for f in files])
+    df = table.to_pandas()
+    return apply_schema(df, schema) if schema else df
+
+
+def _canonical_schema(schemas: List[pa.Schema]) -> pa.Schema:
+    """
+    One schema every cached partition can be cast to. A column keeps its type
+    where the days agree (ignoring all-null days); mixed numeric types widen
+    to float64 and any other conflict falls back to string.
+    """
+    types_by_name = {}
+    for schema in schemas:
+        for field in schema:
+            types_by_name.setdefault(field.name, set())
+            if not pa.types.is_null(field.type):
+                types_by_name[field.name].add(field.type)
+
+    fields = []
+    for name, types in types_by_name.items():
+        if not types:
+            arrow_type = pa.null()
+        elif len(types) == 1:
+            arrow_type = next(iter(types))
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+
+    return pa.schema(fields)
+
+
+def _read_partition(path: str, schema: pa.Schema) -> pa.Table:
+    """One cached partition with exactly the given schema's columns and types"""
+    present = set(pq.read_schema(path).names)
+    table = pq.read_table(path, columns=[name for name in schema.names if name in present])
+
+    arrays = []
+    for field in schema:
+        if field.name in present:
+            arrays.append(table.column(field.name).cast(field.type))
+        else:
+            arrays.append(pa.nulls(table.num_rows, type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _fetch_items(table, days: List[str], key_name: str) -> Dict[str, pd.DataFrame]:
+    items_by_day = defaultdict(list)
+    for page in iter_days(table, days, key_name):
+        for item in page:
+            items_by_day[item[key_name]].append(item)
+
+    # Stored with plain inferred types; read casts them to one schema, categoricals are applied on read
+    return {day: items_to_frame(items) for day, items in items_by_day.items()}
+
+
+def _fetch_columns(client, table_name: str, days: List[str], key_name: str) -> Dict[str, pd.DataFrame]:
+    df = read_days_frame(client, table_name, days, key_name=key_name)
+    if df.empty:
+        return {}
+
+    return {day: group.reset_index(drop=True) for day, group in df.groupby(key_name)}
+
+
+def _partition_dir(table_dir: str, key_name: str, day: str) -> str:
+    return os.path.join(table_dir, f"{key_name}={day}")
+
+
+def _is_cached(partition_dir: str) -> bool:
+    return (
+        os.path.exists(os.path.join(partition_dir, 'part.parquet'))
+        or os.path.exists(os.path.join(partition_dir, EMPTY_MARKER))
+    )
+
+
+def _write_partition(partition_dir: str, df: pd.DataFrame = None):
+    os.makedirs(partition_dir, exist_ok=True)
+    part_path = os.path.join(partition_dir, 'part.parquet')
+    marker_path = os.path.join(partition_dir, EMPTY_MARKER)
+
+    if df is None or df.empty:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        open(marker_path, 'w').close()
+        return
+
+    # Write to a temporary file first so readers never see a partial partition
+    tmp_path = f"{part_path}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, part_path)
+
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
@@ -0,0 +1,140 @@
+"""
+Bulk reads on the low-level DynamoDB client, decoded straight into columns.
+
+The resource layer runs every attribute of every item through
+TypeDeserializer, building a Decimal per number and a dict per item,
+before pandas converts them again. For bulk reads this module queries with
+a plain boto3.client('dynamodb'), fetches only the projected attributes and
+decodes the wire-format attribute maps ({'N': '1.5'}, {'S': 'x'},
+{'BOOL': True}) column by column: numbers stay strings until numpy parses a
+whole column at once, strings go straight into string or categorical
+columns.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+from boto3.dynamodb.types import TypeDeserializer
+
+from dynamo_reader import DEFAULT_RANGE_WORKERS, iter_query_pages
+from frames import parse_timestamps
+
+_deserializer = TypeDeserializer()
+
+# Stands in for an attribute an item does not have; it answers every
+# per-type lookup with that type's empty value so fast paths need no None checks
+_MISSING = {'S': None, 'N': 'nan', 'BOOL': False}
+
+
+def read_days_frame(client, table_name: str, days: List[str], columns: List[str] = None, schema: Dict[str, str] = None, key_name: str = 'scan_date', max_workers: int = DEFAULT_RANGE_WORKERS) -> pd.DataFrame:
+    """
+    Every item of the given date partitions as a typed DataFrame.
+    client must be a low-level client (boto3.client('dynamodb')). columns
+    becomes the query's ProjectionExpression; schema (see frames.py) sets
+    column dtypes, other columns are typed from their wire tags.
+    """
+    requests = []
+    for day in days:
+        request = {
+            'TableName': table_name,
+            'KeyConditionExpression': '#pk = :day',
+            'ExpressionAttributeNames': {'#pk': key_name},
+            'ExpressionAttributeValues': {':day': {'S': day}}
+        }
+        if columns:
+            names = {f"#c{index}": name for index, name in enumerate(columns)}
+            request['ProjectionExpression'] = ', '.join(names)
+            request['ExpressionAttributeNames'].update(names)
+        requests.append(request)
+
+    return decode_pages(iter_query_pages(client, requests, max_workers), columns, schema)
+
+
+def read_date_range_frame(client, table_name: str, start_date: date, end_date: date, **kwargs) -> pd.DataFrame:
+    """read_days_frame for every day in [start_date, end_date]"""
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(str(current_date))
+        current_date += timedelta(days=1)
+
+    return read_days_frame(client, table_name, days, **kwargs)
+
+
+def decode_pages(pages: Iterable[List[Dict]], columns: List[str] = None, schema: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Wire-format item pages to a typed DataFrame.
+    Raw attribute values are gathered per column as pages arrive and
+    converted once at the end.
+    """
+    schema = schema or {}
+    raw: Dict[str, List] = {name: [] for name in columns or []}
+    count = 0
+
+    for page in pages:
+        if columns is None:
+            for name in set().union(*page) - raw.keys():
+                # Back-fill rows from pages read before this column appeared
+                raw[name] = [_MISSING] * count
+        for name, values in raw.items():
+            values.extend([item.get(name, _MISSING) for item in page])
+        count += len(page)
+
+    data = {name: decode_column(values, schema.get(name)) for name, values in raw.items()}
+    ordered = [c for c in schema if c in data] + [c for c in data if c not in schema]
+
+    return pd.DataFrame(data, index=pd.RangeIndex(count), columns=ordered)
+
+
+def decode_column(attributes: List[Dict], kind: str = None):
+    """One column of wire-format attribute values as an array of the given kind"""
+    if kind is None:
+        kind = wire_kind(attributes)
+
+    if kind in ('float32', 'float64'):
+        # numpy parses the whole column of number strings in one call
+        try:
+            return np.array([a['N'] for a in attributes], dtype=kind)
+        except (KeyError, ValueError):
+            return np.array([a['N'] if 'N' in a else 'nan' for a in attributes], dtype=kind)
+    if kind == 'bool':
+        return np.array([a.get('BOOL') is True for a in attributes], dtype=bool)
+
+    try:
+        # Fast path - every value is a string or missing
+        values = [a['S'] for a in attributes]
+    except KeyError:
+        values = [scalar(a) for a in attributes]
+
+    if kind == 'category':
+        return pd.Categorical(values)
+    if kind == 'datetime':
+        return parse_timestamps(pd.Series(values, dtype=object)).to_numpy()
+    # Strings (and all-null columns) - pandas picks its default string dtype
+    return np.array(values, dtype=object)
+
+
+def wire_kind(attributes: List[Dict]) -> str:
+    """Column kind from the wire type tags when no schema is given"""
+    tags = {next(iter(a)) for a in attributes if a is not _MISSING and 'NULL' not in a}
+    if not tags:
+        return 'null'
+    if tags == {'N'}:
+        return 'float64'
+    if tags == {'BOOL'}:
+        return 'bool'
+    return 'string'
+
+
+def scalar(attribute: Dict):
+    """String or number string of a scalar attribute; compound types are deserialized and stringified"""
+    if attribute is _MISSING or 'NULL' in attribute:
+        return None
+    if 'S' in attribute:
+        return attribute['S']
+    if 'N' in attribute:
+        return attribute['N']
+    if 'BOOL' in attribute:
+        return str(attribute['BOOL'])
+    return str(_deserializer.deserialize(attribute))
@@ -0,0 +1,429 @@
+"""
+Built-in detectors of the advanced scanner.
+
+Each detector is registered with the engine on import. Thresholds are read
+from the environment once, so they can be tuned per deployment without
+code changes.
+"""
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List
+
+from common.metrics import average, maximum
+from common.pricing import HOURS_PER_MONTH, get_catalog, lambda_cost
+from common.regions import run_in_regions
+from engine import Detector, MetricNeed, ScanData, register
+from s3_inventory import TRANSITION_AGE_DAYS, age_histogram, find_latest_manifests, get_inventory_destination
+from s3_storage import GB, estimate_storage_cost, get_bucket_storage, list_buckets
+
+# RDS signals: one hourly statistic per metric over the last week
+RDS_IDLE_METRICS = {
+    'CPUUtilization': 'Average',
+    'DatabaseConnections': 'Maximum',
+    'ReadIOPS': 'Average',
+    'WriteIOPS': 'Average'
+}
+
+# Lambda metrics are daily sums over the last week
+WEEKS_PER_MONTH = 365 / 12 / 7
+
+# Untagged finding resource type per inventory resource type
+UNTAGGED_RESOURCE_TYPES = {
+    'ec2_instance': 'ec2_untagged',
+    'ebs_volume': 'ebs_untagged',
+    'rds_instance': 'rds_untagged',
+    'rds_cluster': 'rds_cluster_untagged',
+    'lambda_function': 'lambda_untagged'
+}
+
+
+@register
+class UnusedEBSVolumes(Detector):
+    """EBS volumes not attached to any instance"""
+
+    name = 'ebs'
+    title = 'Unused EBS'
+    inventory = ['ebs_volume']
+    resource_types = ['ebs_volume']
+    thresholds = {
+        'high_monthly_cost': float(os.environ.get('EBS_HIGH_MONTHLY_COST', '5'))
+    }
+
+    def select(self, row: Dict) -> bool:
+        return row['state'] == 'available'
+
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        create_time = datetime.fromisoformat(row['created'])
+        age_days = (datetime.utcnow().replace(tzinfo=create_time.tzinfo) - create_time).days
+
+        # Estimate cost from the volume type's per GB-month price
+        size_gb = row['attributes']['size_gb']
+        monthly_cost = estimate_ebs_cost(row['type'], size_gb, data.region)
+
+        return mark_approximate_price({
+            'resource_type': 'ebs_volume',
+            'resource_id': row['resource_id'],
+            'issue': 'unused_volume',
+            'size_gb': Decimal(str(size_gb)),
+            'volume_type': row['type'],
+            'age_days': age_days,
+            'estimated_monthly_cost': Decimal(str(monthly_cost)),
+            'recommendation': f'Delete unused volume (${monthly_cost:.2f}/month) or attach to instance',
+            'severity': 'medium' if monthly_cost < self.thresholds['high_monthly_cost'] else 'high'
+        }, data.region)
+
+
+@register
+class IdleRDSDatabases(Detector):
+    """
+    RDS instances and Aurora clusters with low utilization. Aurora members
+    are judged as part of their cluster. A database is idle when, over the
+    last week, average CPU stays below the threshold, connections never
+    exceed theirs and average read + write IOPS stay below theirs; CPU
+    must have datapoints, the other signals only count when measured.
+    """
+
+    name = 'rds'
+    title = 'Idle RDS'
+    timeout = 120
+    inventory = ['rds']
+    resource_types = ['rds_instance', 'rds_cluster']
+    metrics = [
+        MetricNeed(resource_type, 'AWS/RDS', metric_name, dimension, stat, period=3600, days=7)
+        for resource_type, dimension in (('rds_instance', 'DBInstanceIdentifier'), ('rds_cluster', 'DBClusterIdentifier'))
+        for metric_name, stat in RDS_IDLE_METRICS.items()
+    ]
+    thresholds = {
+        'cpu': float(os.environ.get('RDS_IDLE_CPU', '10')),
+        'connections': float(os.environ.get('RDS_IDLE_CONNECTIONS', '1')),
+        'iops': float(os.environ.get('RDS_IDLE_IOPS', '20')),
+        'high_monthly_cost': float(os.environ.get('RDS_HIGH_MONTHLY_COST', '50'))
+    }
+    conditions = [
+        ('avg_cpu', '<', 'cpu', True),
+        ('peak_connections', '<=', 'connections', False),
+        ('avg_iops', '<', 'iops', False)
+    ]
+
+    def select(self, row: Dict) -> bool:
+        return row['resource_type'] == 'rds_cluster' or not row['attributes'].get('cluster')
+
+    def signals(self, row: Dict, data: ScanData) -> Dict:
+        read_iops = average(self.points(data, row, 'ReadIOPS'))
+        write_iops = average(self.points(data, row, 'WriteIOPS'))
+        return {
+            'avg_cpu': average(self.points(data, row, 'CPUUtilization')),
+            'peak_connections': maximum(self.points(data, row, 'DatabaseConnections')),
+            'avg_iops': None if read_iops is None and write_iops is None else (read_iops or 0.0) + (write_iops or 0.0)
+        }
+
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        engine = row['attributes'].get('engine')
+
+        if row['resource_type'] == 'rds_instance':
+            estimated_cost = estimate_rds_cost(row['type'], data.region, engine or 'mysql')
+            details = {
+                'instance_class': row['type'],
+                'engine': engine or 'unknown'
+            }
+        else:
+            members = data.group('rds', 'rds_instance', 'cluster').get(row['resource_id'], [])
+            estimated_cost = sum(
+                estimate_rds_cost(member['type'], data.region, member['attributes'].get('engine') or engine or '')
+                for member in members
+            )
+            details = {
+                'engine': engine or 'unknown',
+                'member_count': len(members),
+                'instance_classes': ', '.join(sorted({member['type'] for member in members})) or 'serverless'
+            }
+
+        finding = {
+            'resource_type': row['resource_type'],
+            'resource_id': row['resource_id'],
+            'issue': 'idle_database',
+            'avg_cpu': Decimal(str(round(signals['avg_cpu'], 2))),
+            'peak_connections': Decimal(str(signals['peak_connections'] or 0)),
+            'avg_iops': Decimal(str(round(signals['avg_iops'] or 0.0, 2))),
+            'estimated_monthly_cost': Decimal(str(estimated_cost)),
+            'recommendation': f'Consider downsizing or using Aurora Serverless (${estimated_cost:.2f}/month)',
+            'severity': 'high' if estimated_cost > self.thresholds['high_monthly_cost'] else 'medium'
+        }
+        finding.update(details)
+        return mark_approximate_price(finding, data.region)
+
+
+@register
+class ExpensiveLambdaFunctions(Detector):
+    """
+    Lambda functions with low invocations but a noticeable cost, priced
+    from a week of measured GB-seconds.
+    """
+
+    name = 'lambda'
+    title = 'Expensive Lambda'
+    timeout = 120
+    inventory = ['lambda_function']
+    resource_types = ['lambda_function']
+    metrics = [
+        MetricNeed('lambda_function', 'AWS/Lambda', metric_name, 'FunctionName', 'Sum', period=86400, days=7)
+        for metric_name in ('Invocations', 'Duration')
+    ]
+    thresholds = {
+        'invocations_per_week': float(os.environ.get('LAMBDA_LOW_INVOCATIONS_PER_WEEK', '100')),
+        'min_monthly_cost': float(os.environ.get('LAMBDA_MIN_MONTHLY_COST', '1'))
+    }
+    conditions = [
+        ('invocations', '<', 'invocations_per_week', True),
+        ('monthly_cost', '>', 'min_monthly_cost', True)
+    ]
+
+    def signals(self, row: Dict, data: ScanData) -> Dict:
+        invocations = int(sum(value for _, value in self.points(data, row, 'Invocations')))
+        duration_ms = sum(value for _, value in self.points(data, row, 'Duration'))
+        gb_seconds = (duration_ms / 1000) * (row['attributes']['memory_mb'] / 1024)
+        return {
+            'invocations': invocations,
+            'duration_ms': duration_ms,
+            'gb_seconds': gb_seconds,
+            'monthly_cost': lambda_cost(gb_seconds, invocations, row['attributes']['architecture']) * WEEKS_PER_MONTH
+        }
+
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        invocations = signals['invocations']
+        return {
+            'resource_type': 'lambda_function',
+            'resource_id': row['resource_id'],
+            'issue': 'low_utilization',
+            'memory_mb': row['attributes']['memory_mb'],
+            'architecture': row['attributes']['architecture'],
+            'weekly_invocations': invocations,
+            'weekly_gb_seconds': Decimal(str(round(signals['gb_seconds'], 3))),
+            'avg_duration_ms': Decimal(str(round(signals['duration_ms'] / invocations, 1))) if invocations else Decimal('0'),
+            'estimated_monthly_cost': Decimal(str(round(signals['monthly_cost'], 2))),
+            'recommendation': 'Consider removing or reducing memory allocation',
+            'severity': 'low'
+        }
+
+
+@register
+class UntaggedResources(Detector):
+    """
+    EC2 instances, EBS volumes, RDS databases and Lambda functions missing
+    any of the required tags, found with set differences over each
+    inventory's tag index rather than row by row.
+    """
+
+    name = 'untagged'
+    title = 'Untagged'
+    timeout = 120
+    inventory = ['ec2_instance', 'ebs_volume', 'rds', 'lambda_function']
+    resource_types = list(UNTAGGED_RESOURCE_TYPES)
+    required_tags = os.environ.get('REQUIRED_TAGS', 'Environment,Owner,Project').split(',')
+
+    def evaluate(self, data: ScanData) -> List[Dict]:
+        findings = []
+
+        for kind in self.inventory:
+            inventory = data.inventory(kind)
+            for row_index, missing_tags in sorted(inventory.missing_tags(self.required_tags).items()):
+                findings.append(self.finding(inventory.row(row_index), {'missing_tags': missing_tags}, data))
+
+        return findings
+
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        missing_tags = signals['missing_tags']
+        return {
+            'resource_type': UNTAGGED_RESOURCE_TYPES[row['resource_type']],
+            'resource_id': row['resource_id'],
+            'issue': 'missing_tags',
+            'missing_tags': str(missing_tags),
+            'estimated_monthly_cost': Decimal('0'),
+            'recommendation': f'Add missing tags: {", ".join(missing_tags)}',
+            'severity': 'medium'
+        }
+
+
+@register
+class OldS3Buckets(Detector):
+    """
+    S3 buckets older than a threshold, priced from what they store.
+    Sizes per storage class and object counts come from the daily storage
+    metrics, fetched per bucket region in batched calls; when inventory
+    reports are configured they add an object-age histogram and the
+    savings from moving old STANDARD data to Standard-IA. Buckets whose
+    region is unknown are reported as unlocated. Bucket listing is global,
+    so this detector runs once per account.
+    """
+
+    name = 's3'
+    title = 'Old S3'
+    scope = 'global'
+    timeout = 240
+    thresholds = {
+        'old_bucket_days': float(os.environ.get('S3_OLD_BUCKET_DAYS', '365'))
+    }
+
+    def evaluate(self, data: ScanData) -> List[Dict]:
+        clients = data.clients
+        findings = []
+
+        buckets = list_buckets(clients.get('s3'))
+
+        old_buckets = {}
+        for bucket in buckets:
+            age_days = (datetime.utcnow().replace(tzinfo=bucket['CreationDate'].tzinfo) - bucket['CreationDate']).days
+            if age_days <= self.thresholds['old_bucket_days']:
+                continue
+            if not bucket.get('BucketRegion'):
+                # Without a region there are no storage metrics to price it from
+                findings.append({
+                    'resource_type': 's3_bucket',
+                    'resource_id': bucket['Name'],
+                    'region': 'unknown',
+                    'issue': 'unlocated_bucket',
+                    'age_days': age_days,
+                    'estimated_monthly_cost': Decimal('0'),
+                    'recommendation': 'Bucket region could not be determined - review it manually',
+                    'severity': 'low'
+                })
+                continue
+            old_buckets[bucket['Name']] = {'region': bucket['BucketRegion'], 'age_days': age_days}
+
+        names_by_region = {}
+        for name, bucket in old_buckets.items():
+            names_by_region.setdefault(bucket['region'], set()).add(name)
+
+        # Storage metrics live in each bucket's region
+        storage = {}
+        failed_regions = set()
+        region_results = run_in_regions(
+            lambda region: {'status': 'ok', 'buckets': get_bucket_storage(clients.get('cloudwatch', region), names_by_region[region])},
+            list(names_by_region)
+        ) if names_by_region else {}
+        for region, result in region_results.items():
+            if result.get('status') == 'ok':
+                storage.update(result['buckets'])
+            else:
+                print(f"Skipping {len(names_by_region[region])} old buckets in {region}: {result.get('error')}")
+                failed_regions.add(region)
+
+        histograms = get_inventory_histograms(clients.get('s3'), set(old_buckets))
+
+        for name, bucket in old_buckets.items():
+            if bucket['region'] in failed_regions:
+                continue
+
+            signals = {
+                'storage': storage.get(name, {'bytes_by_type': {}, 'objects': 0}),
+                'histogram': histograms.get(name)
+            }
+            findings.append(self.finding({'resource_id': name, **bucket}, signals, data))
+
+        return findings
+
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        name = row['resource_id']
+        region = row['region']
+        measured = signals['storage']
+        size_bytes = sum(measured['bytes_by_type'].values())
+
+        if not size_bytes and not measured['objects']:
+            return {
+                'resource_type': 's3_bucket',
+                'resource_id': name,
+                'region': region,
+                'issue': 'empty_bucket',
+                'age_days': row['age_days'],
+                'size_gb': Decimal('0'),
+                'object_count': 0,
+                'estimated_monthly_cost': Decimal('0'),
+                'recommendation': 'Bucket holds no objects - delete it if it is no longer used',
+                'severity': 'low'
+            }
+
+        estimated_cost = estimate_storage_cost(measured['bytes_by_type'], region)
+        recommendation = 'Review bucket contents, consider lifecycle policies or deletion'
+
+        finding = {
+            'resource_type': 's3_bucket',
+            'resource_id': name,
+            'region': region,
+            'issue': 'old_bucket',
+            'age_days': row['age_days'],
+            'size_gb': Decimal(str(round(size_bytes / GB, 3))),
+            'object_count': measured['objects'],
+            'estimated_monthly_cost': Decimal(str(estimated_cost)),
+            'severity': 'high' if estimated_cost > 100 else 'medium' if estimated_cost > 10 else 'low'
+        }
+        # Flat numeric columns, so findings load into typed frames and Parquet
+        for storage_type, size in measured['bytes_by_type'].items():
+            finding[f'storage_gb_{column_suffix(storage_type)}'] = Decimal(str(round(size / GB, 3)))
+
+        histogram = signals['histogram']
+        if histogram:
+            catalog = get_catalog()
+            standard = catalog.s3_gb_month('Standard', region) or 0.0
+            infrequent = catalog.s3_gb_month('Standard - Infrequent Access', region) or standard
+            transition_savings = round(histogram['standard_transition_bytes'] / GB * (standard - infrequent), 2)
+            for label, size in histogram['bytes'].items():
+                finding[f'age_gb_{column_suffix(label)}'] = Decimal(str(round(size / GB, 3)))
+                finding[f'age_objects_{column_suffix(label)}'] = histogram['objects'][label]
+            finding['transition_savings'] = Decimal(str(transition_savings))
+            recommendation = f'Move STANDARD objects older than {TRANSITION_AGE_DAYS} days to Standard-IA (saves ${transition_savings:.2f}/month)'
+
+        finding['recommendation'] = recommendation
+        return mark_approximate_price(finding, region)
+
+
+def column_suffix(label: str) -> str:
+    """Attribute-name-safe form of a storage type or age bin label, e.g. '0-30d' -> '0_30d', '365d+' -> '365d_plus'"""
+    return label.replace('+', '_plus').replace('-', '_')
+
+
+def get_inventory_histograms(s3_client, bucket_names) -> Dict[str, Dict]:
+    """Object-age histograms for buckets with an inventory report, when S3_INVENTORY_DESTINATION is set"""
+    destination = get_inventory_destination()
+    if destination is None:
+        return {}
+
+    histograms = {}
+    try:
+        manifests = find_latest_manifests(s3_client, *destination)
+        for name, manifest_key in manifests.items():
+            if name in bucket_names:
+                histograms[name] = age_histogram(s3_client, destination[0], manifest_key)
+    except Exception as e:
+        print(f"Error reading S3 inventory reports: {str(e)}")
+
+    return histograms
+
+
+def mark_approximate_price(finding: Dict, region: str) -> Dict:
+    """Flag a finding whose cost was estimated from another region's prices"""
+    if get_catalog().is_approximate(region):
+        finding['price_approximate'] = True
+    return finding
+
+
+def estimate_rds_cost(instance_class: str, region: str, engine: str = 'mysql') -> float:
+    """Monthly on-demand cost of an RDS instance (Single-AZ), 0 when not in the price catalog"""
+    hourly = get_catalog().rds_hourly(instance_class, region, engine)
+
+    if hourly is None:
+        print(f"No catalog price for RDS {instance_class} ({engine}) in {region}")
+        return 0.0
+
+    return round(hourly * HOURS_PER_MONTH, 2)
+
+
+def estimate_ebs_cost(volume_type: str, size_gb: int, region: str) -> float:
+    """Monthly storage cost of an EBS volume, 0 when not in the price catalog"""
+    gb_month = get_catalog().ebs_gb_month(volume_type, region)
+
+    if gb_month is None:
+        print(f"No catalog price for EBS {volume_type} in {region}")
+        return 0.0
+
+    return round(size_gb * gb_month, 2)
@@ -0,0 +1,290 @@
+"""
+Detector registry and the engine that runs detectors over shared data.
+
+A detector declares what it reads - the inventory kinds it needs, the
+resource types it evaluates and the CloudWatch metrics it wants for each
+of them - along with its thresholds and the conditions a resource must
+meet to become a finding. Detectors are Detector subclasses decorated
+with @register; the handler runs whatever is registered and enabled.
+
+For each account and region the engine plans one fetch for all enabled
+detectors: every inventory kind is loaded once and all metric needs are
+merged, deduplicated and read in one batched get_metric_series call, so
+ten detectors reading the same metric cost the same API calls as one.
+"""
+import operator
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, List, Optional
+
+from common.inventory import Inventory
+from common.metrics import get_metric_series, metric_stat
+
+# Concurrent get_metric_data batches per account/region
+METRIC_WORKERS = int(os.environ.get('DETECTOR_METRIC_WORKERS', '4'))
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq
+}
+
+
+class MetricNeed:
+    """One CloudWatch statistic a detector reads for each resource of a type"""
+
+    def __init__(self, resource_type: str, namespace: str, metric_name: str, dimension: str,
+                 stat: str, period: int = 3600, days: int = 7):
+        self.resource_type = resource_type
+        self.namespace = namespace
+        self.metric_name = metric_name
+        self.dimension = dimension
+        self.stat = stat
+        self.period = period
+        self.days = days
+
+    def query_key(self, resource_id: str) -> Hashable:
+        """Needs with the same key are fetched once, over the longest window asked for"""
+        return (self.namespace, self.metric_name, self.dimension, resource_id, self.stat, self.period)
+
+
+class ScanData:
+    """Inventories and metric series of one account/region, shared by every detector"""
+
+    def __init__(self, clients, account_id: str, region: str, inventories: Dict[str, Inventory],
+                 series: Dict[Hashable, List], end_time: datetime):
+        self.clients = clients
+        self.account_id = account_id
+        self.region = region
+        self.inventories = inventories
+        self.series = series
+        self.end_time = end_time
+        self._groups = {}
+
+    def inventory(self, kind: str) -> Inventory:
+        return self.inventories[kind]
+
+    def metric(self, need: MetricNeed, resource_id: str) -> Optional[List]:
+        """
+        The need's datapoints within its own window, or None when the
+        metric was not fetched (its batch failed).
+        """
+        points = self.series.get(need.query_key(resource_id))
+        if points is None:
+            return None
+        start_time = self.end_time - timedelta(days=need.days)
+        return [(timestamp, value) for timestamp, value in points if timestamp.replace(tzinfo=None) >= start_time]
+
+    def group(self, kind: str, resource_type: str, attribute: str) -> Dict[str, List[Dict]]:
+        """Rows of a resource type grouped by one of their attributes, built once per region"""
+        key = (kind, resource_type, attribute)
+        if key not in self._groups:
+            groups = {}
+            for row in self.inventory(kind).rows(resource_type):
+                if row['attributes'].get(attribute):
+                    groups.setdefault(row['attributes'][attribute], []).append(row)
+            self._groups[key] = groups
+        return self._groups[key]
+
+
+class Detector(ABC):
+    """
+    Base detector. Subclasses set the declarations below and implement
+    signals() and finding(); detectors that cannot be expressed row by row
+    override evaluate() and still build each finding with finding().
+    A subclass without finding() cannot be instantiated, so @register
+    rejects it at import.
+
+    conditions are (signal, operator, threshold name, required) tuples, all
+    of which must hold. A signal that is None fails a required condition
+    and is ignored by the others.
+    """
+
+    name: str = None
+    title: str = None
+    scope = 'regional'
+    timeout = 60
+    inventory: List[str] = []
+    resource_types: List[str] = []
+    metrics: List[MetricNeed] = []
+    thresholds: Dict[str, float] = {}
+    conditions: List[tuple] = []
+
+    def select(self, row: Dict) -> bool:
+        """Whether a row is evaluated (and has its metrics fetched)"""
+        return True
+
+    def signals(self, row: Dict, data: ScanData) -> Dict:
+        return {}
+
+    @abstractmethod
+    def finding(self, row: Dict, signals: Dict, data: ScanData) -> Dict:
+        """The finding item for a row whose signals matched the conditions"""
+
+    def targets(self, inventories: Dict[str, Inventory]):
+        """Rows of the detector's inventories that it evaluates"""
+        for kind in self.inventory:
+            for row in inventories[kind].rows():
+                if row['resource_type'] in self.resource_types and self.select(row):
+                    yield row
+
+    def points(self, data: ScanData, row: Dict, metric_name: str) -> Optional[List]:
+        for need in self.metrics:
+            if need.resource_type == row['resource_type'] and need.metric_name == metric_name:
+                return data.metric(need, row['resource_id'])
+        return None
+
+    def matches(self, signals: Dict) -> bool:
+        for signal, op, threshold, required in self.conditions:
+            value = signals.get(signal)
+            if value is None:
+                if required:
+                    return False
+                continue
+            if not OPERATORS[op](value, self.thresholds[threshold]):
+                return False
+        return True
+
+    def evaluate(self, data: ScanData) -> List[Dict]:
+        findings = []
+        skipped = 0
+
+        for row in self.targets(data.inventories):
+            # Resources whose metric batch failed are skipped, not judged on missing data
+            needs = [need for need in self.metrics if need.resource_type == row['resource_type']]
+            if any(data.metric(need, row['resource_id']) is None for need in needs):
+                skipped += 1
+                continue
+
+            signals = self.signals(row, data)
+            if self.matches(signals):
+                findings.append(self.finding(row, signals, data))
+
+        if skipped:
+            print(f"[{self.name}] Skipped {skipped} resources without metric data")
+
+        return findings
+
+
+_registry: Dict[str, Detector] = {}
+
+
+def register(cls):
+    """Class decorator adding a detector to the registry"""
+    detector = cls()
+    if detector.name in _registry:
+        raise ValueError(f"Detector {detector.name} is already registered")
+    _registry[detector.name] = detector
+    return cls
+
+
+def get_detectors(names: List[str] = None, scope: str = None) -> List[Detector]:
+    """Registered detectors in registration order, optionally only the named ones or one scope"""
+    if names:
+        unknown = [name for name in names if name not in _registry]
+        if unknown:
+            raise ValueError(f"Unknown detectors: {', '.join(unknown)}")
+    return [
+        detector for name, detector in _registry.items()
+        if (not names or name in names) and (scope is None or detector.scope == scope)
+    ]
+
+
+def plan_metrics(detectors: List[Detector], inventories: Dict[str, Inventory]):
+    """
+    Merge the metric needs of all detectors into one deduplicated set of
+    queries. Returns ({query key: MetricStat}, days of the longest window).
+    """
+    queries = {}
+    days = 0
+
+    for detector in detectors:
+        if not detector.metrics:
+            continue
+        rows = list(detector.targets(inventories))
+        for need in detector.metrics:
+            for row in rows:
+                if row['resource_type'] != need.resource_type:
+                    continue
+                queries[need.query_key(row['resource_id'])] = metric_stat(
+                    need.namespace, need.metric_name, {need.dimension: row['resource_id']}, need.stat, need.period
+                )
+                days = max(days, need.days)
+
+    return queries, days
+
+
+def run_detectors(detectors: List[Detector], clients, account_id: str, region: str,
+                  load_inventory: Callable[[str], Inventory]) -> Dict:
+    """
+    Run detectors for one account and region (or 'global') over one shared
+    fetch. A detector whose inventory failed to load or which raises is
+    reported in errors without affecting the others.
+    Returns {'findings': [...], 'errors': {detector: message}, 'metric_queries': n,
+    'fetch_seconds': shared inventory and metric fetch time,
+    'detector_seconds': {detector: evaluate() time}}.
+    """
+    started = time.monotonic()
+    errors = {}
+    inventories = {}
+    inventory_errors = {}
+    kinds = list(dict.fromkeys(kind for detector in detectors for kind in detector.inventory))
+
+    def load(kind):
+        try:
+            inventories[kind] = load_inventory(kind)
+        except Exception as e:
+            print(f"[{account_id}/{region}] Error listing {kind} inventory: {str(e)}")
+            inventory_errors[kind] = str(e)
+
+    # Inventory kinds come from different services, so they are listed concurrently
+    if kinds:
+        with ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+            list(executor.map(load, kinds))
+
+    runnable = []
+    for detector in detectors:
+        failed = [kind for kind in detector.inventory if kind in inventory_errors]
+        if failed:
+            errors[detector.name] = f"{failed[0]} inventory unavailable: {inventory_errors[failed[0]]}"
+        else:
+            runnable.append(detector)
+
+    queries, days = plan_metrics(runnable, inventories)
+    end_time = datetime.utcnow()
+    series = {}
+    if queries:
+        print(f"[{account_id}/{region}] Fetching {len(queries)} metric queries for {len(runnable)} detectors")
+        series = get_metric_series(
+            clients.get('cloudwatch', region), queries, end_time - timedelta(days=days), end_time,
+            max_workers=METRIC_WORKERS
+        )
+
+    data = ScanData(clients, account_id, region, inventories, series, end_time)
+    findings = []
+    durations = {}
+    fetch_seconds = time.monotonic() - started
+
+    for detector in runnable:
+        detector_started = time.monotonic()
+        try:
+            for finding in detector.evaluate(data):
+                finding['detector'] = detector.name
+                findings.append(finding)
+        except Exception as e:
+            print(f"[{account_id}/{region}] Detector {detector.name} failed: {str(e)}")
+            errors[detector.name] = str(e)
+        durations[detector.name] = round(time.monotonic() - detector_started, 3)
+
+    return {
+        'findings': findings,
+        'errors': errors,
+        'metric_queries': len(queries),
+        'fetch_seconds': round(fetch_seconds, 3),
+        'detector_seconds': durations
+    }
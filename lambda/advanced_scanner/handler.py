@@ -1,65 +1,133 @@
-import boto3
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict
-from decimal import Decimal
+import os
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Tuple
 
-# Initialize AWS clients
-ec2_client = boto3.client('ec2')
-rds_client = boto3.client('rds')
-s3_client = boto3.client('s3')
-lambda_client = boto3.client('lambda')
-cloudwatch_client = boto3.client('cloudwatch')
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('AdvancedResourceScans')
+from common.clients import ClientCache, get_client_config, throttles
+from common.inventory import InventoryCache, get_inventory_store
+from common.orchestrator import run_scans
+from common.persistence import write_items
+from common.regions import get_scan_regions
+from common.sessions import AssumedRoleSessionCache, account_id_from_arn, get_local_account_id, get_role_arns
+from engine import Detector, get_detectors, run_detectors
+import detectors  # noqa: F401 - registers the built-in detectors
+
+# AWS clients and tables are created lazily on first use - service clients per
+# scanned account and region; assumed-role sessions are reused across warm
+# invocations
+MAX_SCAN_WORKERS = int(os.environ.get('MAX_SCAN_WORKERS', '16'))
+
+# Up to MAX_SCAN_WORKERS jobs can share one client (e.g. CloudWatch in a region)
+client_config = get_client_config(MAX_SCAN_WORKERS)
+clients = ClientCache(config=client_config)
+session_cache = None
+table = clients.table('AdvancedResourceScans')
+inventory_store = get_inventory_store(clients)
+
+# Instance states in the EC2 inventory - matches the EC2 scanner, whose
+# snapshots are reused while fresh
+INSTANCE_STATES = os.environ.get('INSTANCE_STATES', 'running,stopped').split(',')
+
+# Detectors to run (comma-separated names, empty for all registered ones)
+ENABLED_DETECTORS = [name for name in os.environ.get('DETECTORS', '').split(',') if name]
+
+# Seconds kept free at the end of the invocation for storing findings
+TIMEOUT_MARGIN_SECONDS = 30
 
 def lambda_handler(event, context):
     """
     Advanced resource scanner - finds waste across multiple AWS services
+    in every configured account and region by running the registered
+    detectors. Accounts and regions are scanned concurrently.
     """
+    global session_cache
+    
     print("Starting advanced resource scan...")
+    throttles.reset()
     
     scan_date = datetime.utcnow().strftime('%Y-%m-%d')
     scan_timestamp = datetime.utcnow().isoformat()
+    regions = get_scan_regions(event)
+    print(f"Regions: {', '.join(regions)}")
     
     all_findings = []
     
     try:
-        # Scan unused EBS volumes
-        ebs_findings = scan_unused_ebs_volumes()
-        all_findings.extend(ebs_findings)
-        print(f"Found {len(ebs_findings)} unused EBS volumes")
+        enabled = get_detectors((event or {}).get('detectors') or ENABLED_DETECTORS)
+        print(f"Detectors: {', '.join(detector.name for detector in enabled)}")
+        
+        role_arns = get_role_arns(event)
+        
+        if role_arns:
+            print(f"Accounts: {len(role_arns)} member account role(s)")
+            if session_cache is None:
+                session_cache = AssumedRoleSessionCache(config=client_config)
+            # Roles are assumed lazily inside the jobs, once per account
+            accounts = {
+                account_id_from_arn(arn): (lambda arn=arn: session_cache.get_clients(arn))
+                for arn in role_arns
+            }
+        else:
+            accounts = {get_local_account_id(context, clients): lambda: clients}
         
-        # Scan idle RDS databases
-        rds_findings = scan_idle_rds_instances()
-        all_findings.extend(rds_findings)
-        print(f"Found {len(rds_findings)} idle RDS instances")
+        # Resources are listed once per account/region and shared by every detector
+        inventory = InventoryCache(inventory_store, scan_timestamp, INSTANCE_STATES)
+        jobs, base_timeouts = build_scan_jobs(accounts, regions, inventory, enabled)
+        budget = get_scan_budget(context)
+        timeouts = get_scan_timeouts(base_timeouts, budget)
         
-        # Scan old S3 buckets
-        s3_findings = scan_old_s3_buckets()
-        all_findings.extend(s3_findings)
-        print(f"Found {len(s3_findings)} underutilized S3 buckets")
+        # Jobs are independent, so the run takes max(job) rather than sum(job);
+        # jobs still queued when the budget runs out are reported as not_started
+        outcomes = run_scans(jobs, timeouts, MAX_SCAN_WORKERS, budget)
         
-        # Scan expensive Lambda functions
-        lambda_findings = scan_expensive_lambda_functions()
-        all_findings.extend(lambda_findings)
-        print(f"Found {len(lambda_findings)} expensive Lambda functions")
+        findings_by_detector = {detector.name: [] for detector in enabled}
+        scanner_report = {}
+        detector_report = {
+            detector.name: {'duration_seconds': 0.0, 'max_job_seconds': 0.0, 'jobs': 0, 'findings': 0, 'errors': 0}
+            for detector in enabled
+        }
+        
+        for job_name, outcome in outcomes.items():
+            result = outcome['result'] or {'findings': [], 'errors': {}, 'metric_queries': 0}
+            for finding in result['findings']:
+                findings_by_detector[finding['detector']].append(finding)
+                detector_report[finding['detector']]['findings'] += 1
+            scanner_report[job_name] = {
+                'status': outcome['status'],
+                'duration_seconds': outcome['duration_seconds'],
+                'findings': len(result['findings']),
+                'metric_queries': result['metric_queries']
+            }
+            if 'fetch_seconds' in result:
+                scanner_report[job_name]['fetch_seconds'] = result['fetch_seconds']
+                scanner_report[job_name]['detector_seconds'] = result['detector_seconds']
+            if outcome.get('error'):
+                scanner_report[job_name]['error'] = outcome['error']
+            if result['errors']:
+                scanner_report[job_name]['detector_errors'] = result['errors']
+            
+            # Each detector's own time, summed over the accounts and regions it ran in
+            for name, seconds in result.get('detector_seconds', {}).items():
+                report = detector_report[name]
+                report['duration_seconds'] = round(report['duration_seconds'] + seconds, 3)
+                report['max_job_seconds'] = max(report['max_job_seconds'], seconds)
+                report['jobs'] += 1
+            for name in result['errors']:
+                detector_report[name]['errors'] += 1
+        
+        for detector in enabled:
+            print(f"Found {len(findings_by_detector[detector.name])} findings from {detector.name} ({detector.title})")
         
-        # Scan untagged resources
-        untagged_findings = scan_untagged_resources()
-        all_findings.extend(untagged_findings)
-        print(f"Found {len(untagged_findings)} untagged resources")
+        all_findings = [finding for findings in findings_by_detector.values() for finding in findings]
         
-        # Store findings in DynamoDB
+        # Store findings in DynamoDB - account and region are part of the key
+        # since names like Lambda functions and RDS identifiers are per-region
         for finding in all_findings:
             finding['scan_date'] = scan_date
             finding['scan_timestamp'] = scan_timestamp
-            finding['scan_id'] = f"{finding['resource_type']}#{finding['resource_id']}#{scan_timestamp}"
-            
-            try:
-                table.put_item(Item=finding)
-            except Exception as e:
-                print(f"Error storing finding: {str(e)}")
+            finding['scan_id'] = f"{finding['resource_type']}#{finding['account_id']}#{finding['region']}#{finding['resource_id']}#{scan_timestamp}"
+        
+        write_counts = write_items(table, all_findings)
         
         # Calculate potential savings
         total_savings = sum(float(f.get('estimated_monthly_cost', 0)) for f in all_findings)
@@ -70,11 +138,20 @@ def lambda_handler(event, context):
         print(f"Total findings: {len(all_findings)}")
         print(f"Potential monthly savings: ${total_savings:.2f}")
         print(f"Breakdown:")
-        print(f"  - Unused EBS: {len(ebs_findings)}")
-        print(f"  - Idle RDS: {len(rds_findings)}")
-        print(f"  - Old S3: {len(s3_findings)}")
-        print(f"  - Expensive Lambda: {len(lambda_findings)}")
-        print(f"  - Untagged: {len(untagged_findings)}")
+        for detector in enabled:
+            print(f"  - {detector.title}: {len(findings_by_detector[detector.name])}")
+        print(f"Accounts scanned: {len(accounts)}")
+        print(f"Regions scanned: {', '.join(regions)}")
+        print(f"Job durations:")
+        for job_name, report in sorted(scanner_report.items()):
+            print(f"  - {job_name}: {report['duration_seconds']:.1f}s ({report['status']})")
+        print(f"Detector durations:")
+        for name, report in detector_report.items():
+            print(f"  - {name}: {report['duration_seconds']:.1f}s over {report['jobs']} jobs (slowest {report['max_job_seconds']:.1f}s)")
+        print(f"Inventories: {inventory.stats['listed']} listed, {inventory.stats['reused']} reused from snapshots")
+        print(f"Stored in DynamoDB: {write_counts['written']} (failed: {write_counts['failed']})")
+        throttle_counts = throttles.counts()
+        print(f"Throttled requests: {throttle_counts or 'none'}")
         
         return {
             'statusCode': 200,
@@ -82,13 +159,15 @@ def lambda_handler(event, context):
                 'scan_date': scan_date,
                 'total_findings': len(all_findings),
                 'potential_monthly_savings': total_savings,
-                'breakdown': {
-                    'ebs': len(ebs_findings),
-                    'rds': len(rds_findings),
-                    's3': len(s3_findings),
-                    'lambda': len(lambda_findings),
-                    'untagged': len(untagged_findings)
-                }
+                'breakdown': {name: len(findings) for name, findings in findings_by_detector.items()},
+                'accounts': list(accounts),
+                'regions': regions,
+                'scanners': scanner_report,
+                'detectors': detector_report,
+                'inventory': inventory.stats,
+                'throttles': throttle_counts,
+                'stored_in_dynamodb': write_counts['written'],
+                'failed_writes': write_counts['failed']
             }, default=str)
         }
         
@@ -102,249 +181,77 @@ def lambda_handler(event, context):
         }
 
 
-def scan_unused_ebs_volumes() -> List[Dict]:
-    """Find EBS volumes not attached to any instance"""
-    findings = []
+def build_scan_jobs(accounts: Dict[str, Callable[[], ClientCache]], regions: List[str], inventory: InventoryCache,
+                    enabled: List[Detector]) -> Tuple[Dict[str, Callable[[], Dict]], Dict[str, float]]:
+    """
+    One job per account and region running every regional detector over
+    one shared fetch (named regional:account:region), plus one job per
+    account and global detector (named detector:account). accounts maps
+    account id to a callable returning that account's ClientCache.
+    Returns the jobs and each job's timeout, the longest timeout of the
+    detectors it runs.
+    """
+    regional = [detector for detector in enabled if detector.scope == 'regional']
+    global_detectors = [detector for detector in enabled if detector.scope == 'global']
     
-    try:
-        response = ec2_client.describe_volumes(
-            Filters=[{'Name': 'status', 'Values': ['available']}]
-        )
-        
-        for volume in response['Volumes']:
-            # Get volume age
-            create_time = volume['CreateTime']
-            age_days = (datetime.utcnow().replace(tzinfo=create_time.tzinfo) - create_time).days
-            
-            # Estimate cost
-            size_gb = volume['Size']
-            monthly_cost = size_gb * 0.10
-            
-            finding = {
-                'resource_type': 'ebs_volume',
-                'resource_id': volume['VolumeId'],
-                'issue': 'unused_volume',
-                'size_gb': Decimal(str(size_gb)),
-                'volume_type': volume['VolumeType'],
-                'age_days': age_days,
-                'estimated_monthly_cost': Decimal(str(monthly_cost)),
-                'recommendation': f'Delete unused volume (${monthly_cost:.2f}/month) or attach to instance',
-                'severity': 'medium' if monthly_cost < 5 else 'high'
-            }
-            
-            findings.append(finding)
-            
-    except Exception as e:
-        print(f"Error scanning EBS volumes: {str(e)}")
+    jobs = {}
+    timeouts = {}
     
-    return findings
-
-
-def scan_idle_rds_instances() -> List[Dict]:
-    """Find RDS instances with low utilization"""
-    findings = []
+    def run_regional(get_clients, account_id, region):
+        account_clients = get_clients()
+        result = run_detectors(
+            regional, account_clients, account_id, region,
+            lambda kind: inventory.get(account_id, region, kind, account_clients)
+        )
+        return tag_result(result, account_id, region)
     
-    try:
-        response = rds_client.describe_db_instances()
+    for account_id, get_clients in accounts.items():
+        if regional:
+            for region in regions:
+                job_name = f"regional:{account_id}:{region}"
+                jobs[job_name] = (
+                    lambda get_clients=get_clients, account_id=account_id, region=region:
+                        run_regional(get_clients, account_id, region)
+                )
+                timeouts[job_name] = max(detector.timeout for detector in regional)
         
-        for db_instance in response['DBInstances']:
-            instance_id = db_instance['DBInstanceIdentifier']
-            instance_class = db_instance['DBInstanceClass']
-            
-            # Get CPU metrics
-            cpu_metrics = get_rds_cpu_usage(instance_id)
-            
-            if cpu_metrics and cpu_metrics < 10.0:  # Less than 10% CPU
-                
-                estimated_cost = estimate_rds_cost(instance_class)
-                
-                finding = {
-                    'resource_type': 'rds_instance',
-                    'resource_id': instance_id,
-                    'issue': 'idle_database',
-                    'instance_class': instance_class,
-                    'avg_cpu': Decimal(str(cpu_metrics)),
-                    'estimated_monthly_cost': Decimal(str(estimated_cost)),
-                    'recommendation': f'Consider downsizing or using Aurora Serverless (${estimated_cost:.2f}/month)',
-                    'severity': 'high' if estimated_cost > 50 else 'medium'
-                }
-                
-                findings.append(finding)
-                
-    except Exception as e:
-        print(f"Error scanning RDS: {str(e)}")
+        for detector in global_detectors:
+            job_name = f"{detector.name}:{account_id}"
+            jobs[job_name] = (
+                lambda detector=detector, get_clients=get_clients, account_id=account_id:
+                    tag_result(run_detectors(
+                        [detector], get_clients(), account_id, 'global', lambda kind: None
+                    ), account_id, 'global')
+            )
+            timeouts[job_name] = detector.timeout
     
-    return findings
+    return jobs, timeouts
 
 
-def get_rds_cpu_usage(instance_id: str) -> float:
-    """Get average CPU usage for RDS instance"""
-    try:
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
-        
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/RDS',
-            MetricName='CPUUtilization',
-            Dimensions=[{'Name': 'DBInstanceIdentifier', 'Value': instance_id}],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Average']
-        )
-        
-        if response['Datapoints']:
-            return sum(dp['Average'] for dp in response['Datapoints']) / len(response['Datapoints'])
-    except:
-        pass
-    
+def get_scan_budget(context) -> Optional[float]:
+    """Seconds the jobs may run in total - the Lambda's remaining time less a margin, None outside Lambda"""
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        return max(1.0, context.get_remaining_time_in_millis() / 1000 - TIMEOUT_MARGIN_SECONDS)
     return None
 
 
-def estimate_rds_cost(instance_class: str) -> float:
-    """Rough RDS cost estimation"""
-    # Simplified pricing
-    pricing = {
-        'db.t3.micro': 15,
-        'db.t3.small': 30,
-        'db.t3.medium': 60,
-        'db.t3.large': 120,
-        'db.m5.large': 140,
-        'db.m5.xlarge': 280,
+def get_scan_timeouts(timeouts: Dict[str, float], budget: Optional[float]) -> Dict[str, float]:
+    """Per-job timeouts, never longer than the run's budget"""
+    return {
+        job_name: max(1.0, min(timeout, budget)) if budget is not None else timeout
+        for job_name, timeout in timeouts.items()
     }
-    
-    return pricing.get(instance_class, 100)
-
-
-def scan_old_s3_buckets() -> List[Dict]:
-    """Find S3 buckets with old data and low access"""
-    findings = []
-    
-    try:
-        response = s3_client.list_buckets()
-        
-        for bucket in response['Buckets']:
-            bucket_name = bucket['Name']
-            
-            try:
-                
-                age_days = (datetime.utcnow().replace(tzinfo=bucket['CreationDate'].tzinfo) - bucket['CreationDate']).days
-                
-                if age_days > 365:
-                    # Rough estimate
-                    estimated_cost = 10
-                    
-                    finding = {
-                        'resource_type': 's3_bucket',
-                        'resource_id': bucket_name,
-                        'issue': 'old_bucket',
-                        'age_days': age_days,
-                        'estimated_monthly_cost': Decimal(str(estimated_cost)),
-                        'recommendation': 'Review bucket contents, consider lifecycle policies or deletion',
-                        'severity': 'low'
-                    }
-                    
-                    findings.append(finding)
-                    
-            except Exception as e:
-                pass
-                
-    except Exception as e:
-        print(f"Error scanning S3: {str(e)}")
-    
-    return findings
 
 
-def scan_expensive_lambda_functions() -> List[Dict]:
-    """Find Lambda functions with high costs but low invocations"""
-    findings = []
-    
-    try:
-        response = lambda_client.list_functions()
-        
-        for function in response['Functions']:
-            function_name = function['FunctionName']
-            memory_mb = function['MemorySize']
-            
-            invocations = get_lambda_invocations(function_name)
-            
-            if invocations is not None and invocations < 100:
-                estimated_cost = (memory_mb / 1024) * 0.0000166667 * invocations * 4  
-                
-                if estimated_cost > 1: 
-                    finding = {
-                        'resource_type': 'lambda_function',
-                        'resource_id': function_name,
-                        'issue': 'low_utilization',
-                        'memory_mb': memory_mb,
-                        'weekly_invocations': invocations,
-                        'estimated_monthly_cost': Decimal(str(estimated_cost)),
-                        'recommendation': 'Consider removing or reducing memory allocation',
-                        'severity': 'low'
-                    }
-                    
-                    findings.append(finding)
-                    
-    except Exception as e:
-        print(f"Error scanning Lambda: {str(e)}")
-    
+def tag_findings(findings: List[Dict], account_id: str, region: str) -> List[Dict]:
+    """Attach the scanned account and region to each finding (keeping a region the scanner set)"""
+    for finding in findings:
+        finding['account_id'] = account_id
+        finding.setdefault('region', region)
     return findings
 
 
-def get_lambda_invocations(function_name: str) -> int:
-    """Get Lambda invocation count"""
-    try:
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
-        
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/Lambda',
-            MetricName='Invocations',
-            Dimensions=[{'Name': 'FunctionName', 'Value': function_name}],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=604800,
-            Statistics=['Sum']
-        )
-        
-        if response['Datapoints']:
-            return int(response['Datapoints'][0]['Sum'])
-    except:
-        pass
-    
-    return None
-
-
-def scan_untagged_resources() -> List[Dict]:
-    """Find EC2 instances without proper tags"""
-    findings = []
-    
-    try:
-        response = ec2_client.describe_instances()
-        
-        required_tags = ['Environment', 'Owner', 'Project']
-        
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
-                
-                missing_tags = [tag for tag in required_tags if tag not in tags]
-                
-                if missing_tags:
-                    finding = {
-                        'resource_type': 'ec2_untagged',
-                        'resource_id': instance_id,
-                        'issue': 'missing_tags',
-                        'missing_tags': str(missing_tags),
-                        'estimated_monthly_cost': Decimal('0'),
-                        'recommendation': f'Add missing tags: {", ".join(missing_tags)}',
-                        'severity': 'medium'
-                    }
-                    
-                    findings.append(finding)
-                    
-    except Exception as e:
-        print(f"Error scanning untagged resources: {str(e)}")
-    
-    return findings
\ No newline at end of file
+def tag_result(result: Dict, account_id: str, region: str) -> Dict:
+    """Tag a run_detectors result's findings with their account and region"""
+    tag_findings(result['findings'], account_id, region)
+    return result
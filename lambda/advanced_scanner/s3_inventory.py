@@ -0,0 +1,138 @@
+"""
+Object-age histograms from S3 Inventory reports.
+
+Optional: set S3_INVENTORY_DESTINATION to the s3://bucket/prefix that
+inventory reports are delivered to. Reports are laid out as
+<prefix>/<source bucket>/<config id>/<timestamp>/manifest.json, and the
+newest manifest of each source bucket is read. CSV data files are streamed
+line by line from the gzip body; Parquet files are read in record batches
+when pyarrow is available. ORC reports are skipped.
+
+S3 Inventory has no last-access time, so ages are measured from each
+object's LastModifiedDate.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date
+from typing import Dict, Iterator, Tuple
+
+# Upper bounds (days) of the age bins; the last bin is open-ended
+AGE_BINS = [(30, '0-30d'), (90, '30-90d'), (180, '90-180d'), (365, '180-365d'), (None, '365d+')]
+
+# Objects in STANDARD older than this are lifecycle candidates
+TRANSITION_AGE_DAYS = 90
+
+
+def get_inventory_destination():
+    """(bucket, prefix) from S3_INVENTORY_DESTINATION, or None when not configured"""
+    destination = os.environ.get('S3_INVENTORY_DESTINATION', '')
+    if not destination.startswith('s3://'):
+        return None
+
+    bucket, _, prefix = destination[len('s3://'):].partition('/')
+    return bucket, prefix.strip('/')
+
+
+def find_latest_manifests(s3_client, bucket: str, prefix: str) -> Dict[str, str]:
+    """{source bucket: key of its newest manifest.json} under the destination prefix"""
+    latest = {}
+    base = f"{prefix}/" if prefix else ''
+
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=base):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if not key.endswith('/manifest.json'):
+                continue
+
+            parts = key[len(base):].split('/')
+            if len(parts) != 4:
+                continue
+            source_bucket, _, timestamp, _ = parts
+
+            # Timestamps (YYYY-MM-DDTHH-MMZ) sort chronologically as strings
+            if source_bucket not in latest or timestamp > latest[source_bucket][0]:
+                latest[source_bucket] = (timestamp, key)
+
+    return {source_bucket: key for source_bucket, (_, key) in latest.items()}
+
+
+def age_histogram(s3_client, bucket: str, manifest_key: str, today: date = None) -> Dict:
+    """
+    Object count and bytes per age bin for one inventory report, plus the
+    STANDARD bytes older than TRANSITION_AGE_DAYS. Returns
+    {'objects': {bin: n}, 'bytes': {bin: n}, 'standard_transition_bytes': n}.
+    """
+    today = today or date.today()
+    manifest = json.loads(s3_client.get_object(Bucket=bucket, Key=manifest_key)['Body'].read())
+    file_format = manifest.get('fileFormat', 'CSV').upper()
+
+    histogram = {
+        'objects': {label: 0 for _, label in AGE_BINS},
+        'bytes': {label: 0 for _, label in AGE_BINS},
+        'standard_transition_bytes': 0
+    }
+
+    if file_format == 'CSV':
+        read_rows = _csv_rows
+    elif file_format == 'PARQUET':
+        read_rows = _parquet_rows
+    else:
+        print(f"Skipping {file_format} inventory {manifest_key}")
+        return histogram
+
+    columns = [column.strip() for column in manifest.get('fileSchema', '').split(',')]
+
+    for data_file in manifest.get('files', []):
+        for size, last_modified, storage_class in read_rows(s3_client, manifest['destinationBucket'].split(':::')[-1], data_file['key'], columns):
+            age_days = (today - date.fromisoformat(last_modified[:10])).days
+            label = next(label for limit, label in AGE_BINS if limit is None or age_days < limit)
+            histogram['objects'][label] += 1
+            histogram['bytes'][label] += size
+            if storage_class == 'STANDARD' and age_days >= TRANSITION_AGE_DAYS:
+                histogram['standard_transition_bytes'] += size
+
+    return histogram
+
+
+def _csv_rows(s3_client, bucket: str, key: str, columns) -> Iterator[Tuple[int, str, str]]:
+    """(size, last modified, storage class) rows streamed from a gzipped CSV data file"""
+    size_index = columns.index('Size')
+    modified_index = columns.index('LastModifiedDate')
+    class_index = columns.index('StorageClass') if 'StorageClass' in columns else None
+
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    with gzip.GzipFile(fileobj=body) as raw:
+        for row in csv.reader(io.TextIOWrapper(raw, encoding='utf-8')):
+            if len(row) <= max(size_index, modified_index) or not row[size_index]:
+                continue
+            yield int(row[size_index]), row[modified_index], row[class_index] if class_index is not None else ''
+
+
+def _parquet_rows(s3_client, bucket: str, key: str, columns) -> Iterator[Tuple[int, str, str]]:
+    """(size, last modified, storage class) rows read batch by batch from a Parquet data file"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print(f"pyarrow is not available, skipping Parquet inventory file {key}")
+        return
+
+    # Parquet needs random access, so the file is spooled to /tmp first
+    with tempfile.TemporaryFile() as f:
+        s3_client.download_fileobj(bucket, key, f)
+        f.seek(0)
+        parquet_file = pq.ParquetFile(f)
+        wanted = [name for name in ('size', 'last_modified_date', 'storage_class') if name in parquet_file.schema_arrow.names]
+
+        for batch in parquet_file.iter_batches(columns=wanted, batch_size=65536):
+            data = batch.to_pydict()
+            sizes = data.get('size', [])
+            modified = data.get('last_modified_date', [])
+            classes = data.get('storage_class') or [''] * len(sizes)
+            for size, last_modified, storage_class in zip(sizes, modified, classes):
+                if size is None or last_modified is None:
+                    continue
+                yield int(size), str(last_modified), storage_class or ''
@@ -0,0 +1,120 @@
+"""
+Bucket inventory and measured storage from S3's daily CloudWatch metrics.
+
+Buckets are listed with the paginated ListBuckets, which also returns each
+bucket's region. Storage metrics live in the bucket's region, so for every
+region ListMetrics finds which (bucket, storage type) series exist and one
+batched get_metric_data pass reads their latest BucketSizeBytes and
+NumberOfObjects. API calls grow with buckets / 500, so 10k+ buckets fit in
+a single scan.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Set
+
+from common.metrics import get_metric_series, metric_stat
+from common.pricing import get_catalog
+
+# CloudWatch StorageType -> Price List storage class it is billed as
+STORAGE_TYPE_CLASSES = {
+    'StandardStorage': 'Standard',
+    'StandardIAStorage': 'Standard - Infrequent Access',
+    'StandardIASizeOverhead': 'Standard - Infrequent Access',
+    'OneZoneIAStorage': 'One Zone - Infrequent Access',
+    'OneZoneIASizeOverhead': 'One Zone - Infrequent Access',
+    'ReducedRedundancyStorage': 'Reduced Redundancy',
+    'GlacierInstantRetrievalStorage': 'Glacier Instant Retrieval',
+    'GlacierInstantRetrievalSizeOverhead': 'Glacier Instant Retrieval',
+    'GlacierStorage': 'Amazon Glacier',
+    'GlacierObjectOverhead': 'Amazon Glacier',
+    'GlacierS3ObjectOverhead': 'Standard',
+    'DeepArchiveStorage': 'Glacier Deep Archive',
+    'DeepArchiveObjectOverhead': 'Glacier Deep Archive',
+    'DeepArchiveS3ObjectOverhead': 'Standard',
+    'IntelligentTieringFAStorage': 'Intelligent-Tiering Frequent Access',
+    'IntelligentTieringIAStorage': 'Intelligent-Tiering Infrequent Access',
+    'IntelligentTieringAIAStorage': 'Intelligent-Tiering Archive Instant Access'
+}
+
+# S3 storage metrics are published once a day, up to two days late
+METRIC_LOOKBACK_DAYS = 3
+METRIC_WORKERS = 4
+
+GB = 1024 ** 3
+
+
+def list_buckets(s3_client) -> List[Dict]:
+    """
+    Every bucket with Name, CreationDate and BucketRegion. Regions missing
+    from ListBuckets are looked up with GetBucketLocation.
+    """
+    buckets = [
+        bucket
+        for page in s3_client.get_paginator('list_buckets').paginate(PaginationConfig={'PageSize': 10000})
+        for bucket in page['Buckets']
+    ]
+
+    missing = [bucket for bucket in buckets if not bucket.get('BucketRegion')]
+    if missing:
+        def locate(bucket):
+            try:
+                location = s3_client.get_bucket_location(Bucket=bucket['Name'])['LocationConstraint']
+                bucket['BucketRegion'] = location or 'us-east-1'
+            except Exception as e:
+                print(f"Error locating bucket {bucket['Name']}: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(locate, missing))
+
+    return buckets
+
+
+def get_bucket_storage(cloudwatch_client, bucket_names: Set[str]) -> Dict[str, Dict]:
+    """
+    Latest storage of the given buckets in the client's region:
+    {bucket: {'bytes_by_type': {StorageType: bytes}, 'objects': count}}.
+    Buckets without storage metrics (empty buckets) are absent.
+    """
+    metrics = {}
+    for metric_name in ('BucketSizeBytes', 'NumberOfObjects'):
+        for page in cloudwatch_client.get_paginator('list_metrics').paginate(Namespace='AWS/S3', MetricName=metric_name):
+            for metric in page['Metrics']:
+                dimensions = {d['Name']: d['Value'] for d in metric['Dimensions']}
+                bucket = dimensions.get('BucketName')
+                if bucket in bucket_names and 'StorageType' in dimensions:
+                    metrics[(bucket, metric_name, dimensions['StorageType'])] = metric_stat(
+                        'AWS/S3', metric_name, dimensions, 'Average', 86400
+                    )
+
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=METRIC_LOOKBACK_DAYS)
+    series = get_metric_series(cloudwatch_client, metrics, start_time, end_time, max_workers=METRIC_WORKERS)
+
+    storage = {}
+    for (bucket, metric_name, storage_type), points in series.items():
+        if not points:
+            continue
+        latest = points[-1][1]
+        entry = storage.setdefault(bucket, {'bytes_by_type': {}, 'objects': 0})
+        if metric_name == 'BucketSizeBytes':
+            entry['bytes_by_type'][storage_type] = latest
+        else:
+            entry['objects'] += int(latest)
+
+    return storage
+
+
+def estimate_storage_cost(bytes_by_type: Dict[str, float], region: str) -> float:
+    """Monthly storage cost of a bucket from its bytes per storage type"""
+    catalog = get_catalog()
+    cost = 0.0
+
+    for storage_type, size_bytes in bytes_by_type.items():
+        storage_class = STORAGE_TYPE_CLASSES.get(storage_type)
+        price = catalog.s3_gb_month(storage_class, region) if storage_class else None
+        if price is None:
+            print(f"No catalog price for S3 {storage_type} in {region}")
+            continue
+        cost += size_bytes / GB * price
+
+    return round(cost, 2)
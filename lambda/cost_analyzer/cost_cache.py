@@ -0,0 +1,194 @@
+"""
+Per-day, per-service Cost Explorer results cached across runs.
+
+Cost Explorer charges per request and the analyzer looks at a rolling
+7-day window, so most of each window was already fetched by earlier runs.
+Once a day has closed (COST_SETTLE_DAYS after it ended, when Cost Explorer
+stops revising it) its service costs are stored, and later runs only
+request the days that are not cached yet - as one paginated call per
+contiguous range of missing days.
+
+Backends share a two-method interface (get_days / put_days):
+- DynamoCostCache: the CostExplorerCache table (default)
+- LocalCostCache: a JSON file, for local runs and tests
+"""
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from common.persistence import get_items, write_items
+
+# Days after which a day's costs are treated as final
+COST_SETTLE_DAYS = int(os.environ.get('COST_SETTLE_DAYS', '1'))
+
+# Cached days expire after this many days
+CACHE_RETENTION_DAYS = 400
+
+METRIC = 'UnblendedCost'
+
+
+class DynamoCostCache:
+    """Cached days as items keyed by cost_date, holding a service -> cost map"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def get_days(self, days: List[str]) -> Dict[str, Dict[str, float]]:
+        items = get_items(self.table, [{'cost_date': day} for day in days])
+        return {
+            item['cost_date']: {service: float(cost) for service, cost in item.get('services', {}).items()}
+            for item in items
+            if item.get('metric') == METRIC
+        }
+
+    def put_days(self, costs_by_day: Dict[str, Dict[str, float]]) -> Dict[str, int]:
+        return write_items(self.table, [
+            {
+                'cost_date': day,
+                'metric': METRIC,
+                'services': {service: Decimal(str(cost)) for service, cost in services.items()},
+                'ttl': ttl_for(day)
+            }
+            for day, services in costs_by_day.items()
+        ])
+
+
+class LocalCostCache:
+    """Cached days in a JSON file: {day: {service: cost}}"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def get_days(self, days: List[str]) -> Dict[str, Dict[str, float]]:
+        cached = self._load()
+        return {day: cached[day] for day in days if day in cached}
+
+    def put_days(self, costs_by_day: Dict[str, Dict[str, float]]) -> Dict[str, int]:
+        cached = self._load()
+        cached.update(costs_by_day)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+        return {'written': len(costs_by_day), 'failed': 0}
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+
+def get_cost_by_service_cached(ce_client, cache, start_date: date, end_date: date, today: date = None) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """
+    Service costs summed over [start_date, end_date), using cached closed
+    days and fetching only the rest. Newly fetched closed days are cached.
+    cache may be None to always fetch. Returns (service_costs, stats).
+    """
+    today = today or datetime.utcnow().date()
+    closed_before = today - timedelta(days=COST_SETTLE_DAYS)
+    days = [str(start_date + timedelta(days=offset)) for offset in range((end_date - start_date).days)]
+
+    cached = cache.get_days(days) if cache is not None else {}
+    missing = [day for day in days if day not in cached]
+
+    fetched = {}
+    api_calls = 0
+    for range_start, range_end in contiguous_ranges(missing):
+        daily, calls = fetch_daily_costs(ce_client, range_start, range_end)
+        api_calls += calls
+        for day in days_between(range_start, range_end):
+            fetched[day] = daily.get(day, {})
+
+    # Only closed days are final enough to cache
+    to_cache = {day: services for day, services in fetched.items() if date.fromisoformat(day) < closed_before}
+    write_counts = cache.put_days(to_cache) if cache is not None and to_cache else {'written': 0, 'failed': 0}
+
+    service_costs = {}
+    for services in list(cached.values()) + list(fetched.values()):
+        for service, cost in services.items():
+            service_costs[service] = service_costs.get(service, 0.0) + cost
+
+    stats = {
+        'days': len(days),
+        'cached_days': len(cached),
+        'fetched_days': len(fetched),
+        'newly_cached_days': write_counts['written'],
+        'api_calls': api_calls
+    }
+    return service_costs, stats
+
+
+def fetch_daily_costs(ce_client, start_date: str, end_date: str) -> Tuple[Dict[str, Dict[str, float]], int]:
+    """
+    Daily service costs for [start_date, end_date) from get_cost_and_usage,
+    following NextPageToken. Returns ({day: {service: cost}}, api_calls).
+    """
+    daily = {}
+    calls = 0
+    request = {
+        'TimePeriod': {'Start': start_date, 'End': end_date},
+        'Granularity': 'DAILY',
+        'Metrics': [METRIC],
+        'GroupBy': [{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
+    }
+
+    while True:
+        response = ce_client.get_cost_and_usage(**request)
+        calls += 1
+
+        for result in response['ResultsByTime']:
+            day = result['TimePeriod']['Start']
+            services = daily.setdefault(day, {})
+            for group in result['Groups']:
+                service = group['Keys'][0]
+                services[service] = services.get(service, 0.0) + float(group['Metrics'][METRIC]['Amount'])
+
+        token = response.get('NextPageToken')
+        if not token:
+            break
+        request['NextPageToken'] = token
+
+    return daily, calls
+
+
+def contiguous_ranges(days: List[str]) -> List[Tuple[str, str]]:
+    """Sorted ISO days grouped into [start, end) ranges of consecutive days"""
+    ranges = []
+    for day in sorted(days):
+        current = date.fromisoformat(day)
+        if ranges and ranges[-1][1] == current:
+            ranges[-1][1] = current + timedelta(days=1)
+        else:
+            ranges.append([current, current + timedelta(days=1)])
+    return [(str(start), str(end)) for start, end in ranges]
+
+
+def days_between(start_date: str, end_date: str) -> List[str]:
+    """ISO days in [start_date, end_date)"""
+    start = date.fromisoformat(start_date)
+    return [str(start + timedelta(days=offset)) for offset in range((date.fromisoformat(end_date) - start).days)]
+
+
+def ttl_for(day: str) -> int:
+    """Epoch second at which a cached day expires"""
+    expires = date.fromisoformat(day) + timedelta(days=CACHE_RETENTION_DAYS)
+    return int((expires - date(1970, 1, 1)).total_seconds())
+
+
+def get_cost_cache(clients):
+    """Cache backend from COST_CACHE_BACKEND: dynamodb (default), local or none"""
+    backend = os.environ.get('COST_CACHE_BACKEND', 'dynamodb').lower()
+
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalCostCache(os.environ.get('COST_CACHE_PATH', '/tmp/cost_cache.json'))
+    return DynamoCostCache(clients.table(os.environ.get('COST_CACHE_TABLE', 'CostExplorerCache')))
@@ -1,20 +1,40 @@
-import boto3
 import json
+import os
+from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, Tuple
 from decimal import Decimal
 
-# Initialize AWS clients
-ce_client = boto3.client('ce')
-dynamodb = boto3.resource('dynamodb')
-scans_table = dynamodb.Table('CostOptimizerScans')
-costs_table = dynamodb.Table('CostAnalysisHistory')
+from common.clients import ClientCache, throttles
+from common.persistence import write_items
+from common.pricing import DEFAULT_PRICE_REGION, get_catalog
+from cost_cache import get_cost_by_service_cached, get_cost_cache
+
+# AWS clients and tables are created lazily on first use
+clients = ClientCache()
+scans_table = clients.table('CostOptimizerScans')
+costs_table = clients.table('CostAnalysisHistory')
+
+# Closed days' Cost Explorer results are cached so each run only requests new days
+cost_cache = get_cost_cache(clients)
+
+# Sparse GSI on CostOptimizerScans - only idle scans carry idle_key, set to
+# their scan_date so each day's idle scans get their own partition
+IDLE_SCANS_INDEX = 'IdleScansIndex'
+
+# Concurrent per-day queries on the idle index
+IDLE_QUERY_WORKERS = int(os.environ.get('IDLE_QUERY_WORKERS', '8'))
+
+# Each scan stands for the hours until the next scheduled scan
+SCAN_INTERVAL_HOURS = float(os.environ.get('SCAN_INTERVAL_HOURS', '6'))
 
 def lambda_handler(event, context):
     """
     Fetch AWS costs from Cost Explorer and analyze spending.
     """
     print("Starting cost analysis...")
+    throttles.reset()
     
     try:
         end_date = datetime.utcnow().date()
@@ -22,13 +42,14 @@ def lambda_handler(event, context):
         
         print(f"Analyzing costs from {start_date} to {end_date}")
         
-        # Fetch cost data
-        cost_data = get_cost_by_service(start_date, end_date)
+        # Fetch cost data - cached days are not requested again
+        cost_data, cost_fetch = get_cost_by_service(start_date, end_date)
+        print(f"Cost Explorer: {cost_fetch}")
         
         # Get EC2 costs
         ec2_costs = cost_data.get('Amazon Elastic Compute Cloud - Compute', 0.0)
         
-        idle_savings = calculate_idle_instance_savings(start_date, end_date)
+        idle_savings, savings_approximate = calculate_idle_instance_savings(start_date, end_date)
         
         total_cost = sum(cost_data.values())
         
@@ -39,7 +60,7 @@ def lambda_handler(event, context):
         print(f"Date Range: {start_date} to {end_date}")
         print(f"Total AWS Cost: ${total_cost:.2f}")
         print(f"EC2 Cost: ${ec2_costs:.2f}")
-        print(f"Potential Savings from Idle Instances: ${idle_savings:.2f}")
+        print(f"Potential Savings from Idle Instances: ${idle_savings:.2f}{' (approximate)' if savings_approximate else ''}")
         print(f"\nTop 5 Services by Cost:")
         
         sorted_costs = sorted(cost_data.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -55,14 +76,18 @@ def lambda_handler(event, context):
             'total_cost': Decimal(str(total_cost)),
             'ec2_cost': Decimal(str(ec2_costs)),
             'potential_savings': Decimal(str(idle_savings)),
+            'savings_approximate': savings_approximate,
             'top_services': {k: Decimal(str(v)) for k, v in sorted_costs}
         }
         
-        try:
-            costs_table.put_item(Item=analysis_record)
+        write_counts = write_items(costs_table, [analysis_record])
+        if write_counts['written']:
             print(f"Stored cost analysis in DynamoDB")
-        except Exception as e:
-            print(f"Failed to store in DynamoDB: {str(e)}")
+        else:
+            print(f"Failed to store cost analysis in DynamoDB")
+        
+        throttle_counts = throttles.counts()
+        print(f"Throttled requests: {throttle_counts or 'none'}")
         
         return {
             'statusCode': 200,
@@ -74,8 +99,13 @@ def lambda_handler(event, context):
                 'total_cost': float(total_cost),
                 'ec2_cost': float(ec2_costs),
                 'potential_savings': float(idle_savings),
+                'savings_approximate': savings_approximate,
                 'top_services': dict(sorted_costs),
-                'cost_by_service': cost_data
+                'cost_by_service': cost_data,
+                'cost_fetch': cost_fetch,
+                'throttles': throttle_counts,
+                'stored_in_dynamodb': write_counts['written'],
+                'failed_writes': write_counts['failed']
             }, default=str)
         }
         
@@ -89,76 +119,104 @@ def lambda_handler(event, context):
         }
 
 
-def get_cost_by_service(start_date, end_date) -> Dict[str, float]:
+def get_cost_by_service(start_date, end_date) -> Tuple[Dict[str, float], Dict[str, int]]:
     """
     Fetch AWS costs grouped by service using Cost Explorer.
+    Follows NextPageToken and only requests days missing from the cost
+    cache. Returns (service costs, fetch stats).
     """
     try:
-        response = ce_client.get_cost_and_usage(
-            TimePeriod={
-                'Start': str(start_date),
-                'End': str(end_date)
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {
-                    'Type': 'DIMENSION',
-                    'Key': 'SERVICE'
-                }
-            ]
-        )
-        
-        # Aggregate costs by service
-        service_costs = {}
-        for result in response['ResultsByTime']:
-            for group in result['Groups']:
-                service = group['Keys'][0]
-                cost = float(group['Metrics']['UnblendedCost']['Amount'])
-                
-                if service in service_costs:
-                    service_costs[service] += cost
-                else:
-                    service_costs[service] = cost
-        
-        return service_costs
+        return get_cost_by_service_cached(clients.get('ce'), cost_cache, start_date, end_date)
         
     except Exception as e:
         print(f"Error fetching cost data: {str(e)}")
-        return {}
+        return {}, {}
 
 
-def calculate_idle_instance_savings(start_date, end_date) -> float:
+def calculate_idle_instance_savings(start_date, end_date) -> Tuple[float, bool]:
     """
     Calculate potential savings from idle instances based on scan data.
-    Estimates cost per hour for idle instances.
+    Reads idle instance-hours per region and instance type from the sparse
+    idle index and prices each at its on-demand hourly rate from the price
+    catalog. Types missing from the catalog are reported, not guessed.
+    Returns (savings, whether any region was priced at fallback rates).
     """
     try:
-        total_idle_hours = 0
-        
-        current_date = start_date
-        while current_date < end_date:
-            scan_date_str = str(current_date)
-            
-            response = scans_table.query(
-                KeyConditionExpression='scan_date = :date',
-                ExpressionAttributeValues={':date': scan_date_str}
-            )
-            
-            # Count idle instances
-            idle_count = sum(1 for item in response['Items'] if item.get('is_idle', False))
-            
-            total_idle_hours += (idle_count * 6)
-            
-            current_date += timedelta(days=1)
-        
-        estimated_savings = total_idle_hours * 0.0104
-        
-        print(f"  Detected {total_idle_hours} idle instance-hours")
+        idle_hours = get_idle_hours_by_type(start_date, end_date)
+        catalog = get_catalog()
+        
+        estimated_savings = 0.0
+        unpriced = {}
+        approximate_regions = set()
+        for (region, instance_type), hours in idle_hours.items():
+            price = catalog.ec2_hourly(instance_type, region)
+            if price is None:
+                unpriced[instance_type] = unpriced.get(instance_type, 0.0) + hours
+            else:
+                estimated_savings += hours * price
+                if catalog.is_approximate(region):
+                    approximate_regions.add(region)
+        
+        total_idle_hours = sum(idle_hours.values())
+        
+        print(f"  Detected {total_idle_hours:.0f} idle instance-hours across {len(idle_hours)} region/instance types")
+        if unpriced:
+            print(f"  No catalog price for: {', '.join(f'{t} ({h:.0f}h)' for t, h in sorted(unpriced.items()))}")
+        if approximate_regions:
+            print(f"  Priced at {DEFAULT_PRICE_REGION} rates (approximate): {', '.join(sorted(approximate_regions))}")
         print(f"  Estimated savings: ${estimated_savings:.2f}")
         
-        return estimated_savings
+        return estimated_savings, bool(approximate_regions)
         
     except Exception as e:
         print(f"Error calculating idle savings: {str(e)}")
-        return 0.0
\ No newline at end of file
+        return 0.0, False
+
+
+def get_idle_hours_by_type(start_date, end_date) -> Dict[Tuple[str, str], float]:
+    """
+    Idle instance-hours per (region, instance type) for scans in [start_date, end_date).
+    The sparse IdleScansIndex is partitioned by scan date, so the window is
+    read with one paginated Query per day on a small thread pool; each scan
+    counts SCAN_INTERVAL_HOURS.
+    """
+    days = []
+    current_date = start_date
+    while current_date < end_date:
+        days.append(str(current_date))
+        current_date += timedelta(days=1)
+    
+    idle_hours = {}
+    if not days:
+        return idle_hours
+    
+    with ThreadPoolExecutor(max_workers=min(IDLE_QUERY_WORKERS, len(days))) as executor:
+        for day_hours in executor.map(get_idle_hours_for_day, days):
+            for key, hours in day_hours.items():
+                idle_hours[key] = idle_hours.get(key, 0.0) + hours
+    
+    return idle_hours
+
+
+def get_idle_hours_for_day(day: str) -> Dict[Tuple[str, str], float]:
+    """Idle instance-hours per (region, instance type) in one day's idle partition"""
+    query_kwargs = {
+        'IndexName': IDLE_SCANS_INDEX,
+        'KeyConditionExpression': Key('idle_key').eq(day),
+        'ProjectionExpression': '#region, instance_type',
+        'ExpressionAttributeNames': {'#region': 'region'}
+    }
+    
+    idle_hours = {}
+    while True:
+        response = scans_table.query(**query_kwargs)
+        
+        for item in response['Items']:
+            key = (item.get('region', ''), item.get('instance_type', 'unknown'))
+            idle_hours[key] = idle_hours.get(key, 0.0) + SCAN_INTERVAL_HOURS
+        
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return idle_hours
@@ -0,0 +1,183 @@
+"""
+Thread-safe boto3 client cache shared by the scanners.
+
+Clients, resources and DynamoDB tables are created lazily on first use, so
+importing a handler does not pay for service models it never touches. All
+sessions - the default one and every assumed-role session - share one
+botocore data loader, so each service model is parsed once per process.
+
+Clients share one Config: the connection pool is sized to the caller's
+worker count and retries use botocore's adaptive mode, whose client-side
+token bucket slows callers down once a service starts throttling. Every
+throttled response is counted per service in `throttles`.
+"""
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import boto3
+import botocore.session
+from botocore.config import Config
+
+# Sessions are not thread-safe, so every client/resource is created under this lock
+_session_lock = threading.RLock()
+_default_session = None
+_data_loader = None
+
+# Error codes botocore treats as throttling (see botocore.retries.standard)
+THROTTLE_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'ProvisionedThroughputExceededException',
+    'TransactionInProgressException',
+    'RequestLimitExceeded',
+    'BandwidthLimitExceeded',
+    'LimitExceededException',
+    'RequestThrottled',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException'
+])
+
+
+class ThrottleCounter:
+    """Throttled responses per service, counted from every client's needs-retry event"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, client, service_name: str):
+        def count_throttle(response=None, **kwargs):
+            if response is not None and response[1].get('Error', {}).get('Code') in THROTTLE_ERROR_CODES:
+                with self._lock:
+                    self._counts[service_name] = self._counts.get(service_name, 0) + 1
+
+        client.meta.events.register_first('needs-retry', count_throttle)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        """Start counting afresh - called at the start of each invocation"""
+        with self._lock:
+            self._counts = {}
+
+
+throttles = ThrottleCounter()
+
+
+def new_session(**credentials) -> boto3.session.Session:
+    """
+    boto3 session whose botocore session reuses the process-wide data loader.
+    credentials are passed to boto3.session.Session (aws_access_key_id, ...).
+    """
+    global _data_loader
+
+    with _session_lock:
+        core_session = botocore.session.get_session()
+        if _data_loader is None:
+            _data_loader = core_session.get_component('data_loader')
+        else:
+            core_session.register_component('data_loader', _data_loader)
+
+        return boto3.session.Session(botocore_session=core_session, **credentials)
+
+
+def get_session() -> boto3.session.Session:
+    """Process-wide session for the Lambda's own credentials"""
+    global _default_session
+
+    with _session_lock:
+        if _default_session is None:
+            _default_session = new_session()
+        return _default_session
+
+
+def get_client_config(max_workers: Optional[int] = None) -> Config:
+    """
+    Client settings shared by every client. The pool holds MAX_POOL_CONNECTIONS
+    connections, by default enough for max_workers threads on one client
+    (never below botocore's 10). RETRY_MODE (adaptive) and RETRY_MAX_ATTEMPTS
+    (10) set the retry behaviour.
+    """
+    pool_size = int(os.environ.get('MAX_POOL_CONNECTIONS', str(max(10, max_workers or 0))))
+
+    return Config(
+        max_pool_connections=pool_size,
+        retries={
+            'mode': os.environ.get('RETRY_MODE', 'adaptive'),
+            'max_attempts': int(os.environ.get('RETRY_MAX_ATTEMPTS', '10'))
+        }
+    )
+
+
+class ClientCache:
+    """
+    Builds boto3 clients from a single session and caches them per
+    (service, region). Sessions are not thread-safe, so creation happens
+    under a lock; the clients themselves can be shared across threads.
+    """
+
+    def __init__(self, session: boto3.session.Session = None, config: Config = None):
+        self._session = session
+        self.config = config or get_client_config()
+        self._clients: Dict[Tuple[str, str], object] = {}
+        self._resources: Dict[Tuple[str, str], object] = {}
+
+    @property
+    def session(self) -> boto3.session.Session:
+        if self._session is None:
+            self._session = get_session()
+        return self._session
+
+    def get(self, service_name: str, region_name: str = None):
+        """Return the cached client for a service and region, creating it on first use"""
+        region_name = region_name or self.session.region_name
+        key = (service_name, region_name)
+
+        with _session_lock:
+            if key not in self._clients:
+                client = self.session.client(service_name, region_name=region_name, config=self.config)
+                throttles.attach(client, service_name)
+                self._clients[key] = client
+            return self._clients[key]
+
+    def resource(self, service_name: str, region_name: str = None):
+        """Return the cached resource for a service and region, creating it on first use"""
+        region_name = region_name or self.session.region_name
+        key = (service_name, region_name)
+
+        with _session_lock:
+            if key not in self._resources:
+                resource = self.session.resource(service_name, region_name=region_name, config=self.config)
+                throttles.attach(resource.meta.client, service_name)
+                self._resources[key] = resource
+            return self._resources[key]
+
+    def table(self, table_name: str) -> 'LazyTable':
+        """DynamoDB table that is only built when first used"""
+        return LazyTable(self, table_name)
+
+
+class LazyTable:
+    """
+    Stands in for a boto3 DynamoDB Table and builds it on first attribute
+    access. name is available without building anything.
+    """
+
+    def __init__(self, clients: ClientCache, name: str):
+        self.name = name
+        self._clients = clients
+        self._table = None
+
+    def __getattr__(self, attribute):
+        if self._table is None:
+            with _session_lock:
+                if self._table is None:
+                    self._table = self._clients.resource('dynamodb').Table(self.name)
+        return getattr(self._table, attribute)
@@ -0,0 +1,417 @@
+"""
+Shared resource inventory snapshots.
+
+Each account/region's resources of one kind (ec2_instance, ebs_volume,
+rds_instance + rds_cluster, lambda_function) are listed once per run into
+a compact columnar Inventory and stored with a TTL. The EC2 scanner writes
+the EC2 snapshot as part of its regular scan; the advanced scanner reuses
+it while fresh instead of calling describe_instances again, and lists the
+other kinds once for all of its checks.
+
+Backends share one interface (put, get, and get_part for the part a sharded
+scan worker scores), picked by INVENTORY_BACKEND:
+- DynamoInventoryStore: the CostOptimizerInventory table (default)
+- LocalInventoryStore: gzip files in a directory, for local runs
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from common.persistence import write_items
+
+INVENTORY_COLUMNS = ['resource_type', 'resource_id', 'type', 'state', 'created', 'tags', 'attributes']
+
+# Most rows per stored part - sharded scans hand out one part per worker
+PART_ROWS = int(os.environ.get('INVENTORY_PART_ROWS', '2000'))
+
+# Most compressed bytes per stored part - parts with large tags are split
+# further so each DynamoDB item stays under the 400 KB item limit
+PART_MAX_BYTES = int(os.environ.get('INVENTORY_PART_MAX_BYTES', '350000'))
+
+# Snapshots older than this are listed again rather than reused
+INVENTORY_MAX_AGE_MINUTES = int(os.environ.get('INVENTORY_MAX_AGE_MINUTES', '360'))
+
+# Stored snapshots expire after this many hours
+INVENTORY_TTL_HOURS = int(os.environ.get('INVENTORY_TTL_HOURS', '24'))
+
+
+class Inventory:
+    """
+    Resources as parallel columns (see INVENTORY_COLUMNS). tags is a
+    {key: value} dict per row; attributes holds kind-specific details such
+    as a volume's size or a function's memory.
+    """
+
+    def __init__(self, columns: Dict[str, List] = None):
+        self.columns = columns or {name: [] for name in INVENTORY_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['resource_id'])
+
+    def add(self, resource_type: str, resource_id: str, type: str = None, state: str = None,
+            created: str = None, tags: Dict[str, str] = None, attributes: Dict = None):
+        row = {
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'type': type,
+            'state': state,
+            'created': created,
+            'tags': tags or {},
+            'attributes': attributes or {}
+        }
+        for name in INVENTORY_COLUMNS:
+            self.columns[name].append(row[name])
+
+    def extend(self, other: 'Inventory'):
+        for name in INVENTORY_COLUMNS:
+            self.columns[name].extend(other.columns[name])
+
+    def row(self, index: int) -> Dict:
+        return {name: self.columns[name][index] for name in INVENTORY_COLUMNS}
+
+    def rows(self, resource_type: str = None) -> Iterator[Dict]:
+        """Rows as dicts, optionally only one resource type"""
+        types = self.columns['resource_type']
+        for index in range(len(self)):
+            if resource_type is None or types[index] == resource_type:
+                yield self.row(index)
+
+    def tag_index(self) -> Dict[str, Set[int]]:
+        """{tag key: set of row indexes carrying it}"""
+        index = {}
+        for row, tags in enumerate(self.columns['tags']):
+            for key in tags:
+                index.setdefault(key, set()).add(row)
+        return index
+
+    def missing_tags(self, required: List[str]) -> Dict[int, List[str]]:
+        """
+        {row index: required keys it lacks} for every row missing at least
+        one - one set difference per required key rather than a check per
+        resource and key.
+        """
+        everyone = set(range(len(self)))
+        index = self.tag_index()
+        missing = {}
+
+        for key in required:
+            for row in everyone - index.get(key, set()):
+                missing.setdefault(row, []).append(key)
+
+        return missing
+
+    def slice(self, start: int = 0, end: int = None) -> 'Inventory':
+        """Rows [start, end) as a new Inventory"""
+        return Inventory({name: values[start:end] for name, values in self.columns.items()})
+
+    def to_bytes(self, start: int = 0, end: int = None) -> bytes:
+        """Rows [start, end) as gzip-compressed column JSON"""
+        columns = self.slice(start, end).columns
+        return gzip.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Inventory':
+        return cls(json.loads(gzip.decompress(data)))
+
+    def encode_parts(self, max_rows: int = PART_ROWS, max_bytes: int = PART_MAX_BYTES) -> List[Tuple[int, int, bytes]]:
+        """
+        The rows as consecutive (start, end, data) parts of at most max_rows
+        rows and max_bytes compressed bytes. A part over max_bytes is halved
+        until it fits; a single row that does not fit raises ValueError.
+        An empty inventory is one empty part.
+        """
+        parts = []
+        start = 0
+        while True:
+            end = min(len(self), start + max_rows)
+            data = self.to_bytes(start, end)
+            while len(data) > max_bytes:
+                if end - start <= 1:
+                    raise ValueError(f"Inventory row {self.columns['resource_id'][start]} is {len(data)} bytes compressed, over {max_bytes}")
+                end = start + (end - start) // 2
+                data = self.to_bytes(start, end)
+            parts.append((start, end, data))
+            start = end
+            if start >= len(self):
+                return parts
+
+
+def is_fresh(scan_timestamp: str, max_age_minutes: int = INVENTORY_MAX_AGE_MINUTES) -> bool:
+    return datetime.utcnow() - datetime.fromisoformat(scan_timestamp) <= timedelta(minutes=max_age_minutes)
+
+
+class DynamoInventoryStore:
+    """
+    Snapshots as items keyed by snapshot_id (account#region#kind) and part,
+    each holding one part from Inventory.encode_parts. A snapshot is only
+    read back when all part_count parts of its newest scan_timestamp are
+    present.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def put(self, account_id: str, region: str, kind: str, inventory: Inventory, scan_timestamp: str) -> Dict:
+        """Store a snapshot. Returns write_items' counts plus 'parts': the (start, end) rows of each part"""
+        parts = inventory.encode_parts()
+        expires = int(time.time()) + INVENTORY_TTL_HOURS * 3600
+
+        counts = write_items(self.table, [
+            {
+                'snapshot_id': f"{account_id}#{region}#{kind}",
+                'part': part,
+                'part_count': len(parts),
+                'scan_timestamp': scan_timestamp,
+                'data': data,
+                'ttl': expires
+            }
+            for part, (_, _, data) in enumerate(parts)
+        ])
+        counts['parts'] = [(start, end) for start, end, _ in parts]
+        return counts
+
+    def get(self, account_id: str, region: str, kind: str, max_age_minutes: int = INVENTORY_MAX_AGE_MINUTES) -> Optional[Inventory]:
+        query_kwargs = {
+            'KeyConditionExpression': 'snapshot_id = :id',
+            'ExpressionAttributeValues': {':id': f"{account_id}#{region}#{kind}"}
+        }
+        items = []
+        while True:
+            response = self.table.query(**query_kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        if not items:
+            return None
+
+        newest = max(item['scan_timestamp'] for item in items)
+        parts = sorted((item for item in items if item['scan_timestamp'] == newest), key=lambda item: item['part'])
+        if len(parts) != parts[0]['part_count'] or not is_fresh(newest, max_age_minutes):
+            return None
+
+        inventory = Inventory()
+        for item in parts:
+            inventory.extend(Inventory.from_bytes(bytes(item['data'].value)))
+        return inventory
+
+    def get_part(self, account_id: str, region: str, kind: str, part: int, scan_timestamp: str) -> Optional[Inventory]:
+        """One part of the snapshot written at scan_timestamp, or None when it was replaced or expired"""
+        item = self.table.get_item(Key={'snapshot_id': f"{account_id}#{region}#{kind}", 'part': part}).get('Item')
+        if item is None or item['scan_timestamp'] != scan_timestamp:
+            return None
+        return Inventory.from_bytes(bytes(item['data'].value))
+
+
+class LocalInventoryStore:
+    """
+    Snapshots as <path>/<account>_<region>_<kind>.json.gz files: a JSON
+    header line with the scan timestamp and part row ranges, then the rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def put(self, account_id: str, region: str, kind: str, inventory: Inventory, scan_timestamp: str) -> Dict:
+        """Store a snapshot. Returns {'written', 'failed', 'parts'} like DynamoInventoryStore.put"""
+        parts = [(start, end) for start, end, _ in inventory.encode_parts()]
+        header = json.dumps({'scan_timestamp': scan_timestamp, 'parts': parts}, separators=(',', ':'))
+
+        os.makedirs(self.path, exist_ok=True)
+        target = self._file(account_id, region, kind)
+        with open(f"{target}.tmp", 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n' + inventory.to_bytes())
+        os.replace(f"{target}.tmp", target)
+        return {'written': 1, 'failed': 0, 'parts': parts}
+
+    def get(self, account_id: str, region: str, kind: str, max_age_minutes: int = INVENTORY_MAX_AGE_MINUTES) -> Optional[Inventory]:
+        stored = self._read(account_id, region, kind)
+        if stored is None or not is_fresh(stored[0]['scan_timestamp'], max_age_minutes):
+            return None
+        return Inventory.from_bytes(stored[1])
+
+    def get_part(self, account_id: str, region: str, kind: str, part: int, scan_timestamp: str) -> Optional[Inventory]:
+        """Rows of one part of the snapshot written at scan_timestamp"""
+        stored = self._read(account_id, region, kind)
+        if stored is None or stored[0]['scan_timestamp'] != scan_timestamp:
+            return None
+        start, end = stored[0]['parts'][part]
+        return Inventory.from_bytes(stored[1]).slice(start, end)
+
+    def _read(self, account_id: str, region: str, kind: str):
+        target = self._file(account_id, region, kind)
+        if not os.path.exists(target):
+            return None
+        with open(target, 'rb') as f:
+            header, _, data = f.read().partition(b'\n')
+        return json.loads(header), data
+
+    def _file(self, account_id: str, region: str, kind: str) -> str:
+        return os.path.join(self.path, f"{account_id}_{region}_{kind}.json.gz")
+
+
+def get_inventory_store(clients):
+    """Store backend from INVENTORY_BACKEND: dynamodb (default), local or none"""
+    backend = os.environ.get('INVENTORY_BACKEND', 'dynamodb').lower()
+
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalInventoryStore(os.environ.get('INVENTORY_PATH', '/tmp/inventory'))
+    return DynamoInventoryStore(clients.table(os.environ.get('INVENTORY_TABLE', 'CostOptimizerInventory')))
+
+
+def tags_to_dict(tag_list: List[Dict]) -> Dict[str, str]:
+    """[{'Key': k, 'Value': v}, ...] as {k: v}"""
+    return {tag['Key']: tag['Value'] for tag in tag_list or []}
+
+
+def collect_ec2_instances(ec2_client, states: List[str]) -> Inventory:
+    inventory = Inventory()
+    for page in ec2_client.get_paginator('describe_instances').paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': states}]
+    ):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                inventory.add(
+                    'ec2_instance', instance['InstanceId'],
+                    type=instance['InstanceType'],
+                    state=instance['State']['Name'],
+                    created=instance['LaunchTime'].isoformat(),
+                    tags=tags_to_dict(instance.get('Tags'))
+                )
+    return inventory
+
+
+def collect_ebs_volumes(ec2_client) -> Inventory:
+    inventory = Inventory()
+    for page in ec2_client.get_paginator('describe_volumes').paginate():
+        for volume in page['Volumes']:
+            inventory.add(
+                'ebs_volume', volume['VolumeId'],
+                type=volume['VolumeType'],
+                state=volume['State'],
+                created=volume['CreateTime'].isoformat(),
+                tags=tags_to_dict(volume.get('Tags')),
+                attributes={'size_gb': volume['Size']}
+            )
+    return inventory
+
+
+def collect_rds(rds_client) -> Inventory:
+    """RDS instances and Aurora clusters"""
+    inventory = Inventory()
+    for page in rds_client.get_paginator('describe_db_instances').paginate():
+        for db_instance in page['DBInstances']:
+            created = db_instance.get('InstanceCreateTime')
+            inventory.add(
+                'rds_instance', db_instance['DBInstanceIdentifier'],
+                type=db_instance['DBInstanceClass'],
+                state=db_instance.get('DBInstanceStatus'),
+                created=created.isoformat() if created else None,
+                tags=tags_to_dict(db_instance.get('TagList')),
+                attributes={'engine': db_instance.get('Engine'), 'cluster': db_instance.get('DBClusterIdentifier')}
+            )
+    for page in rds_client.get_paginator('describe_db_clusters').paginate():
+        for cluster in page['DBClusters']:
+            created = cluster.get('ClusterCreateTime')
+            inventory.add(
+                'rds_cluster', cluster['DBClusterIdentifier'],
+                type=cluster.get('EngineMode'),
+                state=cluster.get('Status'),
+                created=created.isoformat() if created else None,
+                tags=tags_to_dict(cluster.get('TagList')),
+                attributes={'engine': cluster.get('Engine')}
+            )
+    return inventory
+
+
+def collect_lambda_functions(lambda_client, tagging_client) -> Inventory:
+    """
+    Lambda functions, with tags from the Resource Groups Tagging API -
+    ListFunctions carries no tags, and one GetResources page covers 100
+    functions instead of one ListTags call each.
+    """
+    tags_by_arn = {}
+    for page in tagging_client.get_paginator('get_resources').paginate(ResourceTypeFilters=['lambda:function']):
+        for resource in page['ResourceTagMappingList']:
+            tags_by_arn[resource['ResourceARN']] = tags_to_dict(resource.get('Tags'))
+
+    inventory = Inventory()
+    for page in lambda_client.get_paginator('list_functions').paginate():
+        for function in page['Functions']:
+            inventory.add(
+                'lambda_function', function['FunctionName'],
+                type=function.get('Runtime'),
+                state=function.get('State'),
+                created=function.get('LastModified'),
+                tags=tags_by_arn.get(function['FunctionArn'], {}),
+                attributes={
+                    'memory_mb': function['MemorySize'],
+                    'architecture': (function.get('Architectures') or ['x86_64'])[0]
+                }
+            )
+    return inventory
+
+
+class InventoryCache:
+    """
+    Per-run inventories by (account, region, kind), each listed at most
+    once even when several checks ask for it concurrently. Only
+    REUSED_KINDS are read from and written to store (which may be None):
+    EC2, whose snapshot the EC2 scanner keeps current. Other kinds are
+    listed by every run, so storing them would only cost writes.
+    """
+
+    REUSED_KINDS = {'ec2_instance'}
+
+    def __init__(self, store, scan_timestamp: str, ec2_states: List[str]):
+        self.store = store
+        self.scan_timestamp = scan_timestamp
+        self.ec2_states = ec2_states
+        self.stats = {'reused': 0, 'listed': 0}
+        self._inventories: Dict[tuple, Inventory] = {}
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, account_id: str, region: str, kind: str, clients) -> Inventory:
+        key = (account_id, region, kind)
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key not in self._inventories:
+                self._inventories[key] = self._load(account_id, region, kind, clients)
+            return self._inventories[key]
+
+    def _load(self, account_id: str, region: str, kind: str, clients) -> Inventory:
+        if self.store is not None and kind in self.REUSED_KINDS:
+            inventory = self.store.get(account_id, region, kind)
+            if inventory is not None:
+                self._count('reused')
+                return inventory
+
+        if kind == 'ec2_instance':
+            inventory = collect_ec2_instances(clients.get('ec2', region), self.ec2_states)
+        elif kind == 'ebs_volume':
+            inventory = collect_ebs_volumes(clients.get('ec2', region))
+        elif kind == 'rds':
+            inventory = collect_rds(clients.get('rds', region))
+        elif kind == 'lambda_function':
+            inventory = collect_lambda_functions(clients.get('lambda', region), clients.get('resourcegroupstaggingapi', region))
+        else:
+            raise ValueError(f"Unknown inventory kind {kind}")
+
+        self._count('listed')
+        if self.store is not None and kind in self.REUSED_KINDS:
+            self.store.put(account_id, region, kind, inventory, self.scan_timestamp)
+        return inventory
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
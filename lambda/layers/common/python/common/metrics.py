@@ -0,0 +1,91 @@
+"""
+Batched CloudWatch metric retrieval through GetMetricData.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Hashable, List, Tuple
+
+# GetMetricData accepts at most 500 queries per request
+MAX_METRIC_QUERIES = 500
+
+
+def metric_stat(namespace: str, metric_name: str, dimensions: Dict[str, str], stat: str, period: int) -> Dict:
+    """Build a MetricStat for a single metric"""
+    return {
+        'Metric': {
+            'Namespace': namespace,
+            'MetricName': metric_name,
+            'Dimensions': [{'Name': name, 'Value': value} for name, value in dimensions.items()]
+        },
+        'Period': period,
+        'Stat': stat
+    }
+
+
+def get_metric_series(cloudwatch_client, metrics: Dict[Hashable, Dict], start_time: datetime, end_time: datetime, max_workers: int = 1) -> Dict[Hashable, List[Tuple[datetime, float]]]:
+    """
+    Fetch many metrics at once.
+    metrics maps a caller-chosen key to a MetricStat. Up to 500 queries are
+    packed into each get_metric_data call and NextToken is followed, so API
+    calls scale with len(metrics) / 500. With max_workers > 1 the batches
+    are fetched concurrently.
+    Returns {key: [(timestamp, value), ...]} in ascending time order. Keys
+    from a batch that failed are left out so callers can tell "no data"
+    apart from "not fetched".
+    """
+    keys = list(metrics)
+    batches = [keys[offset:offset + MAX_METRIC_QUERIES] for offset in range(0, len(keys), MAX_METRIC_QUERIES)]
+    series = {}
+
+    def fetch(batch):
+        return _fetch_batch(cloudwatch_client, batch, metrics, start_time, end_time)
+
+    if max_workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            results = list(executor.map(fetch, batches))
+    else:
+        results = [fetch(batch) for batch in batches]
+
+    for result in results:
+        series.update(result)
+
+    return series
+
+
+def _fetch_batch(cloudwatch_client, batch: List[Hashable], metrics: Dict[Hashable, Dict], start_time: datetime, end_time: datetime) -> Dict[Hashable, List[Tuple[datetime, float]]]:
+    # Query ids must start with a lowercase letter, so map them back by index
+    queries = [
+        {'Id': f"m{index}", 'MetricStat': metrics[key], 'ReturnData': True}
+        for index, key in enumerate(batch)
+    ]
+    points = {query['Id']: [] for query in queries}
+
+    try:
+        paginator = cloudwatch_client.get_paginator('get_metric_data')
+        for page in paginator.paginate(
+            MetricDataQueries=queries,
+            StartTime=start_time,
+            EndTime=end_time,
+            ScanBy='TimestampAscending'
+        ):
+            for result in page['MetricDataResults']:
+                points[result['Id']].extend(zip(result['Timestamps'], result['Values']))
+    except Exception as e:
+        print(f"Error fetching metrics for batch starting at {batch[0]}: {str(e)}")
+        return {}
+
+    return {key: sorted(points[f"m{index}"]) for index, key in enumerate(batch)}
+
+
+def average(points: List[Tuple[datetime, float]]):
+    """Mean of a series' values, or None when it has no datapoints"""
+    if not points:
+        return None
+    return sum(value for _, value in points) / len(points)
+
+
+def maximum(points: List[Tuple[datetime, float]]):
+    """Largest of a series' values, or None when it has no datapoints"""
+    if not points:
+        return None
+    return max(value for _, value in points)
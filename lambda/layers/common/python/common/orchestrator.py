@@ -0,0 +1,121 @@
+"""
+Concurrent scan orchestration with per-job timeouts and isolated failures.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict
+
+# How often jobs still queued behind max_workers are checked for having started
+START_POLL_SECONDS = 0.5
+
+
+def _timed(fn: Callable, name: str, started: Dict[str, float]):
+    started[name] = time.monotonic()
+    result = fn()
+    return result, time.monotonic() - started[name]
+
+
+def run_scans(jobs: Dict[str, Callable], timeouts: Dict[str, float], max_workers: int = 16,
+              budget: float = None) -> Dict[str, Dict]:
+    """
+    Run independent scan jobs concurrently.
+    Each job's timeout counts from when it starts running, not from when it
+    was queued, so jobs waiting behind max_workers keep their full time.
+    budget (seconds from the call) bounds the whole run: when it runs out,
+    jobs still queued are cancelled and reported as 'not_started', and
+    running jobs as 'timeout'. A job that raises or times out is reported
+    without affecting the others.
+    Returns {name: {'status': 'ok' | 'error' | 'timeout' | 'not_started', 'result', 'duration_seconds', 'error'}},
+    with duration_seconds measured from the job's start.
+
+    Python threads cannot be killed: a timed-out job's thread keeps running,
+    and holding its worker, until its current call returns; its result is
+    discarded. The executor is shut down without waiting so the caller
+    returns on time; in Lambda the abandoned threads are frozen with the
+    execution environment once the handler returns.
+    """
+    outcomes = {}
+
+    if not jobs:
+        return outcomes
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))))
+    called_at = time.monotonic()
+    run_deadline = called_at + budget if budget is not None else None
+    started = {}
+
+    futures = {executor.submit(_timed, fn, name, started): name for name, fn in jobs.items()}
+    pending = set(futures)
+
+    def deadline(future):
+        name = futures[future]
+        if name in started:
+            job_deadline = started[name] + timeouts[name]
+            return min(job_deadline, run_deadline) if run_deadline is not None else job_deadline
+        return run_deadline
+
+    try:
+        while pending:
+            now = time.monotonic()
+            wake = [deadline(future) for future in pending]
+            if any(futures[future] not in started for future in pending):
+                wake.append(now + START_POLL_SECONDS)
+            wake = [at for at in wake if at is not None]
+
+            done, pending = wait(
+                pending,
+                timeout=max(0.0, min(wake) - now) if wake else None,
+                return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+                name = futures[future]
+                try:
+                    result, duration = future.result()
+                    outcomes[name] = {'status': 'ok', 'result': result, 'duration_seconds': round(duration, 3)}
+                except Exception as e:
+                    print(f"Scan {name} failed: {str(e)}")
+                    outcomes[name] = {
+                        'status': 'error',
+                        'result': None,
+                        'duration_seconds': round(time.monotonic() - started[name], 3),
+                        'error': str(e)
+                    }
+
+            now = time.monotonic()
+            expired = set()
+
+            for future in pending:
+                name = futures[future]
+                expires_at = deadline(future)
+                if expires_at is None or expires_at > now:
+                    continue
+
+                # A job can start or finish between the deadline check and cancel(), so cancel() decides
+                if future.cancel():
+                    print(f"Scan {name} did not start before the run's time budget ran out")
+                    outcomes[name] = {
+                        'status': 'not_started',
+                        'result': None,
+                        'duration_seconds': 0.0,
+                        'error': 'not started: queued until the time budget ran out'
+                    }
+                elif future.done():
+                    # Collected by the next wait()
+                    continue
+                else:
+                    elapsed = now - started.get(name, now)
+                    print(f"Scan {name} timed out after {elapsed:.1f}s")
+                    outcomes[name] = {
+                        'status': 'timeout',
+                        'result': None,
+                        'duration_seconds': round(elapsed, 3),
+                        'error': f"timed out after {elapsed:.1f}s"
+                    }
+                expired.add(future)
+
+            pending -= expired
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return outcomes
@@ -0,0 +1,150 @@
+"""
+Batched DynamoDB reads and writes shared by all cost optimizer Lambda functions.
+"""
+import random
+import time
+from typing import Dict, Iterable, List
+
+from botocore.exceptions import ClientError
+
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_SIZE = 25
+
+# BatchGetItem accepts at most 100 keys per call
+MAX_BATCH_GET_KEYS = 100
+
+# Errors worth retrying - everything else fails the batch immediately
+RETRYABLE_ERRORS = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable'
+}
+
+
+class BatchWriter:
+    """
+    Buffers items and stores them with BatchWriteItem in 25-item batches.
+    Unprocessed items and throttled calls are retried with exponential
+    backoff and full jitter. Counts written and failed items so handlers
+    can report them in their response.
+    """
+
+    def __init__(self, table, max_attempts: int = 8, base_delay: float = 0.05, max_delay: float = 5.0):
+        self.table = table
+        self.client = table.meta.client
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.written = 0
+        self.failed = 0
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def put(self, item: Dict):
+        """Queue an item, writing a batch once 25 are buffered"""
+        self._buffer.append(item)
+
+        if len(self._buffer) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write everything still buffered"""
+        while self._buffer:
+            batch = self._buffer[:BATCH_SIZE]
+            self._buffer = self._buffer[BATCH_SIZE:]
+            self._write_batch(batch)
+
+    def counts(self) -> Dict[str, int]:
+        """Written and failed item counts so far"""
+        return {'written': self.written, 'failed': self.failed}
+
+    def _write_batch(self, items: List[Dict]):
+        pending = [{'PutRequest': {'Item': item}} for item in items]
+
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table.name: pending})
+            except ClientError as e:
+                error_code = e.response['Error']['Code']
+                if error_code not in RETRYABLE_ERRORS:
+                    print(f"Batch write to {self.table.name} failed: {str(e)}")
+                    break
+                print(f"Batch write to {self.table.name} throttled ({error_code}), retrying")
+                self._backoff(attempt)
+                continue
+            except Exception as e:
+                print(f"Batch write to {self.table.name} failed: {str(e)}")
+                break
+
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table.name, [])
+            self.written += len(pending) - len(unprocessed)
+            pending = unprocessed
+
+            if not pending:
+                return
+
+            print(f"{len(pending)} unprocessed items for {self.table.name}, retrying")
+            self._backoff(attempt)
+
+        if pending:
+            print(f"Giving up on {len(pending)} items for {self.table.name}")
+            self.failed += len(pending)
+
+    def _backoff(self, attempt: int):
+        if attempt + 1 >= self.max_attempts:
+            return
+
+        # Full jitter: sleep a random amount up to the exponential cap
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+
+def write_items(table, items: Iterable[Dict]) -> Dict[str, int]:
+    """
+    Store items in batches and return {'written': n, 'failed': n}.
+    """
+    with BatchWriter(table) as writer:
+        for item in items:
+            writer.put(item)
+
+    return writer.counts()
+
+
+def get_items(table, keys: List[Dict], max_attempts: int = 8) -> List[Dict]:
+    """
+    Read items by key with BatchGetItem, 100 keys per call, retrying
+    UnprocessedKeys with backoff. Missing keys are simply absent from the
+    result; a failed call is logged and its keys skipped.
+    """
+    items = []
+    client = table.meta.client
+
+    for offset in range(0, len(keys), MAX_BATCH_GET_KEYS):
+        request = {table.name: {'Keys': keys[offset:offset + MAX_BATCH_GET_KEYS]}}
+        attempt = 0
+
+        while request:
+            try:
+                response = client.batch_get_item(RequestItems=request)
+            except Exception as e:
+                print(f"Batch get from {table.name} failed: {str(e)}")
+                break
+
+            items.extend(response['Responses'].get(table.name, []))
+
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                attempt += 1
+                if attempt >= max_attempts:
+                    print(f"Giving up on unprocessed keys for {table.name}")
+                    break
+                time.sleep(random.uniform(0, min(2.0, 0.05 * (2 ** attempt))))
+
+    return items
@@ -0,0 +1,171 @@
+"""
+On-demand prices for EC2 instances, EBS volumes, RDS instances and S3 storage.
+
+Prices come from compressed offer files bundled in common/data, in the AWS
+Price List bulk JSON format (products + terms.OnDemand) and trimmed to the
+products the estimators need by scripts/build_price_catalog.py. Each file
+is parsed once per cold start into a flat dict keyed by
+(service, region, type, os), so every lookup is a single dict access.
+
+- ec2: hourly price, os is the operating system (Linux, Windows)
+- rds: hourly price, os is the database engine (MySQL, PostgreSQL, ...)
+- ebs: price per GB-month, os is unused ('')
+- s3: price per GB-month of the first usage tier, type is the storage class
+  (Price List volumeType, e.g. 'Standard - Infrequent Access'), os unused
+
+The build script keeps one license model and deployment variant per
+product, so each key has exactly one price; index_offer rejects offer
+files where two products share a key. Regions missing from the catalog
+are priced at DEFAULT_PRICE_REGION rates - estimators check
+is_approximate() and flag those estimates.
+Lambda is priced from the published per GB-second and per-request rates
+below, which are the same in every commercial region.
+"""
+import gzip
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+PRICE_DATA_DIR = os.environ.get('PRICE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+OFFER_FILES = ['AmazonEC2.json.gz', 'AmazonRDS.json.gz', 'AmazonS3.json.gz']
+
+# Region priced when a region is not in the bundled offer files
+DEFAULT_PRICE_REGION = 'us-east-1'
+
+HOURS_PER_MONTH = 730
+
+# RDS API engine names -> Price List databaseEngine values
+RDS_ENGINES = {
+    'mysql': 'MySQL',
+    'mariadb': 'MariaDB',
+    'postgres': 'PostgreSQL',
+    'aurora-mysql': 'Aurora MySQL',
+    'aurora-postgresql': 'Aurora PostgreSQL'
+}
+
+# Lambda compute per GB-second by architecture, and per request
+LAMBDA_GB_SECOND_PRICES = {
+    'x86_64': 0.0000166667,
+    'arm64': 0.0000133334
+}
+LAMBDA_REQUEST_PRICE = 0.0000002
+
+PriceKey = Tuple[str, str, str, str]
+
+
+class PriceCatalog:
+    """On-demand prices indexed by (service, region, type, os)"""
+
+    def __init__(self, prices: Dict[PriceKey, float] = None):
+        self.prices: Dict[PriceKey, float] = prices or {}
+        self.regions = {key[1] for key in self.prices}
+        self._fallback_logged = set()
+
+    @classmethod
+    def from_offer_files(cls, data_dir: str = PRICE_DATA_DIR) -> 'PriceCatalog':
+        prices = {}
+        for name in OFFER_FILES:
+            path = os.path.join(data_dir, name)
+            if not os.path.exists(path):
+                print(f"Price offer file {path} not found")
+                continue
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                prices.update(index_offer(json.load(f)))
+
+        return cls(prices)
+
+    def lookup(self, service: str, region: str, resource_type: str, os_name: str = '') -> Optional[float]:
+        """Unit price, or None when the catalog has no such product"""
+        if self.is_approximate(region):
+            if region not in self._fallback_logged:
+                self._fallback_logged.add(region)
+                print(f"No catalog prices for {region}, using {DEFAULT_PRICE_REGION} prices (approximate)")
+            region = DEFAULT_PRICE_REGION
+        return self.prices.get((service, region, resource_type, os_name))
+
+    def is_approximate(self, region: str) -> bool:
+        """Whether prices for a region are DEFAULT_PRICE_REGION prices standing in for it"""
+        return region not in self.regions
+
+    def ec2_hourly(self, instance_type: str, region: str, os_name: str = 'Linux') -> Optional[float]:
+        return self.lookup('ec2', region, instance_type, os_name)
+
+    def rds_hourly(self, instance_class: str, region: str, engine: str = 'mysql') -> Optional[float]:
+        return self.lookup('rds', region, instance_class, RDS_ENGINES.get(engine, engine))
+
+    def ebs_gb_month(self, volume_type: str, region: str) -> Optional[float]:
+        return self.lookup('ebs', region, volume_type)
+
+    def s3_gb_month(self, storage_class: str, region: str) -> Optional[float]:
+        return self.lookup('s3', region, storage_class)
+
+
+def index_offer(offer: Dict) -> Dict[PriceKey, float]:
+    """
+    Flatten a bulk offer file into {(service, region, type, os): price}.
+    Tiered products keep the price of their first tier. Products without an
+    on-demand USD price are skipped. Raises ValueError when two products
+    map to the same key, since either price could be the wrong one.
+    """
+    offer_code = offer.get('offerCode')
+    on_demand = offer.get('terms', {}).get('OnDemand', {})
+    prices = {}
+    skus = {}
+
+    for sku, product in offer.get('products', {}).items():
+        key = product_key(product, offer_code)
+        if key is None:
+            continue
+
+        for term in on_demand.get(sku, {}).values():
+            for dimension in term.get('priceDimensions', {}).values():
+                usd = dimension.get('pricePerUnit', {}).get('USD')
+                if usd is None or dimension.get('beginRange', '0') != '0':
+                    continue
+                if skus.setdefault(key, sku) != sku:
+                    raise ValueError(f"{offer_code} products {skus[key]} and {sku} both price {key}")
+                prices[key] = float(usd)
+
+    return prices
+
+
+def product_key(product: Dict, offer_code: str = 'AmazonEC2') -> Optional[PriceKey]:
+    """Catalog key for an offer file product, or None for products not indexed"""
+    family = product.get('productFamily')
+    attributes = product.get('attributes', {})
+    region = attributes.get('regionCode')
+
+    if offer_code == 'AmazonS3':
+        if family == 'Storage' and attributes.get('volumeType'):
+            return ('s3', region, attributes['volumeType'], '')
+        return None
+    if family == 'Compute Instance':
+        return ('ec2', region, attributes.get('instanceType'), attributes.get('operatingSystem'))
+    if family == 'Storage':
+        return ('ebs', region, attributes.get('volumeApiName'), '')
+    if family == 'Database Instance':
+        return ('rds', region, attributes.get('instanceType'), attributes.get('databaseEngine'))
+    return None
+
+
+def lambda_cost(gb_seconds: float, requests: float, architecture: str = 'x86_64') -> float:
+    """On-demand Lambda cost of the given compute and requests (free tier ignored)"""
+    gb_second_price = LAMBDA_GB_SECOND_PRICES.get(architecture, LAMBDA_GB_SECOND_PRICES['x86_64'])
+    return gb_seconds * gb_second_price + requests * LAMBDA_REQUEST_PRICE
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> PriceCatalog:
+    """Process-wide catalog, built on first use and reused by warm invocations"""
+    global _catalog
+
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = PriceCatalog.from_offer_files()
+            print(f"Loaded {len(_catalog.prices)} prices for {len(_catalog.regions)} regions")
+        return _catalog
@@ -0,0 +1,55 @@
+"""
+Multi-region fan-out for the scanners.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List
+
+
+def get_scan_regions(event: Dict = None) -> List[str]:
+    """
+    Regions to scan, taken from event['regions'], then the comma-separated
+    SCAN_REGIONS environment variable, then the Lambda's own region.
+    """
+    if event and event.get('regions'):
+        return list(event['regions'])
+
+    configured = os.environ.get('SCAN_REGIONS', '')
+    regions = [region.strip() for region in configured.split(',') if region.strip()]
+
+    if regions:
+        return regions
+
+    return [os.environ.get('AWS_REGION', 'us-east-1')]
+
+
+def get_region_workers() -> int:
+    """Upper bound on regions scanned at the same time (MAX_REGION_WORKERS)"""
+    return int(os.environ.get('MAX_REGION_WORKERS', '8'))
+
+
+def run_in_regions(scan_fn: Callable[[str], Dict], regions: List[str], max_workers: int = None) -> Dict[str, Dict]:
+    """
+    Run scan_fn(region) for every region on a bounded thread pool.
+    Wall-clock time tracks the slowest region rather than the sum.
+    Returns {region: result}; a failing region maps to {'error': message}
+    and never stops the others.
+    """
+    max_workers = max(1, min(max_workers or get_region_workers(), len(regions)))
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        started = time.monotonic()
+        futures = {executor.submit(scan_fn, region): region for region in regions}
+
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                results[region] = future.result()
+                print(f"Finished region {region} after {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"Error scanning region {region}: {str(e)}")
+                results[region] = {'error': str(e)}
+
+    return results
@@ -0,0 +1,128 @@
+"""
+Cross-account sessions through STS AssumeRole.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from botocore.config import Config
+
+from common.clients import ClientCache, new_session
+
+# Refresh assumed-role credentials this long before they expire
+REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def get_role_arns(event: Dict = None) -> List[str]:
+    """
+    Member-account roles to scan, taken from event['role_arns'] or the
+    comma-separated SCAN_ROLE_ARNS environment variable. An empty list
+    means only the Lambda's own account is scanned.
+    """
+    if event and event.get('role_arns'):
+        return list(event['role_arns'])
+
+    configured = os.environ.get('SCAN_ROLE_ARNS', '')
+    return [arn.strip() for arn in configured.split(',') if arn.strip()]
+
+
+def get_account_workers() -> int:
+    """Upper bound on accounts scanned at the same time (MAX_ACCOUNT_WORKERS)"""
+    return int(os.environ.get('MAX_ACCOUNT_WORKERS', '4'))
+
+
+def account_id_from_arn(arn: str) -> str:
+    """Account id field of an ARN (arn:partition:service:region:account:resource)"""
+    return arn.split(':')[4]
+
+
+def get_local_account_id(context, clients: ClientCache) -> str:
+    """Account the Lambda runs in, from its ARN or (when run locally) STS"""
+    if context is not None and getattr(context, 'invoked_function_arn', None):
+        return account_id_from_arn(context.invoked_function_arn)
+
+    return clients.get('sts').get_caller_identity()['Account']
+
+
+class AssumedRoleSessionCache:
+    """
+    Assumes each role once and caches the session together with a
+    ClientCache built from it. Entries are re-assumed shortly before the
+    credentials expire, which also drops clients holding stale credentials.
+
+    STS is reached through boto3's normal endpoint resolution, so a local
+    stand-in can be used by setting AWS_ENDPOINT_URL_STS (and e.g.
+    AWS_ENDPOINT_URL_EC2 for the scanned services).
+    """
+
+    def __init__(self, sts_client=None, session_name: str = 'cost-optimizer-scan', duration_seconds: int = 3600, config: Config = None):
+        self.config = config
+        self.sts_client = sts_client or ClientCache(config=config).get('sts')
+        self.session_name = session_name
+        self.duration_seconds = duration_seconds
+        self._entries: Dict[str, Dict] = {}
+        self._role_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_clients(self, role_arn: str) -> ClientCache:
+        """ClientCache for the role, assuming it if missing or close to expiry"""
+        # One lock per role, so different accounts are assumed in parallel
+        with self._lock:
+            role_lock = self._role_locks.setdefault(role_arn, threading.Lock())
+
+        with role_lock:
+            entry = self._entries.get(role_arn)
+
+            if entry is None or entry['expiration'] - REFRESH_MARGIN <= datetime.now(timezone.utc):
+                entry = self._assume(role_arn)
+                self._entries[role_arn] = entry
+
+            return entry['clients']
+
+    def _assume(self, role_arn: str) -> Dict:
+        print(f"Assuming role {role_arn}")
+        response = self.sts_client.assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=self.session_name,
+            DurationSeconds=self.duration_seconds
+        )
+        credentials = response['Credentials']
+
+        session = new_session(
+            aws_access_key_id=credentials['AccessKeyId'],
+            aws_secret_access_key=credentials['SecretAccessKey'],
+            aws_session_token=credentials['SessionToken']
+        )
+
+        return {
+            'clients': ClientCache(session, self.config),
+            'expiration': credentials['Expiration']
+        }
+
+
+def run_in_accounts(scan_fn: Callable[[str, ClientCache], Dict], role_arns: List[str], session_cache: AssumedRoleSessionCache, max_workers: int = None) -> Dict[str, Dict]:
+    """
+    Run scan_fn(account_id, clients) for every role on a bounded thread pool.
+    Returns {account_id: result}; an account whose role cannot be assumed
+    or whose scan fails maps to {'error': message}.
+    """
+    max_workers = max(1, min(max_workers or get_account_workers(), len(role_arns)))
+    results = {}
+
+    def scan_account(role_arn: str) -> Dict:
+        return scan_fn(account_id_from_arn(role_arn), session_cache.get_clients(role_arn))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scan_account, arn): account_id_from_arn(arn) for arn in role_arns}
+
+        for future in as_completed(futures):
+            account_id = futures[future]
+            try:
+                results[account_id] = future.result()
+            except Exception as e:
+                print(f"Error scanning account {account_id}: {str(e)}")
+                results[account_id] = {'error': str(e)}
+
+    return results
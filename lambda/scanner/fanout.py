@@ -0,0 +1,333 @@
+"""
+Sharded EC2 scans for fleets too large for a single invocation.
+
+The scan runs as three steps, deployed as separate Lambda functions under a
+Step Functions Distributed Map (terraform/stepfunctions.tf):
+- coordinator_handler lists every account/region's instances, stores each
+  listing as an inventory snapshot and returns one chunk per stored part
+  (at most PART_ROWS instances, fewer when their tags are large)
+- worker_handler scores one chunk: it reads its part of the snapshot,
+  fetches CPU and writes scan items and rollups exactly like the
+  single-function scanner
+- merge_handler adds the workers' counts up into the scan summary
+
+Chunk descriptors only name their part of the snapshot, and workers
+persist their scan items themselves and return only counts. The map
+writes those results to S3 rather than into the 256 KB state payload;
+the merge step reads them back through the map run's result manifest. run_local runs the same
+pipeline in-process with the workers on a process pool, for testing and
+for batch runs outside Lambda; without an inventory store it passes each
+chunk's rows inline instead.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from common.clients import ClientCache, throttles
+from common.inventory import Inventory, collect_ec2_instances
+from common.regions import get_scan_regions, run_in_regions
+from common.sessions import AssumedRoleSessionCache, account_id_from_arn, get_local_account_id, get_role_arns, run_in_accounts
+from handler import INSTANCE_STATES, INVENTORY_PAGE_SIZE, client_config, clients, get_scan_time, inventory_store, score_instances
+
+session_cache = None
+
+
+def coordinator_handler(event, context):
+    """Step Functions coordinator - lists and stores the inventory, returns the chunks to score"""
+    if inventory_store is None:
+        raise RuntimeError("Sharded scans need an inventory store (INVENTORY_BACKEND dynamodb or local)")
+    return plan_chunks(event, context)
+
+
+def worker_handler(event, context):
+    """Step Functions worker - scores one chunk ({'scan': ..., 'chunk': ...})"""
+    return score_chunk(event)
+
+
+def merge_handler(event, context):
+    """
+    Step Functions merge - event is the coordinator's output plus either the
+    workers' 'results' or the S3 'results_location' the map wrote them to
+    """
+    if 'results_location' in event:
+        location = event.pop('results_location')
+        event['results'] = load_map_results(clients.get('s3'), location['bucket'], location['manifest_key'])
+    return merge_results(event)
+
+
+def plan_chunks(event, context=None, inline: bool = False) -> Dict:
+    """
+    List each configured account/region's instances once, store the
+    listings and split them into one chunk per stored part. With inline,
+    chunks carry their rows and nothing is stored.
+    Returns {'scan': {...}, 'chunks': [...], 'total_instances': n, 'failed_targets': {...}}.
+    """
+    global session_cache
+
+    event = event or {}
+    now = get_scan_time(event)
+    scan = {
+        'scan_date': now.strftime('%Y-%m-%d'),
+        'scan_timestamp': now.isoformat(),
+        'scan_hour': now.strftime('%H:%M')
+    }
+    regions = get_scan_regions(event)
+    role_arns = get_role_arns(event)
+
+    def plan_account(account_id: str, account_clients: ClientCache, role_arn: str = None) -> Dict:
+        return run_in_regions(
+            lambda region: plan_region(account_clients, account_id, region, role_arn, scan['scan_timestamp'], inline),
+            regions
+        )
+
+    if role_arns:
+        if session_cache is None:
+            session_cache = AssumedRoleSessionCache(config=client_config)
+        arn_by_account = {account_id_from_arn(arn): arn for arn in role_arns}
+        account_results = run_in_accounts(
+            lambda account_id, account_clients: plan_account(account_id, account_clients, arn_by_account[account_id]),
+            role_arns, session_cache
+        )
+    else:
+        account_id = get_local_account_id(context, clients)
+        account_results = {account_id: plan_account(account_id, clients)}
+
+    chunks = []
+    failed_targets = {}
+    for account_id, result in account_results.items():
+        if 'error' in result:
+            failed_targets[account_id] = result['error']
+            continue
+        for region, region_result in result.items():
+            if 'error' in region_result:
+                failed_targets[f"{account_id}/{region}"] = region_result['error']
+                continue
+            chunks.extend(region_result['chunks'])
+
+    total_instances = sum(chunk['instance_count'] for chunk in chunks)
+    print(f"Planned {len(chunks)} chunks for {total_instances} instances ({len(failed_targets)} failed accounts/regions)")
+
+    return {
+        'scan': scan,
+        'chunks': chunks,
+        'total_instances': total_instances,
+        'failed_targets': failed_targets
+    }
+
+
+def plan_region(account_clients: ClientCache, account_id: str, region: str, role_arn: str, scan_timestamp: str, inline: bool) -> Dict:
+    """Chunks of one account/region's instance listing"""
+    snapshot = collect_ec2_instances(account_clients.get('ec2', region), INSTANCE_STATES)
+
+    if inline:
+        parts = [(start, end) for start, end, _ in snapshot.encode_parts()]
+    else:
+        counts = inventory_store.put(account_id, region, 'ec2_instance', snapshot, scan_timestamp)
+        if counts['failed']:
+            raise RuntimeError(f"{counts['failed']} inventory parts could not be stored")
+        parts = counts['parts']
+
+    chunks = []
+    for part, (start, end) in enumerate(parts):
+        if start == end:
+            continue
+        chunk = {
+            'account_id': account_id,
+            'role_arn': role_arn,
+            'region': region,
+            'part': part,
+            'instance_count': end - start
+        }
+        if inline:
+            chunk['rows'] = snapshot.slice(start, end).columns
+        chunks.append(chunk)
+
+    return {'chunks': chunks}
+
+
+def score_chunk(event: Dict) -> Dict:
+    """
+    Score one chunk and return its counts. Failures are reported in the
+    result rather than raised, so one bad chunk does not fail the map.
+    """
+    global session_cache
+
+    scan = event['scan']
+    chunk = event['chunk']
+    account_id = chunk['account_id']
+    region = chunk['region']
+    throttles.reset()
+
+    result = {'account_id': account_id, 'region': region, 'part': chunk['part']}
+
+    try:
+        if chunk.get('role_arn'):
+            if session_cache is None:
+                session_cache = AssumedRoleSessionCache(config=client_config)
+            account_clients = session_cache.get_clients(chunk['role_arn'])
+        else:
+            account_clients = clients
+
+        if 'rows' in chunk:
+            rows = Inventory(chunk['rows'])
+        else:
+            rows = inventory_store.get_part(account_id, region, 'ec2_instance', chunk['part'], scan['scan_timestamp'])
+            if rows is None:
+                raise RuntimeError(f"Inventory part {chunk['part']} of scan {scan['scan_timestamp']} is no longer stored")
+
+        instances = [instance_from_row(row) for row in rows.rows()]
+        pages = [instances[offset:offset + INVENTORY_PAGE_SIZE] for offset in range(0, len(instances), INVENTORY_PAGE_SIZE)]
+
+        scored = score_instances(
+            account_clients, account_id, region, pages,
+            scan['scan_date'], scan['scan_timestamp'], scan['scan_hour'],
+            rollup_chunk=str(chunk['part'])
+        )
+
+        for instance in scored['idle_instances']:
+            print(f"  - Idle: {instance['InstanceId']} ({instance['InstanceType']}, {instance['AvgCPU']:.2f}% CPU)")
+
+        result.update({
+            'total_instances': scored['total_instances'],
+            'idle_instances': len(scored['idle_instances']),
+            'written': scored['written'],
+            'failed': scored['failed'],
+            'rollups_written': scored['rollups_written'],
+            'rollups_failed': scored['rollups_failed'],
+            'metric_fetch': scored['metric_fetch']
+        })
+    except Exception as e:
+        print(f"[{account_id}/{region}] Chunk {chunk['part']} failed: {str(e)}")
+        result['error'] = str(e)
+
+    result['throttles'] = throttles.counts()
+    return result
+
+
+def instance_from_row(row: Dict) -> Dict:
+    """Inventory row in the instance format the scanner scores"""
+    instance = {
+        'InstanceId': row['resource_id'],
+        'InstanceType': row['type'],
+        'State': row['state'],
+        'LaunchTime': row['created']
+    }
+    if 'Name' in row['tags']:
+        instance['Name'] = row['tags']['Name']
+    return instance
+
+
+def load_map_results(s3_client, bucket: str, manifest_key: str) -> List[Dict]:
+    """
+    Worker results of a Distributed Map run from its ResultWriter output.
+    Child executions that failed outright become failed chunk results.
+    """
+    def read_json(bucket_name, key):
+        return json.loads(s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+
+    manifest = read_json(bucket, manifest_key)
+    results_bucket = manifest.get('DestinationBucket', bucket)
+    results = []
+
+    for result_files in manifest.get('ResultFiles', {}).values():
+        for result_file in result_files:
+            for execution in read_json(results_bucket, result_file['Key']):
+                if execution.get('Status') == 'SUCCEEDED':
+                    results.append(json.loads(execution['Output']))
+                    continue
+                chunk = json.loads(execution['Input'])['chunk']
+                results.append({
+                    'account_id': chunk['account_id'],
+                    'region': chunk['region'],
+                    'part': chunk['part'],
+                    'error': execution.get('Cause') or execution.get('Error') or execution.get('Status', 'FAILED')
+                })
+
+    print(f"Read {len(results)} chunk results from s3://{results_bucket}/{manifest_key}")
+    return results
+
+
+def merge_results(plan: Dict) -> Dict:
+    """Scan summary from the coordinator's plan and the workers' results"""
+    scan = plan['scan']
+    results: List[Dict] = plan.get('results') or []
+
+    succeeded = [r for r in results if 'error' not in r]
+    failed_chunks = [
+        {'account_id': r['account_id'], 'region': r['region'], 'part': r['part'], 'error': r['error']}
+        for r in results if 'error' in r
+    ]
+
+    def total(key):
+        return sum(r.get(key, 0) for r in succeeded)
+
+    metric_fetch = {}
+    throttle_counts = {}
+    accounts = {}
+    for r in results:
+        for key, value in r.get('metric_fetch', {}).items():
+            metric_fetch[key] = metric_fetch.get(key, 0) + value
+        for key, value in r.get('throttles', {}).items():
+            throttle_counts[key] = throttle_counts.get(key, 0) + value
+        region_summary = accounts.setdefault(r['account_id'], {}).setdefault(r['region'], {'total_instances': 0, 'idle_instances': 0, 'chunks': 0})
+        region_summary['total_instances'] += r.get('total_instances', 0)
+        region_summary['idle_instances'] += r.get('idle_instances', 0)
+        region_summary['chunks'] += 1
+
+    print(f"\n{'='*50}")
+    print(f"SHARDED SCAN COMPLETE")
+    print(f"{'='*50}")
+    print(f"Scan Date: {scan['scan_date']}")
+    print(f"Scan Time: {scan['scan_hour']} UTC")
+    print(f"Chunks scored: {len(succeeded)} ({len(failed_chunks)} failed)")
+    print(f"Failed accounts/regions: {len(plan.get('failed_targets', {}))}")
+    print(f"Total instances scanned: {total('total_instances')} of {plan.get('total_instances', 0)}")
+    print(f"Idle instances found: {total('idle_instances')}")
+    print(f"Results stored in DynamoDB: {total('written')}")
+    print(f"Failed DynamoDB writes: {total('failed')}")
+    print(f"Rollups updated: {total('rollups_written')} ({total('rollups_failed')} failed)")
+    print(f"Throttled requests: {throttle_counts or 'none'}")
+
+    status = 500 if results and not succeeded else 200
+
+    return {
+        'statusCode': status,
+        'body': json.dumps({
+            'scan_date': scan['scan_date'],
+            'scan_timestamp': scan['scan_timestamp'],
+            'scan_hour': scan['scan_hour'],
+            'total_instances': total('total_instances'),
+            'idle_instances': total('idle_instances'),
+            'stored_in_dynamodb': total('written'),
+            'failed_writes': total('failed'),
+            'rollups_written': total('rollups_written'),
+            'rollups_failed': total('rollups_failed'),
+            'metric_fetch': metric_fetch,
+            'throttles': throttle_counts,
+            'chunks': len(results),
+            'failed_chunks': failed_chunks,
+            'failed_targets': plan.get('failed_targets', {}),
+            'accounts': accounts
+        }, default=str)
+    }
+
+
+def run_local(event: Dict = None, max_workers: int = None) -> Dict:
+    """
+    Run the sharded pipeline in-process: plan, score the chunks on a
+    process pool (in this process when max_workers is 1) and merge.
+    Chunks are passed inline when no inventory store is configured.
+    """
+    plan = plan_chunks(event, inline=inventory_store is None)
+    items = [{'scan': plan['scan'], 'chunk': chunk} for chunk in plan['chunks']]
+
+    if max_workers == 1 or len(items) <= 1:
+        results = [score_chunk(item) for item in items]
+    else:
+        # spawn, so workers build their own AWS clients instead of inheriting forked connections
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(score_chunk, items))
+
+    plan['results'] = results
+    return merge_results(plan)
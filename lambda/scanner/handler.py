@@ -1,69 +1,107 @@
-import boto3
 import json
+import os
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Iterator
 from decimal import Decimal
 
-# Initialize AWS clients
-ec2_client = boto3.client('ec2')
-cloudwatch_client = boto3.client('cloudwatch')
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('CostOptimizerScans')
+from common.clients import ClientCache, get_client_config, throttles
+from common.metrics import MAX_METRIC_QUERIES, average, get_metric_series, metric_stat
+from common.inventory import Inventory, get_inventory_store, tags_to_dict
+from common.persistence import BatchWriter
+from common.regions import get_region_workers, get_scan_regions, run_in_regions
+from common.sessions import AssumedRoleSessionCache, get_account_workers, get_local_account_id, get_role_arns, run_in_accounts
+from incremental import get_cpu_averages_incremental
+from rollups import RollupAccumulator
+
+# AWS clients and tables are created lazily on first use - EC2 and CloudWatch
+# clients per scanned account and region; assumed-role sessions are reused
+# across warm invocations. Every region and account thread writes through the
+# shared DynamoDB client, so the pool is sized for all of them
+client_config = get_client_config(get_region_workers() * get_account_workers())
+clients = ClientCache(config=client_config)
+session_cache = None
+table = clients.table('CostOptimizerScans')
+state_table = clients.table(os.environ.get('METRIC_STATE_TABLE', 'CostOptimizerMetricState'))
+rollup_table = clients.table(os.environ.get('ROLLUP_TABLE', 'CostOptimizerRollups'))
+
+# Each region's instance listing is also stored as a shared inventory snapshot
+# that the advanced scanner reuses instead of listing instances again
+inventory_store = get_inventory_store(clients)
+
+# Inventory settings - states are filtered server-side, one page feeds one metric batch
+INSTANCE_STATES = os.environ.get('INSTANCE_STATES', 'running,stopped').split(',')
+INVENTORY_PAGE_SIZE = int(os.environ.get('INVENTORY_PAGE_SIZE', str(MAX_METRIC_QUERIES)))
+
+# Incremental mode only fetches CPU datapoints newer than the stored per-instance aggregate
+INCREMENTAL_METRICS = os.environ.get('INCREMENTAL_METRICS', 'false').lower() == 'true'
 
 def lambda_handler(event, context):
     """
     Main Lambda handler function.
-    Scans EC2 instances, identifies idle ones, and stores results in DynamoDB.
+    Scans EC2 instances in every configured account and region, identifies
+    idle ones, and stores results in DynamoDB.
     Runs every 6 hours to capture intraday patterns.
     """
+    global session_cache
+    
     print("Starting EC2 idle instance scan...")
+    throttles.reset()
     
-    # Get current date and timestamp
-    scan_date = datetime.utcnow().strftime('%Y-%m-%d')
-    scan_timestamp = datetime.utcnow().isoformat()
-    scan_hour = datetime.utcnow().strftime('%H:%M')
+    # Date and timestamp of this scan - a retried invocation gets the same ones
+    scan_time = get_scan_time(event)
+    scan_date = scan_time.strftime('%Y-%m-%d')
+    scan_timestamp = scan_time.isoformat()
+    scan_hour = scan_time.strftime('%H:%M')
+    regions = get_scan_regions(event)
+    role_arns = get_role_arns(event)
     
     print(f"Scan Date: {scan_date}")
     print(f"Scan Time: {scan_hour} UTC")
+    print(f"Regions: {', '.join(regions)}")
     
     try:
-        # Get all EC2 instances
-        instances = get_all_instances()
-        print(f"Found {len(instances)} EC2 instances to analyze")
+        def scan_account(account_id: str, account_clients: ClientCache) -> Dict:
+            # Regions of one account are scanned concurrently, each with its own writer
+            return run_in_regions(
+                lambda region: scan_region(account_clients, account_id, region, scan_date, scan_timestamp, scan_hour),
+                regions
+            )
         
-        idle_instances = []
-        all_scan_results = []
+        if role_arns:
+            print(f"Accounts: {len(role_arns)} member account role(s)")
+            if session_cache is None:
+                session_cache = AssumedRoleSessionCache(config=client_config)
+            account_results = run_in_accounts(scan_account, role_arns, session_cache)
+        else:
+            account_id = get_local_account_id(context, clients)
+            account_results = {account_id: scan_account(account_id, clients)}
         
-        for instance in instances:
-            is_idle = is_instance_idle(instance)
-            
-            scan_id = f"{instance['InstanceId']}#{scan_timestamp}"
-            
-            scan_item = {
-                'scan_date': scan_date,
-                'scan_id': scan_id,
-                'scan_timestamp': scan_timestamp,
-                'scan_hour': scan_hour,
-                'instance_id': instance['InstanceId'],
-                'instance_type': instance['InstanceType'],
-                'instance_state': instance['State'],
-                'launch_time': instance['LaunchTime'],
-                'avg_cpu': Decimal(str(instance.get('AvgCPU', 0.0))),
-                'is_idle': is_idle,
-                'instance_name': instance.get('Name', 'N/A')
-            }
-            
-            # Store in DynamoDB
-            try:
-                table.put_item(Item=scan_item)
-                print(f"Stored scan result for {instance['InstanceId']} at {scan_hour}")
-            except Exception as e:
-                print(f"Failed to store {instance['InstanceId']} in DynamoDB: {str(e)}")
-            
-            all_scan_results.append(scan_item)
-            
-            if is_idle:
-                idle_instances.append(instance)
+        # Flatten to one summary per (account, region)
+        region_results = []
+        failed_targets = {}
+        for account_id, result in account_results.items():
+            if 'error' in result:
+                failed_targets[account_id] = result['error']
+                continue
+            for region, region_result in result.items():
+                if 'error' in region_result:
+                    failed_targets[f"{account_id}/{region}"] = region_result['error']
+                region_results.append(region_result)
+        
+        total_instances = sum(r.get('total_instances', 0) for r in region_results)
+        idle_instances = [i for r in region_results for i in r.get('idle_instances', [])]
+        stored_count = sum(r.get('written', 0) for r in region_results)
+        failed_count = sum(r.get('failed', 0) for r in region_results)
+        rollups_written = sum(r.get('rollups_written', 0) for r in region_results)
+        rollups_failed = sum(r.get('rollups_failed', 0) for r in region_results)
+        inventory_written = sum(r.get('inventory_written', 0) for r in region_results)
+        metric_fetch = {}
+        for r in region_results:
+            for key, value in r.get('metric_fetch', {}).items():
+                metric_fetch[key] = metric_fetch.get(key, 0) + value
+        
+        if failed_targets and not any('error' not in r for r in region_results):
+            raise RuntimeError(f"All scan targets failed: {failed_targets}")
         
         # Log results
         print(f"\n{'='*50}")
@@ -71,15 +109,27 @@ def lambda_handler(event, context):
         print(f"{'='*50}")
         print(f"Scan Date: {scan_date}")
         print(f"Scan Time: {scan_hour} UTC")
-        print(f"Total instances scanned: {len(instances)}")
+        print(f"Accounts scanned: {len(account_results)}")
+        print(f"Regions per account: {len(regions)}")
+        print(f"Failed accounts/regions: {len(failed_targets)}")
+        print(f"Total instances scanned: {total_instances}")
         print(f"Idle instances found: {len(idle_instances)}")
-        print(f"Results stored in DynamoDB: {len(all_scan_results)}")
+        print(f"Results stored in DynamoDB: {stored_count}")
+        print(f"Failed DynamoDB writes: {failed_count}")
+        print(f"Rollups updated: {rollups_written} ({rollups_failed} failed)")
+        print(f"Inventory snapshot parts stored: {inventory_written}")
+        if INCREMENTAL_METRICS:
+            print(f"CPU fetch (incremental): {metric_fetch}")
+        throttle_counts = throttles.counts()
+        print(f"Throttled requests: {throttle_counts or 'none'}")
         
         if idle_instances:
             print(f"\n IDLE INSTANCES DETECTED:")
             for instance in idle_instances:
                 print(f"  - Instance ID: {instance['InstanceId']}")
                 print(f"    Name: {instance.get('Name', 'N/A')}")
+                print(f"    Account: {instance['AccountId']}")
+                print(f"    Region: {instance['Region']}")
                 print(f"    Type: {instance['InstanceType']}")
                 print(f"    Avg CPU: {instance['AvgCPU']:.2f}%")
                 print(f"    State: {instance['State']}")
@@ -94,9 +144,27 @@ def lambda_handler(event, context):
                 'scan_date': scan_date,
                 'scan_timestamp': scan_timestamp,
                 'scan_hour': scan_hour,
-                'total_instances': len(instances),
+                'total_instances': total_instances,
                 'idle_instances': len(idle_instances),
-                'stored_in_dynamodb': len(all_scan_results),
+                'stored_in_dynamodb': stored_count,
+                'failed_writes': failed_count,
+                'rollups_written': rollups_written,
+                'rollups_failed': rollups_failed,
+                'inventory_written': inventory_written,
+                'incremental_metrics': INCREMENTAL_METRICS,
+                'metric_fetch': metric_fetch,
+                'throttles': throttle_counts,
+                'accounts': {
+                    account_id: {'error': result['error']} if 'error' in result else {
+                        region: {
+                            'total_instances': r.get('total_instances', 0),
+                            'idle_instances': len(r.get('idle_instances', [])),
+                            'error': r.get('error')
+                        }
+                        for region, r in result.items()
+                    }
+                    for account_id, result in account_results.items()
+                },
                 'idle_details': idle_instances
             }, default=str)
         }
@@ -109,83 +177,223 @@ def lambda_handler(event, context):
         }
 
 
-def get_all_instances() -> List[Dict]:
+def get_scan_time(event) -> datetime:
+    """
+    Time of the scan, from the scheduled event's time when there is one.
+    Lambda retries an invocation with the same event, so a retry writes
+    the same scan items and rollup keys instead of counting the scan twice.
+    Manual invocations without a time use the current time.
+    """
+    event_time = (event or {}).get('time')
+    if event_time:
+        try:
+            return datetime.fromisoformat(event_time.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            print(f"Ignoring unparseable event time {event_time}")
+    return datetime.utcnow()
+
+
+def scan_region(account_clients: ClientCache, account_id: str, region: str, scan_date: str, scan_timestamp: str, scan_hour: str) -> Dict:
     """
-    Retrieve all EC2 instances in the account.
-    Returns a list of instance details.
+    Scan one account/region's EC2 instances and store the results.
+    Returns the instance count, idle instances and write counts.
     """
-    instances = []
+    snapshot = Inventory()
     
-    try:
-        response = ec2_client.describe_instances()
+    def pages():
+        # Stream the inventory page by page so scoring and storage start
+        # before later pages have been fetched
+        for page in iter_instance_pages(account_clients.get('ec2', region)):
+            for instance in page:
+                snapshot.add(
+                    'ec2_instance', instance['InstanceId'],
+                    type=instance['InstanceType'],
+                    state=instance['State'],
+                    created=instance['LaunchTime'],
+                    tags=instance.pop('Tags')
+                )
+            yield page
+    
+    result = score_instances(account_clients, account_id, region, pages(), scan_date, scan_timestamp, scan_hour)
+    
+    inventory_counts = {'written': 0, 'failed': 0}
+    if inventory_store is not None:
+        inventory_counts = inventory_store.put(account_id, region, 'ec2_instance', snapshot, scan_timestamp)
+    result['inventory_written'] = inventory_counts['written']
+    
+    return result
+
+
+def score_instances(account_clients: ClientCache, account_id: str, region: str, pages: Iterable[List[Dict]],
+                    scan_date: str, scan_timestamp: str, scan_hour: str, rollup_chunk: str = None) -> Dict:
+    """
+    Score pages of one account/region's instances and store the scan items
+    and rollups. Used for a whole region by scan_region and for one chunk
+    of a region by the sharded scan workers, which pass rollup_chunk so
+    that chunks of the same scan all count towards the region's day rollup.
+    """
+    cloudwatch_client = account_clients.get('cloudwatch', region)
+    
+    total_instances = 0
+    idle_instances = []
+    metric_fetch = {}
+    writer = BatchWriter(table)
+    rollups = RollupAccumulator(rollup_table, scan_date, scan_timestamp, account_id, region, chunk=rollup_chunk)
+    
+    for page in pages:
+        total_instances += len(page)
+        print(f"[{account_id}/{region}] Analyzing page of {len(page)} EC2 instances")
         
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_info = {
-                    'InstanceId': instance['InstanceId'],
-                    'InstanceType': instance['InstanceType'],
-                    'State': instance['State']['Name'],
-                    'LaunchTime': instance['LaunchTime'].isoformat()
-                }
-                
-                if 'Tags' in instance:
-                    for tag in instance['Tags']:
-                        if tag['Key'] == 'Name':
-                            instance_info['Name'] = tag['Value']
-                            break
-                
-                instances.append(instance_info)
+        # Fetch CPU for the page's running instances in batched GetMetricData calls
+        running_ids = [i['InstanceId'] for i in page if i['State'] == 'running']
+        if INCREMENTAL_METRICS:
+            cpu_by_instance, stats = get_cpu_averages_incremental(cloudwatch_client, state_table, running_ids, get_cpu_series)
+            for key, value in stats.items():
+                metric_fetch[key] = metric_fetch.get(key, 0) + value
+        else:
+            cpu_by_instance = get_cpu_averages(cloudwatch_client, running_ids)
+        
+        for instance in page:
+            instance['AccountId'] = account_id
+            instance['Region'] = region
+            is_idle = is_instance_idle(instance, cpu_by_instance)
+            
+            scan_id = f"{instance['InstanceId']}#{scan_timestamp}"
+            
+            scan_item = {
+                'scan_date': scan_date,
+                'scan_id': scan_id,
+                'scan_timestamp': scan_timestamp,
+                'scan_hour': scan_hour,
+                'account_id': account_id,
+                'region': region,
+                'instance_id': instance['InstanceId'],
+                'instance_type': instance['InstanceType'],
+                'instance_state': instance['State'],
+                'launch_time': instance['LaunchTime'],
+                'avg_cpu': Decimal(str(instance.get('AvgCPU', 0.0))),
+                'is_idle': is_idle,
+                'instance_name': instance.get('Name', 'N/A')
+            }
+            if is_idle:
+                # Idle scans land in the sparse IdleScansIndex, one partition per day
+                scan_item['idle_key'] = scan_date
+            
+            # Queue for a batched DynamoDB write
+            writer.put(scan_item)
+            rollups.add(instance['InstanceId'], instance.get('AvgCPU', 0.0), is_idle, instance.get('Name'), instance['InstanceType'])
+            
+            if is_idle:
+                idle_instances.append(instance)
+    
+    writer.flush()
+    rollups.flush()
+    
+    return {
+        'total_instances': total_instances,
+        'idle_instances': idle_instances,
+        'written': writer.written,
+        'failed': writer.failed,
+        'rollups_written': rollups.written,
+        'rollups_failed': rollups.failed,
+        'metric_fetch': metric_fetch
+    }
+
+
+def iter_instance_pages(ec2_client) -> Iterator[List[Dict]]:
+    """
+    Stream EC2 instances one describe_instances page at a time.
+    Uses the paginator with a server-side instance-state filter and
+    MaxResults page size, so no page past the first is ever dropped.
+    Yields lists of instance details, each with its tags as a dict.
+    """
+    paginator = ec2_client.get_paginator('describe_instances')
+    
+    try:
+        for response in paginator.paginate(
+            Filters=[{'Name': 'instance-state-name', 'Values': INSTANCE_STATES}],
+            PaginationConfig={'PageSize': INVENTORY_PAGE_SIZE}
+        ):
+            page = []
+            
+            for reservation in response['Reservations']:
+                for instance in reservation['Instances']:
+                    instance_info = {
+                        'InstanceId': instance['InstanceId'],
+                        'InstanceType': instance['InstanceType'],
+                        'State': instance['State']['Name'],
+                        'LaunchTime': instance['LaunchTime'].isoformat(),
+                        'Tags': tags_to_dict(instance.get('Tags'))
+                    }
+                    
+                    if 'Name' in instance_info['Tags']:
+                        instance_info['Name'] = instance_info['Tags']['Name']
+                    
+                    page.append(instance_info)
+            
+            if page:
+                yield page
                 
     except Exception as e:
         print(f"Error retrieving instances: {str(e)}")
         raise
+
+
+def get_all_instances(ec2_client) -> Iterator[Dict]:
+    """
+    Retrieve all EC2 instances in the client's region.
+    Returns a generator of instance details across every inventory page.
+    """
+    for page in iter_instance_pages(ec2_client):
+        yield from page
+
+
+def get_cpu_series(cloudwatch_client, instance_ids: List[str], start_time: datetime, end_time: datetime) -> Dict[str, List]:
+    """
+    Fetch hourly average CPU datapoints for many instances in batched
+    GetMetricData calls. Returns {instance_id: [(timestamp, value), ...]}.
+    """
+    metrics = {
+        instance_id: metric_stat('AWS/EC2', 'CPUUtilization', {'InstanceId': instance_id}, 'Average', 3600)
+        for instance_id in instance_ids
+    }
+    return get_metric_series(cloudwatch_client, metrics, start_time, end_time)
+
+
+def get_cpu_averages(cloudwatch_client, instance_ids: List[str], days: int = 7) -> Dict[str, Optional[float]]:
+    """
+    Fetch average CPU usage for many instances at once.
+    Packs up to 500 metric queries into each get_metric_data call, so API
+    calls scale with instances / 500.
+    Returns a dict of instance id -> average hourly CPU (None if no datapoints).
+    """
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(days=days)
+    
+    series = get_cpu_series(cloudwatch_client, instance_ids, start_time, end_time)
     
-    return instances
+    return {instance_id: average(points) for instance_id, points in series.items()}
 
 
-def is_instance_idle(instance: Dict) -> bool:
+def is_instance_idle(instance: Dict, cpu_by_instance: Dict[str, Optional[float]]) -> bool:
     """
     Check if an instance is idle based on CPU usage.
     An instance is considered idle if:
     - It's in 'running' state
     - Average CPU usage over last 7 days is < 5%
+    CPU values come from get_cpu_averages.
     """
     if instance['State'] != 'running':
         instance['AvgCPU'] = 0.0
         return False
     
-    try:
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
-        
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/EC2',
-            MetricName='CPUUtilization',
-            Dimensions=[
-                {
-                    'Name': 'InstanceId',
-                    'Value': instance['InstanceId']
-                }
-            ],
-            StartTime=start_time,
-            EndTime=end_time,
-            Period=3600,
-            Statistics=['Average']
-        )
-        
-        if response['Datapoints']:
-            datapoints = response['Datapoints']
-            avg_cpu = sum(dp['Average'] for dp in datapoints) / len(datapoints)
-            instance['AvgCPU'] = avg_cpu
-            
-            if avg_cpu < 5.0:
-                return True
-        else:
-            print(f" No CPU metrics found for {instance['InstanceId']}")
-            instance['AvgCPU'] = 0.0
-            
-    except Exception as e:
-        print(f"Error checking CPU for {instance['InstanceId']}: {str(e)}")
+    avg_cpu = cpu_by_instance.get(instance['InstanceId'])
+    
+    if avg_cpu is None:
+        print(f" No CPU metrics found for {instance['InstanceId']}")
         instance['AvgCPU'] = 0.0
+        return False
+    
+    instance['AvgCPU'] = avg_cpu
     
-    return False
\ No newline at end of file
+    return avg_cpu < 5.0
@@ -0,0 +1,179 @@
+"""
+Incremental CPU averages for the EC2 scanner.
+
+Instead of re-reading 7 days of hourly CPU on every run, each instance keeps
+its hourly datapoints in DynamoDB, packed as float64 values (NaN for hours
+without a datapoint) from hourly_start on. A run only fetches datapoints
+since the last datapoint seen, adds them and drops hours that have left the
+window.
+
+The window starts at the hour of now - 7d, which is where GetMetricData's
+1-hour period aligns a full 7-day fetch, so the average matches a full fetch
+whenever the scanner runs - scheduled or not.
+"""
+import math
+from array import array
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from common.persistence import BatchWriter, get_items
+
+WINDOW = timedelta(days=7)
+PERIOD = timedelta(hours=1)
+PERIOD_SECONDS = 3600
+
+
+def get_cpu_averages_incremental(cloudwatch_client, state_table, instance_ids: List[str], fetch_series, now: datetime = None) -> Tuple[Dict[str, Optional[float]], Dict[str, int]]:
+    """
+    7-day average CPU per instance from stored aggregates plus a delta fetch.
+    fetch_series(cloudwatch_client, instance_ids, start_time, end_time) must
+    return {instance_id: [(timestamp, value), ...]}.
+    Returns (averages, stats) where stats counts full, delta and skipped
+    instances and the datapoints fetched.
+    """
+    now = now or datetime.now(timezone.utc)
+    window_start = period_start(now - WINDOW)
+    states = load_states(state_table, instance_ids)
+
+    stats = {'full': 0, 'delta': 0, 'skipped': 0, 'datapoints': 0}
+
+    # Group instances by fetch start, so each group is one batched request
+    groups: Dict[datetime, List[str]] = {}
+    for instance_id in instance_ids:
+        state = states.get(instance_id)
+        last_datapoint = parse_time(state.get('last_datapoint')) if state else None
+        updated_at = parse_time(state.get('updated_at')) if state else None
+
+        if last_datapoint is None or last_datapoint < window_start or 'hourly' not in state:
+            # No usable state (new, expired or stored before hourly values)
+            states[instance_id] = {'instance_id': instance_id}
+            groups.setdefault(window_start, []).append(instance_id)
+            stats['full'] += 1
+        elif updated_at is not None and now - updated_at < PERIOD:
+            # Nothing new since the last run - reuse the stored aggregate
+            stats['skipped'] += 1
+        else:
+            # Re-read the last datapoint too, since its hour may have been partial
+            groups.setdefault(last_datapoint, []).append(instance_id)
+            stats['delta'] += 1
+
+    fetched = set()
+    for start_time, group_ids in groups.items():
+        series = fetch_series(cloudwatch_client, group_ids, start_time, now)
+
+        for instance_id, points in series.items():
+            stats['datapoints'] += len(points)
+            apply_datapoints(states[instance_id], points, window_start)
+            states[instance_id]['updated_at'] = now.isoformat()
+            fetched.add(instance_id)
+
+    averages = {}
+    for instance_id in instance_ids:
+        state = states.get(instance_id)
+        if state is None:
+            averages[instance_id] = None
+            continue
+
+        if instance_id not in fetched:
+            # Still evict expired hours for skipped or failed instances
+            apply_datapoints(state, [], window_start)
+
+        averages[instance_id] = state['cpu_sum'] / state['cpu_count'] if state['cpu_count'] else None
+
+    save_states(state_table, [states[i] for i in fetched], now)
+
+    return averages, stats
+
+
+def apply_datapoints(state: Dict, points: List[Tuple[datetime, float]], window_start: datetime):
+    """
+    Add new datapoints to the state's hourly values, replacing the previously
+    seen last datapoint if it is returned again, and drop hours before
+    window_start. Updates cpu_sum, cpu_count, last_datapoint and last_value.
+    """
+    values = unpack_hours(state.get('hourly_start'), state.get('hourly'))
+    last_datapoint = parse_time(state.get('last_datapoint'))
+    last_value = float(state['last_value']) if state.get('last_value') is not None else None
+
+    for timestamp, value in sorted(points):
+        if last_datapoint is not None and timestamp < last_datapoint:
+            continue
+
+        # One datapoint per hour, so a re-read of a partial hour overwrites it
+        values[period_key(timestamp)] = value
+        last_datapoint, last_value = timestamp, value
+
+    cutoff = int(window_start.timestamp())
+    values = {key: value for key, value in values.items() if key >= cutoff}
+
+    state['hourly_start'], state['hourly'] = pack_hours(values)
+    state['cpu_sum'] = sum(values.values())
+    state['cpu_count'] = len(values)
+
+    if last_datapoint is not None:
+        state['last_datapoint'] = last_datapoint.isoformat()
+        state['last_value'] = last_value
+
+
+def pack_hours(values: Dict[int, float]) -> Tuple[Optional[int], bytes]:
+    """Pack {hour epoch: value} as (first hour, float64 array with NaN gaps)"""
+    if not values:
+        return None, b''
+    first = min(values)
+    slots = (max(values) - first) // PERIOD_SECONDS + 1
+    packed = array('d', [values.get(first + i * PERIOD_SECONDS, math.nan) for i in range(slots)])
+    return first, packed.tobytes()
+
+
+def unpack_hours(first, packed) -> Dict[int, float]:
+    """Inverse of pack_hours; accepts the Binary wrapper boto3 returns"""
+    if first is None or not packed:
+        return {}
+    packed = array('d', getattr(packed, 'value', packed))
+    first = int(first)
+    return {first + i * PERIOD_SECONDS: value for i, value in enumerate(packed) if not math.isnan(value)}
+
+
+def load_states(state_table, instance_ids: List[str]) -> Dict[str, Dict]:
+    """Read stored aggregates with BatchGetItem, 100 keys per call"""
+    items = get_items(state_table, [{'instance_id': i} for i in instance_ids])
+    return {item['instance_id']: item for item in items}
+
+
+def save_states(state_table, states: List[Dict], now: datetime):
+    """Store updated aggregates; they expire a day after leaving the window"""
+    expires_at = int((now + WINDOW + timedelta(days=1)).timestamp())
+
+    with BatchWriter(state_table) as writer:
+        for state in states:
+            writer.put({
+                'instance_id': state['instance_id'],
+                'hourly_start': state['hourly_start'],
+                'hourly': state['hourly'],
+                'cpu_sum': Decimal(str(state['cpu_sum'])),
+                'cpu_count': state['cpu_count'],
+                'last_datapoint': state.get('last_datapoint'),
+                'last_value': Decimal(str(state['last_value'])) if state.get('last_value') is not None else None,
+                'updated_at': state['updated_at'],
+                'ttl': expires_at
+            })
+
+
+def period_key(timestamp: datetime) -> int:
+    """Epoch second at which the timestamp's hour starts"""
+    epoch = int(timestamp.timestamp())
+    return epoch - epoch % PERIOD_SECONDS
+
+
+def period_start(timestamp: datetime) -> datetime:
+    """Start of the timestamp's hour"""
+    return datetime.fromtimestamp(period_key(timestamp), tz=timezone.utc)
+
+
+def parse_time(value) -> Optional[datetime]:
+    """Parse a stored ISO timestamp (always UTC)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
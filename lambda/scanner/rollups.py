@@ -0,0 +1,276 @@
+"""
+Daily rollups of EC2 scan results, maintained at write time.
+
+Alongside the raw scan items the scanner keeps two kinds of rollup rows in
+the rollup table, keyed by rollup_date (the scan date):
+- DAY#<account>#<region>: the day's scan and idle scan counts, CPU
+  sum/min/max, the first scan timestamp and a HyperLogLog sketch of the
+  instance ids scanned that day
+- INSTANCES#<account>#<region>#<shard>[#<chunk>]: the same counters per
+  instance, for the instances whose id hashes to the shard, as one compact
+  instance_id -> [scans, idle, cpu_sum, cpu_min, cpu_max, name, type] map,
+  plus the row's first scan timestamp
+
+DAY counters use atomic UpdateItem ADD, so concurrent regions and scheduled
+runs accumulate into the same rows. Each update is conditional on the
+row's last_scan being older than the current scan, so repeating a scan
+with the same scan timestamp is a no-op. The scanner takes that timestamp
+from the invocation's event time, which Lambda keeps when it retries an
+invocation (see handler.get_scan_time).
+
+INSTANCES rows cannot be updated per instance with ADD, so each flush
+merges its instances into every touched shard row once: a read, then a
+put conditional on the row's version, retried on conflict. The row's
+applied_scans set records each scan (and chunk) merged into it, which
+makes a repeated flush a no-op. Chunks of a sharded scan write their own
+rows, so they never contend; an instance that lands in different chunks
+across the day's scans has entries in several rows, which readers sum.
+
+The sketch (instance_sketch) is a number set of register * 64 + rank
+entries. ADD on a set is a union, and the register's value is the largest
+rank stored for it, so merging sketches - across scans, chunks and days -
+is a set union that DynamoDB does atomically and that is safe to repeat.
+The dashboard estimates distinct instances from the merged registers.
+
+A sharded scan splits one region into chunks that share the DAY row and
+scan timestamp. Each chunk's DAY update records a scan#chunk token in the
+row's applied_chunks set and is conditional on its token being absent, so
+every chunk is counted once.
+"""
+import hashlib
+import os
+import random
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Set
+
+from botocore.exceptions import ClientError
+
+# HyperLogLog registers (2**SKETCH_PRECISION), about 2.3% standard error.
+# The dashboard's dynamo_reader.SKETCH_PRECISION must match.
+SKETCH_PRECISION = 11
+
+# Per-instance rollup rows per account/region and day; each row holds about
+# 60 bytes per instance, so 8 shards stay far below the 400 KB item limit
+# for regions of up to ~40,000 instances
+INSTANCE_SHARDS = int(os.environ.get('ROLLUP_INSTANCE_SHARDS', '8'))
+
+# Read/put rounds before a contended instance shard row is given up
+INSTANCE_MERGE_ATTEMPTS = 5
+
+
+class RollupAccumulator:
+    """
+    Collects one scan's counters in memory and writes them on flush():
+    one update of the account/region's day row and one merge per touched
+    instance shard row.
+    """
+
+    def __init__(self, table, scan_date: str, scan_timestamp: str, account_id: str, region: str, chunk: str = None):
+        self.table = table
+        self.client = table.meta.client
+        self.scan_date = scan_date
+        self.scan_timestamp = scan_timestamp
+        self.account_id = account_id
+        self.region = region
+        self.chunk = chunk
+        self.day = new_counters()
+        self.instance_ids: Set[str] = set()
+        self.instances: Dict[int, Dict[str, List]] = {}
+        self.written = 0
+        self.failed = 0
+
+    def add(self, instance_id: str, avg_cpu: float, is_idle: bool, name: str = None, instance_type: str = None):
+        """Record one scanned instance"""
+        add_sample(self.day, avg_cpu, is_idle)
+        self.instance_ids.add(instance_id)
+        self.instances.setdefault(instance_shard(instance_id), {})[instance_id] = [
+            1, 1 if is_idle else 0, avg_cpu, avg_cpu, avg_cpu, name or 'N/A', instance_type or 'unknown'
+        ]
+
+    def flush(self):
+        """Write the day rollup and the instance rollups"""
+        results = []
+        if self.day['scan_count']:
+            results.append(self._update(f"DAY#{self.account_id}#{self.region}", self.day, sketch_entries(self.instance_ids)))
+        for shard, entries in sorted(self.instances.items()):
+            results.append(self._merge_instances(shard, entries))
+
+        self.written += sum(1 for ok in results if ok)
+        self.failed += sum(1 for ok in results if not ok)
+        self.day = new_counters()
+        self.instance_ids = set()
+        self.instances = {}
+
+    def _update(self, rollup_key: str, counters: Dict, sketch: Set[int]) -> bool:
+        key = {'rollup_date': self.scan_date, 'rollup_key': rollup_key}
+        cpu_min = Decimal(str(counters['cpu_min']))
+        cpu_max = Decimal(str(counters['cpu_max']))
+
+        names = {'#last_scan': 'last_scan', '#region': 'region'}
+        values = {
+            ':scans': counters['scan_count'],
+            ':idle': counters['idle_count'],
+            ':cpu': Decimal(str(counters['cpu_sum'])),
+            ':sketch': sketch,
+            ':min': cpu_min,
+            ':max': cpu_max,
+            ':ts': self.scan_timestamp,
+            ':account': self.account_id,
+            ':region': self.region
+        }
+        set_clauses = [
+            '#last_scan = :ts',
+            'first_scan = if_not_exists(first_scan, :ts)',
+            'cpu_min = if_not_exists(cpu_min, :min)',
+            'cpu_max = if_not_exists(cpu_max, :max)',
+            'account_id = :account',
+            '#region = :region'
+        ]
+
+        add_clause = 'scan_count :scans, idle_count :idle, cpu_sum :cpu, instance_sketch :sketch'
+        condition = 'attribute_not_exists(#last_scan) OR #last_scan < :ts'
+        if self.chunk is not None:
+            token = f"{self.scan_timestamp}#{self.chunk}"
+            values[':token'] = token
+            values[':tokens'] = {token}
+            add_clause += ', applied_chunks :tokens'
+            condition += ' OR (#last_scan = :ts AND NOT contains(applied_chunks, :token))'
+
+        try:
+            response = self.client.update_item(
+                TableName=self.table.name,
+                Key=key,
+                UpdateExpression=f"SET {', '.join(set_clauses)} ADD {add_clause}",
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues='UPDATED_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # This scan was already rolled up (retried invocation)
+                return True
+            print(f"Error updating rollup {rollup_key}: {str(e)}")
+            return False
+
+        # min/max cannot be expressed with ADD - tighten them only when this scan moved them
+        stored = response.get('Attributes', {})
+        try:
+            if stored.get('cpu_min') is not None and stored['cpu_min'] > cpu_min:
+                self._set_bound(key, 'cpu_min', cpu_min, '>')
+            if stored.get('cpu_max') is not None and stored['cpu_max'] < cpu_max:
+                self._set_bound(key, 'cpu_max', cpu_max, '<')
+        except ClientError as e:
+            print(f"Error updating rollup bounds {rollup_key}: {str(e)}")
+
+        return True
+
+    def _merge_instances(self, shard: int, entries: Dict[str, List]) -> bool:
+        rollup_key = f"INSTANCES#{self.account_id}#{self.region}#{shard:02d}"
+        if self.chunk is not None:
+            # Chunks of one scan run concurrently, so each merges into its own rows
+            rollup_key += f"#{self.chunk}"
+        key = {'rollup_date': self.scan_date, 'rollup_key': rollup_key}
+        token = self.scan_timestamp if self.chunk is None else f"{self.scan_timestamp}#{self.chunk}"
+
+        for attempt in range(INSTANCE_MERGE_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+            try:
+                stored = self.table.get_item(Key=key, ConsistentRead=True).get('Item')
+                if stored is not None and token in stored.get('applied_scans', set()):
+                    # This scan was already merged (retried invocation)
+                    return True
+
+                instances = dict(stored['instances']) if stored else {}
+                for instance_id, entry in entries.items():
+                    instances[instance_id] = merge_instance_entry(instances.get(instance_id), entry)
+
+                item = dict(
+                    key,
+                    account_id=self.account_id,
+                    region=self.region,
+                    first_scan=stored.get('first_scan', self.scan_timestamp) if stored else self.scan_timestamp,
+                    instances=instances,
+                    applied_scans=set(stored.get('applied_scans', set()) if stored else set()) | {token},
+                    version=(stored['version'] + 1) if stored else 1
+                )
+                if stored is None:
+                    self.table.put_item(Item=item, ConditionExpression='attribute_not_exists(rollup_key)')
+                else:
+                    self.table.put_item(
+                        Item=item,
+                        ConditionExpression='version = :version',
+                        ExpressionAttributeValues={':version': stored['version']}
+                    )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    print(f"Error updating rollup {key['rollup_key']}: {str(e)}")
+                    return False
+                # Another chunk of this region merged into the row first - re-read and retry
+
+        print(f"Giving up on rollup {key['rollup_key']} after {INSTANCE_MERGE_ATTEMPTS} conflicting writes")
+        return False
+
+    def _set_bound(self, key: Dict, attribute: str, value: Decimal, comparison: str):
+        try:
+            self.client.update_item(
+                TableName=self.table.name,
+                Key=key,
+                UpdateExpression=f"SET {attribute} = :v",
+                ConditionExpression=f"{attribute} {comparison} :v",
+                ExpressionAttributeValues={':v': value}
+            )
+        except ClientError as e:
+            # A concurrent writer already stored a tighter bound
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+
+def new_counters() -> Dict:
+    return {'scan_count': 0, 'idle_count': 0, 'cpu_sum': 0.0, 'cpu_min': None, 'cpu_max': None}
+
+
+def add_sample(counters: Dict, avg_cpu: float, is_idle: bool):
+    counters['scan_count'] += 1
+    counters['idle_count'] += 1 if is_idle else 0
+    counters['cpu_sum'] += avg_cpu
+    counters['cpu_min'] = avg_cpu if counters['cpu_min'] is None else min(counters['cpu_min'], avg_cpu)
+    counters['cpu_max'] = avg_cpu if counters['cpu_max'] is None else max(counters['cpu_max'], avg_cpu)
+
+
+def merge_instance_entry(stored: List, entry: List) -> List:
+    """Combine a stored [scans, idle, cpu_sum, cpu_min, cpu_max, name, type] entry with a new one"""
+    scans, idle, cpu_sum, cpu_min, cpu_max, name, instance_type = entry
+    cpu = Decimal(str(cpu_sum))
+    if stored is None:
+        return [scans, idle, cpu, Decimal(str(cpu_min)), Decimal(str(cpu_max)), name, instance_type]
+    return [
+        stored[0] + scans,
+        stored[1] + idle,
+        stored[2] + cpu,
+        min(stored[3], Decimal(str(cpu_min))),
+        max(stored[4], Decimal(str(cpu_max))),
+        name,
+        instance_type
+    ]
+
+
+def instance_shard(instance_id: str) -> int:
+    """Instance rollup shard of an instance id, stable across scans and chunks"""
+    return int.from_bytes(hashlib.sha1(instance_id.encode('utf-8')).digest()[8:12], 'big') % INSTANCE_SHARDS
+
+
+def sketch_entries(instance_ids: Iterable[str]) -> Set[int]:
+    """HyperLogLog sketch of instance ids as register * 64 + rank entries, one per register used"""
+    width = 64 - SKETCH_PRECISION
+    ranks = {}
+    for instance_id in instance_ids:
+        hashed = int.from_bytes(hashlib.sha1(instance_id.encode('utf-8')).digest()[:8], 'big')
+        register = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > ranks.get(register, 0):
+            ranks[register] = rank
+    return {register * 64 + rank for register, rank in ranks.items()}
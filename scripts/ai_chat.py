@@ -3,11 +3,20 @@
 Interactive AI chat for AWS cost optimization
 """
 import boto3
+import math
+import os
 import subprocess
+import sys
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import read_table
+from frames import SCAN_SCHEMA
+from wire_reader import read_date_range_frame
+
 dynamodb = boto3.resource('dynamodb')
+dynamodb_client = boto3.client('dynamodb')
 scans_table = dynamodb.Table('CostOptimizerScans')
 costs_table = dynamodb.Table('CostAnalysisHistory')
 
@@ -19,44 +28,35 @@ def get_data_summary():
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=7)
     
-    all_scans = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        try:
-            response = scans_table.query(
-                KeyConditionExpression='scan_date = :date',
-                ExpressionAttributeValues={':date': str(current_date)}
-            )
-            all_scans.extend(response['Items'])
-        except:
-            pass
-        current_date += timedelta(days=1)
+    # Bulk read on the low-level client, only the columns the summary needs
+    df_scans = read_date_range_frame(
+        dynamodb_client, scans_table.name, start_date, end_date,
+        columns=['instance_id', 'instance_name', 'instance_type', 'instance_state', 'avg_cpu', 'is_idle'],
+        schema=SCAN_SCHEMA
+    )
     
-    cost_response = costs_table.scan()
-    cost_data = cost_response.get('Items', [])
+    cost_data = read_table(costs_table)
     
-    idle_scans = [s for s in all_scans if s.get('is_idle', False)]
-    unique_instances = set(s['instance_id'] for s in all_scans)
+    total_scans = len(df_scans)
+    idle_scans = int(df_scans['is_idle'].sum()) if total_scans else 0
     total_savings = sum(float(c.get('potential_savings', 0)) for c in cost_data)
     
     # Get instance details
     instance_details = {}
-    for scan in all_scans:
-        inst_id = scan['instance_id']
-        if inst_id not in instance_details:
-            instance_details[inst_id] = {
-                'name': scan.get('instance_name', 'N/A'),
-                'type': scan.get('instance_type', 'unknown'),
-                'avg_cpu': float(scan.get('avg_cpu', 0)),
-                'state': scan.get('instance_state', 'unknown')
+    if total_scans:
+        for scan in df_scans.drop_duplicates('instance_id').itertuples(index=False):
+            instance_details[scan.instance_id] = {
+                'name': scan.instance_name if isinstance(scan.instance_name, str) else 'N/A',
+                'type': scan.instance_type if isinstance(scan.instance_type, str) else 'unknown',
+                'avg_cpu': 0.0 if math.isnan(scan.avg_cpu) else float(scan.avg_cpu),
+                'state': scan.instance_state if isinstance(scan.instance_state, str) else 'unknown'
             }
     
     return {
-        'total_scans': len(all_scans),
-        'idle_scans': len(idle_scans),
-        'unique_instances': len(unique_instances),
-        'idle_percentage': (len(idle_scans) / len(all_scans) * 100) if all_scans else 0,
+        'total_scans': total_scans,
+        'idle_scans': idle_scans,
+        'unique_instances': len(instance_details),
+        'idle_percentage': (idle_scans / total_scans * 100) if total_scans else 0,
         'potential_savings': total_savings,
         'instances': instance_details
     }
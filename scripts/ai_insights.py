@@ -3,14 +3,20 @@
 Generate AI-powered insights using Ollama
 """
 import boto3
+import os
 import subprocess
+import sys
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import ROLLUP_INSTANCES_PREFIX, is_rolled_up, iter_days, raw_scan_days, read_rollups, read_table, summarize_instance_rollups
+
 dynamodb = boto3.resource('dynamodb')
 scans_table = dynamodb.Table('CostOptimizerScans')
 costs_table = dynamodb.Table('CostAnalysisHistory')
+rollups_table = dynamodb.Table('CostOptimizerRollups')
 
 def get_data_summary():
     """Gather data for AI analysis"""
@@ -18,44 +24,48 @@ def get_data_summary():
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=7)
     
-    all_scans = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        try:
-            response = scans_table.query(
-                KeyConditionExpression='scan_date = :date',
-                ExpressionAttributeValues={':date': str(current_date)}
-            )
-            all_scans.extend(response['Items'])
-        except:
-            pass
-        current_date += timedelta(days=1)
-    
     # Get cost data
-    cost_response = costs_table.scan()
-    cost_data = cost_response.get('Items', [])
+    cost_data = read_table(costs_table)
     
-    
-    idle_scans = [s for s in all_scans if s.get('is_idle', False)]
-    unique_instances = set(s['instance_id'] for s in all_scans)
-    
-    # Get instance details
+    total_scans = 0
+    idle_scans = 0
     instance_details = {}
-    for scan in all_scans:
-        inst_id = scan['instance_id']
+    
+    def add_to_instance(inst_id, name, inst_type, scans, idle, cpu_total):
         if inst_id not in instance_details:
             instance_details[inst_id] = {
-                'name': scan.get('instance_name', 'N/A'),
-                'type': scan.get('instance_type', 'unknown'),
+                'name': name or 'N/A',
+                'type': inst_type or 'unknown',
                 'scans': 0,
                 'idle_scans': 0,
                 'avg_cpu_total': 0
             }
-        instance_details[inst_id]['scans'] += 1
-        if scan.get('is_idle', False):
-            instance_details[inst_id]['idle_scans'] += 1
-        instance_details[inst_id]['avg_cpu_total'] += float(scan.get('avg_cpu', 0))
+        instance_details[inst_id]['scans'] += scans
+        instance_details[inst_id]['idle_scans'] += idle
+        instance_details[inst_id]['avg_cpu_total'] += cpu_total
+    
+    # Per-instance daily rollups cover most of the window with a few rows per
+    # account/region and day; the day before shows whether the first day was fully rolled up
+    rows = read_rollups(rollups_table, start_date - timedelta(days=1), end_date, prefix=ROLLUP_INSTANCES_PREFIX)
+    in_window = [row for row in rows if row['rollup_date'] >= str(start_date)]
+    for inst_id, totals in summarize_instance_rollups(in_window).items():
+        total_scans += totals['scan_count']
+        idle_scans += totals['idle_count']
+        add_to_instance(inst_id, totals['name'], totals['type'], totals['scan_count'], totals['idle_count'], totals['cpu_sum'])
+    
+    # Raw scans only for what the rollups do not cover, aggregated as pages stream in
+    raw_days = raw_scan_days(rows, start_date, end_date)
+    for page in iter_days(scans_table, list(raw_days)):
+        for scan in page:
+            if is_rolled_up(scan, raw_days[scan['scan_date']]):
+                continue
+            is_idle = 1 if scan.get('is_idle', False) else 0
+            total_scans += 1
+            idle_scans += is_idle
+            add_to_instance(
+                scan['instance_id'], scan.get('instance_name'), scan.get('instance_type'),
+                1, is_idle, float(scan.get('avg_cpu', 0))
+            )
     
     # Calculate averages
     for inst_id, details in instance_details.items():
@@ -65,10 +75,10 @@ def get_data_summary():
     total_savings = sum(float(c.get('potential_savings', 0)) for c in cost_data)
     
     summary = {
-        'total_scans': len(all_scans),
-        'idle_scans': len(idle_scans),
-        'unique_instances': len(unique_instances),
-        'idle_percentage': (len(idle_scans) / len(all_scans) * 100) if all_scans else 0,
+        'total_scans': total_scans,
+        'idle_scans': idle_scans,
+        'unique_instances': len(instance_details),
+        'idle_percentage': (idle_scans / total_scans * 100) if total_scans else 0,
         'potential_savings': total_savings,
         'date_range': f"{start_date} to {end_date}",
         'instance_details': instance_details
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Lambda handlers
+Each sample runs in a fresh Python process and measures:
+- import: importing the handler module (what the Lambda init phase pays)
+- first invoke: building the clients and tables the first invocation uses
+Only client construction is timed - no AWS calls are made, so it runs
+offline with dummy credentials.
+Usage: bench_cold_start.py [--baseline GIT_REF] [--runs N]
+  --baseline also measures the handlers as of GIT_REF, for a before/after comparison
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Clients and tables each handler's first invocation touches, as expressions on the handler module
+FIRST_INVOKE = {
+    'scanner': [
+        "h.clients.get('ec2')",
+        "h.clients.get('cloudwatch')",
+        "h.table.meta.client",
+        "h.rollup_table.meta.client"
+    ],
+    'advanced_scanner': [
+        "h.clients.get('ec2')",
+        "h.clients.get('rds')",
+        "h.clients.get('s3')",
+        "h.clients.get('lambda')",
+        "h.clients.get('cloudwatch')",
+        "h.table.meta.client"
+    ],
+    'cost_analyzer': [
+        "getattr(h, 'ce_client', None) or h.clients.get('ce')",
+        "h.scans_table.meta.client",
+        "h.costs_table.meta.client",
+        "h.cost_cache.table.meta.client"
+    ]
+}
+
+SAMPLE_CODE = """
+import json, sys, time
+sys.path[:0] = [{handler_dir!r}, {layer_dir!r}]
+start = time.perf_counter()
+import handler as h
+imported = time.perf_counter()
+{touches}
+invoked = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'first_invoke': invoked - imported}}))
+"""
+
+def sample(lambda_dir, function):
+    code = SAMPLE_CODE.format(
+        handler_dir=os.path.join(lambda_dir, function),
+        layer_dir=os.path.join(lambda_dir, 'layers', 'common', 'python'),
+        touches='\n'.join(FIRST_INVOKE[function])
+    )
+    env = dict(
+        os.environ,
+        AWS_DEFAULT_REGION='us-east-1',
+        AWS_ACCESS_KEY_ID='bench',
+        AWS_SECRET_ACCESS_KEY='bench',
+        COST_CACHE_BACKEND='dynamodb'
+    )
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(lambda_dir, runs):
+    results = {}
+    for function in FIRST_INVOKE:
+        samples = [sample(lambda_dir, function) for _ in range(runs)]
+        results[function] = {
+            phase: statistics.median(s[phase] for s in samples) * 1000
+            for phase in ('import', 'first_invoke')
+        }
+    return results
+
+def export_tree(ref, target):
+    """lambda/ as of ref, extracted into target"""
+    archive = os.path.join(target, 'lambda.tar')
+    subprocess.run(['git', 'archive', '-o', archive, ref, 'lambda'], cwd=REPO_DIR, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, 'lambda')
+
+def print_results(label, results):
+    print(f"\n{label}")
+    print(f"{'Function':<18} {'Import':>10} {'1st invoke':>11} {'Total':>10}")
+    print('-' * 52)
+    for function, r in results.items():
+        print(f"{function:<18} {r['import']:>8.0f}ms {r['first_invoke']:>9.0f}ms {r['import'] + r['first_invoke']:>8.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Lambda handler cold-start benchmark')
+    parser.add_argument('--baseline', help='Git ref to compare against')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per handler (median is reported)')
+    args = parser.parse_args()
+
+    current = measure(os.path.join(REPO_DIR, 'lambda'), args.runs)
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = measure(export_tree(args.baseline, tmp), args.runs)
+        print_results(f"Baseline ({args.baseline})", baseline)
+
+    print_results('Current tree', current)
+
+    if args.baseline:
+        print('\nImport speedup:')
+        for function in current:
+            before = baseline[function]['import']
+            after = current[function]['import']
+            total_before = before + baseline[function]['first_invoke']
+            total_after = after + current[function]['first_invoke']
+            print(f"  {function:<18} {before / after:.1f}x import, {total_before / total_after:.1f}x import + first invoke")
+
+if __name__ == '__main__':
+    main()
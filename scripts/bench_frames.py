@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark DataFrame construction from DynamoDB scan items
+Compares the old path (pd.DataFrame + .apply(decimal_to_float) + pd.to_datetime)
+with frames.items_to_frame on synthetic items shaped like CostOptimizerScans rows.
+Usage: bench_frames.py [rows]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from frames import SCAN_SCHEMA, items_to_frame, parse_timestamps
+
+INSTANCE_TYPES = ['t3.micro', 't3.small', 't3.medium', 'm5.large', 'm5.xlarge', 'c5.large', 'r5.large']
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-2', 'eu-west-1']
+
+def make_items(rows):
+    """Synthetic scan items with the types boto3's resource layer returns"""
+    random.seed(42)
+    start = datetime(2025, 1, 1)
+    items = []
+    for i in range(rows):
+        timestamp = start + timedelta(hours=6 * (i // 2000))
+        state = 'running' if random.random() < 0.8 else 'stopped'
+        avg_cpu = round(random.uniform(0, 60), 2) if state == 'running' else 0.0
+        items.append({
+            'scan_date': timestamp.strftime('%Y-%m-%d'),
+            'scan_id': f"i-{i % 2000:017x}#{timestamp.isoformat()}",
+            'scan_timestamp': timestamp.isoformat(),
+            'scan_hour': timestamp.strftime('%H:%M'),
+            'account_id': '123456789012',
+            'region': REGIONS[i % len(REGIONS)],
+            'instance_id': f"i-{i % 2000:017x}",
+            'instance_name': f"server-{i % 2000}",
+            'instance_type': INSTANCE_TYPES[i % len(INSTANCE_TYPES)],
+            'instance_state': state,
+            'launch_time': start.isoformat(),
+            'avg_cpu': Decimal(str(avg_cpu)),
+            'is_idle': state == 'running' and avg_cpu < 5.0
+        })
+    return items
+
+def decimal_to_float(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+def old_path(items):
+    df = pd.DataFrame(items)
+    df['avg_cpu'] = df['avg_cpu'].apply(decimal_to_float)
+    df['scan_datetime'] = pd.to_datetime(df['scan_timestamp'])
+    return df
+
+def new_path(items):
+    # The dashboard only displays the schema's columns, so only those are gathered
+    df = items_to_frame(items, SCAN_SCHEMA, columns=list(SCAN_SCHEMA))
+    df['scan_datetime'] = parse_timestamps(df['scan_timestamp'])
+    return df
+
+def measure(name, fn, items):
+    """Run fn once for wall time, once under tracemalloc for peak allocation"""
+    start = time.perf_counter()
+    df = fn(items)
+    elapsed = time.perf_counter() - start
+    frame_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    del df
+
+    tracemalloc.start()
+    df = fn(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del df
+
+    print(f"{name:<16} {elapsed:>8.2f}s {peak / 1024 / 1024:>12.1f} MB {frame_mb:>12.1f} MB")
+    return elapsed, peak
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+    print(f"Generating {rows:,} synthetic scan items...")
+    items = make_items(rows)
+
+    print(f"\n{'Path':<16} {'Time':>9} {'Peak alloc':>15} {'Frame size':>15}")
+    print('-' * 58)
+    old_time, old_peak = measure('old (apply)', old_path, items)
+    new_time, new_peak = measure('items_to_frame', new_path, items)
+    print('-' * 58)
+    print(f"Speedup: {old_time / new_time:.1f}x, peak memory: {new_peak / old_peak * 100:.0f}% of old path")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: resource-layer deserialization vs wire-format column decoding
+Decodes synthetic Query response pages shaped like CostOptimizerScans items:
+- resource: TypeDeserializer on every attribute (what boto3.resource does),
+  then frames.items_to_frame
+- wire: wire_reader.decode_pages on all attributes
+- wire + projection: decode_pages on the columns the dashboard views use
+Network time is excluded; only client-side decoding is measured.
+Usage: bench_wire_reader.py [rows]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from boto3.dynamodb.types import TypeDeserializer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from frames import SCAN_SCHEMA, items_to_frame
+from wire_reader import decode_pages
+
+# Roughly what fits in one 1 MB Query response
+PAGE_SIZE = 2000
+
+INSTANCE_TYPES = ['t3.micro', 't3.small', 't3.medium', 'm5.large', 'm5.xlarge', 'c5.large', 'r5.large']
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-2', 'eu-west-1']
+
+def make_pages(rows):
+    """Synthetic Query pages in DynamoDB wire format"""
+    random.seed(42)
+    start = datetime(2025, 1, 1)
+    pages = []
+    page = []
+    for i in range(rows):
+        timestamp = (start + timedelta(hours=6 * (i // 2000))).isoformat()
+        state = 'running' if random.random() < 0.8 else 'stopped'
+        avg_cpu = round(random.uniform(0, 60), 2) if state == 'running' else 0.0
+        page.append({
+            'scan_date': {'S': timestamp[:10]},
+            'scan_id': {'S': f"i-{i % 2000:017x}#{timestamp}"},
+            'scan_timestamp': {'S': timestamp},
+            'scan_hour': {'S': timestamp[11:16]},
+            'account_id': {'S': '123456789012'},
+            'region': {'S': REGIONS[i % len(REGIONS)]},
+            'instance_id': {'S': f"i-{i % 2000:017x}"},
+            'instance_name': {'S': f"server-{i % 2000}"},
+            'instance_type': {'S': INSTANCE_TYPES[i % len(INSTANCE_TYPES)]},
+            'instance_state': {'S': state},
+            'launch_time': {'S': start.isoformat()},
+            'avg_cpu': {'N': str(avg_cpu)},
+            'is_idle': {'BOOL': state == 'running' and avg_cpu < 5.0}
+        })
+        if len(page) == PAGE_SIZE:
+            pages.append(page)
+            page = []
+    if page:
+        pages.append(page)
+    return pages
+
+def resource_path(pages):
+    deserializer = TypeDeserializer()
+    items = []
+    for page in pages:
+        items.extend({k: deserializer.deserialize(v) for k, v in item.items()} for item in page)
+    return items_to_frame(items, SCAN_SCHEMA)
+
+def wire_path(pages):
+    return decode_pages(pages, schema=SCAN_SCHEMA)
+
+def wire_projected_path(pages):
+    # A projected query returns only these attributes; drop the rest to match
+    columns = list(SCAN_SCHEMA)
+    projected = [[{k: item[k] for k in columns if k in item} for item in page] for page in pages]
+    start = time.perf_counter()
+    df = decode_pages(projected, columns=columns, schema=SCAN_SCHEMA)
+    return df, time.perf_counter() - start
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+    print(f"Generating {rows:,} synthetic wire-format items...")
+    pages = make_pages(rows)
+
+    print(f"\n{'Path':<20} {'Time':>9} {'Rows/s':>14}")
+    print('-' * 45)
+
+    start = time.perf_counter()
+    resource_path(pages)
+    resource_time = time.perf_counter() - start
+    print(f"{'resource':<20} {resource_time:>8.2f}s {rows / resource_time:>14,.0f}")
+
+    start = time.perf_counter()
+    wire_path(pages)
+    wire_time = time.perf_counter() - start
+    print(f"{'wire':<20} {wire_time:>8.2f}s {rows / wire_time:>14,.0f}")
+
+    _, projected_time = wire_projected_path(pages)
+    print(f"{'wire + projection':<20} {projected_time:>8.2f}s {rows / projected_time:>14,.0f}")
+
+    print('-' * 45)
+    print(f"Speedup: {resource_time / wire_time:.1f}x (all columns), {resource_time / projected_time:.1f}x (projected)")
+
+if __name__ == '__main__':
+    main()
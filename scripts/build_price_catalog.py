@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Build the bundled price offer files used by common/pricing.py
+Downloads the AWS Price List bulk offer files for EC2, RDS and S3, keeps only
+on-demand prices for the products the estimators look up and writes
+trimmed offer files (same bulk JSON format) into the Lambda layer:
+- EC2: Compute Instance (shared tenancy, no pre-installed software, on-demand
+  capacity, Linux without a license / Windows with the license included)
+  and Storage (EBS volume types)
+- RDS: Database Instance (Single-AZ, no license required, MySQL/MariaDB/
+  PostgreSQL and Aurora standard storage - not I/O-Optimized)
+- S3: Storage (per storage class, all usage tiers)
+Each kept product must map to its own pricing.product_key; the build fails
+when two products share a key instead of letting one price overwrite the other.
+By default every commercial region in each offer's region index is
+included, so the estimators never fall back to DEFAULT_PRICE_REGION prices.
+Usage: build_price_catalog.py [--regions all|us-east-1,eu-west-1,...] [--source DIR]
+  --source reads <DIR>/<offer>/<region>.json instead of downloading
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'layers', 'common', 'python'))
+
+from common.pricing import index_offer
+
+PRICING_ENDPOINT = 'https://pricing.us-east-1.amazonaws.com'
+
+OUTPUT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'layers', 'common', 'python', 'common', 'data'))
+
+DEFAULT_REGIONS = 'all'
+
+# Partitions outside the commercial one (GovCloud, China, ISO) are never scanned
+NON_COMMERCIAL_PREFIXES = ('us-gov-', 'cn-', 'us-iso', 'eu-isoe-')
+
+# The one license model kept per operating system
+EC2_LICENSE_MODELS = {
+    'Linux': 'No License required',
+    'Windows': 'License Included'
+}
+
+def keep_ec2(product):
+    attributes = product.get('attributes', {})
+    if product.get('productFamily') == 'Storage':
+        return bool(attributes.get('volumeApiName'))
+    return (
+        product.get('productFamily') == 'Compute Instance'
+        and attributes.get('tenancy') == 'Shared'
+        and attributes.get('preInstalledSw') == 'NA'
+        and attributes.get('capacitystatus') == 'Used'
+        and attributes.get('marketoption', 'OnDemand') == 'OnDemand'
+        and attributes.get('operatingSystem') in EC2_LICENSE_MODELS
+        and attributes.get('licenseModel') == EC2_LICENSE_MODELS[attributes['operatingSystem']]
+    )
+
+def keep_rds(product):
+    attributes = product.get('attributes', {})
+    return (
+        product.get('productFamily') == 'Database Instance'
+        and attributes.get('deploymentOption') == 'Single-AZ'
+        and attributes.get('licenseModel') == 'No license required'
+        and 'IO Optimization' not in attributes.get('storage', '')
+        and attributes.get('databaseEngine') in ('MySQL', 'MariaDB', 'PostgreSQL', 'Aurora MySQL', 'Aurora PostgreSQL')
+    )
+
+def keep_s3(product):
+    return product.get('productFamily') == 'Storage' and bool(product.get('attributes', {}).get('volumeType'))
+
+OFFERS = {
+    'AmazonEC2': keep_ec2,
+    'AmazonRDS': keep_rds,
+    'AmazonS3': keep_s3
+}
+
+# Attributes pricing.product_key reads, plus a few for readability
+KEEP_ATTRIBUTES = ['regionCode', 'instanceType', 'operatingSystem', 'licenseModel', 'volumeApiName', 'volumeType', 'databaseEngine', 'deploymentOption', 'storage']
+
+def fetch_json(url):
+    print(f"  Downloading {url}")
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+def load_region_index(offer_code, source):
+    """region -> offer file location (a URL path, or a file under source)"""
+    if source:
+        offer_dir = os.path.join(source, offer_code)
+        return {
+            name[:-len('.json')]: os.path.join(offer_dir, name)
+            for name in sorted(os.listdir(offer_dir)) if name.endswith('.json')
+        }
+
+    region_index = fetch_json(f"{PRICING_ENDPOINT}/offers/v1.0/aws/{offer_code}/current/region_index.json")
+    return {region: entry['currentVersionUrl'] for region, entry in region_index['regions'].items()}
+
+def resolve_regions(requested, region_index):
+    """The requested regions, or every commercial region in the index for 'all'"""
+    if requested == ['all']:
+        return sorted(region for region in region_index if not region.startswith(NON_COMMERCIAL_PREFIXES))
+    return requested
+
+def load_region_offer(location, source):
+    if source:
+        with open(location) as f:
+            return json.load(f)
+
+    return fetch_json(PRICING_ENDPOINT + location)
+
+def trim_offer(offer, keep):
+    """Kept products with only their on-demand terms"""
+    products = {}
+    for sku, product in offer['products'].items():
+        if keep(product):
+            products[sku] = {
+                'sku': sku,
+                'productFamily': product['productFamily'],
+                'attributes': {k: v for k, v in product['attributes'].items() if k in KEEP_ATTRIBUTES}
+            }
+
+    on_demand = offer.get('terms', {}).get('OnDemand', {})
+    return products, {sku: on_demand[sku] for sku in products if sku in on_demand}
+
+def main():
+    parser = argparse.ArgumentParser(description='Build bundled price offer files')
+    parser.add_argument('--regions', default=DEFAULT_REGIONS, help="Comma-separated regions to include, or 'all' commercial regions")
+    parser.add_argument('--source', help='Directory of already downloaded offer files')
+    args = parser.parse_args()
+
+    regions = [region.strip() for region in args.regions.split(',') if region.strip()]
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    for offer_code, keep in OFFERS.items():
+        region_index = load_region_index(offer_code, args.source)
+        offer_regions = resolve_regions(regions, region_index)
+        missing = [region for region in offer_regions if region not in region_index]
+        if missing:
+            print(f"Error: no {offer_code} offer for {', '.join(missing)}")
+            return 1
+
+        print(f"Building {offer_code} for {', '.join(offer_regions)}")
+        trimmed = {'formatVersion': 'v1.0', 'offerCode': offer_code, 'products': {}, 'terms': {'OnDemand': {}}}
+
+        for region in offer_regions:
+            offer = load_region_offer(region_index[region], args.source)
+            trimmed['publicationDate'] = offer.get('publicationDate')
+            products, terms = trim_offer(offer, keep)
+            trimmed['products'].update(products)
+            trimmed['terms']['OnDemand'].update(terms)
+            print(f"  {region}: {len(products)} products")
+
+        try:
+            index_offer(trimmed)
+        except ValueError as e:
+            print(f"Error: {str(e)} - tighten the {offer_code} filters")
+            return 1
+
+        output = os.path.join(OUTPUT_DIR, f"{offer_code}.json.gz")
+        # mtime=0 keeps rebuilds of unchanged prices byte-identical
+        with gzip.GzipFile(output, 'wb', compresslevel=9, mtime=0) as f:
+            f.write(json.dumps(trimmed, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+        print(f"Wrote {len(trimmed['products'])} products to {output} ({os.path.getsize(output):,} bytes)")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Export a cost optimizer table to compressed JSONL or Parquet
+Streams the whole table with a parallel segmented Scan; memory stays bounded
+by the pages in flight (JSONL) or one row group batch (Parquet).
+Usage: export_history.py <scans|costs|advanced> <output> [--format jsonl|parquet] [--segments N]
+  output ending in .gz        -> gzip-compressed JSON lines
+  any other output            -> directory of zstd Parquet part files
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import DEFAULT_SCAN_SEGMENTS, iter_scan_pages, parallel_scan
+from wire_reader import decode_pages
+
+TABLES = {
+    'scans': 'CostOptimizerScans',
+    'costs': 'CostAnalysisHistory',
+    'advanced': 'AdvancedResourceScans'
+}
+
+# Rows per Parquet part file
+PARQUET_BATCH_ROWS = 100000
+
+def json_default(value):
+    """Decimals back to JSON numbers, sets to lists"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def export_jsonl(table_name, output, segments):
+    """One JSON object per line, gzip-compressed"""
+    table = boto3.resource('dynamodb').Table(table_name)
+    rows = 0
+
+    with gzip.open(output, 'wt', encoding='utf-8', compresslevel=6) as f:
+        for page in parallel_scan(table, total_segments=segments):
+            f.writelines(json.dumps(item, default=json_default) + '\n' for item in page)
+            rows += len(page)
+            print(f"  {rows:,} rows", end='\r')
+
+    return rows
+
+def export_parquet(table_name, output, segments):
+    """Part files of up to PARQUET_BATCH_ROWS rows, decoded straight from the wire format"""
+    client = boto3.client('dynamodb')
+    os.makedirs(output, exist_ok=True)
+    rows = 0
+    part = 0
+    batch = []
+    batch_rows = 0
+
+    def write_batch():
+        nonlocal part
+        df = decode_pages(batch)
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            os.path.join(output, f"part-{part:05d}.parquet"),
+            compression='zstd'
+        )
+        part += 1
+
+    for page in iter_scan_pages(client, table_name, segments):
+        batch.append(page)
+        batch_rows += len(page)
+        rows += len(page)
+        if batch_rows >= PARQUET_BATCH_ROWS:
+            write_batch()
+            batch, batch_rows = [], 0
+        print(f"  {rows:,} rows", end='\r')
+
+    if batch_rows:
+        write_batch()
+
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a cost optimizer table')
+    parser.add_argument('table', choices=sorted(TABLES), help='Table to export')
+    parser.add_argument('output', help='Output .jsonl.gz file or Parquet directory')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], help='Defaults from the output name')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SCAN_SEGMENTS, help='Parallel Scan segments')
+    args = parser.parse_args()
+
+    export_format = args.format or ('jsonl' if args.output.endswith('.gz') else 'parquet')
+    table_name = TABLES[args.table]
+
+    print(f"Exporting {table_name} to {args.output} ({export_format}, {args.segments} segments)")
+    start = time.perf_counter()
+
+    if export_format == 'jsonl':
+        rows = export_jsonl(table_name, args.output, args.segments)
+    else:
+        rows = export_parquet(table_name, args.output, args.segments)
+
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"Exported {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Show the scan history of a single EC2 instance
+Usage: instance_history.py <instance-id> [days]
+"""
+import boto3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import query_instance_history
+
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table('CostOptimizerScans')
+
+def show_instance_history(instance_id, days):
+    """Print every scan of the instance in the time window"""
+    items = query_instance_history(table, instance_id, days)
+    
+    if not items:
+        print(f"No scans found for {instance_id} in the last {days} days.")
+        return
+    
+    idle_scans = sum(1 for item in items if item.get('is_idle', False))
+    avg_cpu = sum(float(item.get('avg_cpu', 0)) for item in items) / len(items)
+    latest = items[-1]
+    
+    print(f"\n{'='*70}")
+    print(f"SCAN HISTORY: {instance_id} ({latest.get('instance_name', 'N/A')})")
+    print(f"{'='*70}")
+    print(f"Type: {latest.get('instance_type', 'unknown')}")
+    print(f"Region: {latest.get('region', 'unknown')}")
+    print(f"Scans in last {days} days: {len(items)}")
+    print(f"Idle scans: {idle_scans} ({idle_scans / len(items) * 100:.0f}%)")
+    print(f"Average CPU: {avg_cpu:.2f}%")
+    print(f"\n{'-'*70}\n")
+    
+    for item in items:
+        idle_marker = 'IDLE' if item.get('is_idle', False) else ''
+        print(f"  {item['scan_timestamp'][:16]}  {item.get('instance_state', 'unknown'):<10} "
+              f"CPU {float(item.get('avg_cpu', 0)):6.2f}%  {idle_marker}")
+    
+    print(f"\n{'='*70}\n")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: instance_history.py <instance-id> [days]")
+        sys.exit(1)
+    
+    instance_id = sys.argv[1]
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    
+    show_instance_history(instance_id, days)
@@ -1,18 +1,19 @@
 #!/usr/bin/env python3
 import boto3
+import os
 import sys
 from datetime import datetime
 from decimal import Decimal
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import read_date_range
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('CostOptimizerScans')
 
 def get_scans_for_date(scan_date):
-    response = table.query(
-        KeyConditionExpression='scan_date = :date',
-        ExpressionAttributeValues={':date': scan_date}
-    )
-    return response['Items']
+    day = datetime.strptime(scan_date, '%Y-%m-%d').date()
+    return read_date_range(table, day, day)
 
 if __name__ == '__main__':
     scan_date = sys.argv[1] if len(sys.argv) > 1 else datetime.utcnow().strftime('%Y-%m-%d')
@@ -4,20 +4,22 @@ Query and display scan results from DynamoDB
 Supports multiple scans per day (6-hour intervals)
 """
 import boto3
+import os
+import sys
 from datetime import datetime, timedelta
 from decimal import Decimal
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import read_date_range
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('CostOptimizerScans')
 
 def get_scans_for_date(scan_date):
     """Get all scans for a specific date"""
-    response = table.query(
-        KeyConditionExpression='scan_date = :date',
-        ExpressionAttributeValues={':date': scan_date}
-    )
-    return response['Items']
+    day = datetime.strptime(scan_date, '%Y-%m-%d').date()
+    return read_date_range(table, day, day)
 
 def display_scans(items):
     """Pretty print scan results"""
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Run the sharded EC2 scan locally
+Plans the chunks, scores them on a process pool and prints the merged
+summary - the same pipeline the Step Functions state machine runs, for
+testing and for batch runs outside Lambda. Uses the AWS credentials and
+DynamoDB tables of the current environment.
+Usage: run_sharded_scan.py [--regions R1,R2] [--role-arns ARN,...] [--workers N] [--inventory-path DIR]
+  --inventory-path stores the inventory snapshot as local files instead of DynamoDB
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the sharded EC2 scan on a local process pool')
+    parser.add_argument('--regions', help='Comma-separated regions (default: SCAN_REGIONS or the session region)')
+    parser.add_argument('--role-arns', help='Comma-separated member account roles to assume')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (1 scores in this process)')
+    parser.add_argument('--inventory-path', help='Directory for local inventory snapshots')
+    args = parser.parse_args()
+
+    if args.inventory_path:
+        os.environ['INVENTORY_BACKEND'] = 'local'
+        os.environ['INVENTORY_PATH'] = args.inventory_path
+
+    # Worker processes inherit sys.path, so they import the same modules
+    sys.path[:0] = [os.path.join(REPO_DIR, 'lambda', 'scanner'), os.path.join(REPO_DIR, 'lambda', 'layers', 'common', 'python')]
+    import fanout
+
+    event = {}
+    if args.regions:
+        event['regions'] = args.regions.split(',')
+    if args.role_arns:
+        event['role_arns'] = args.role_arns.split(',')
+
+    response = fanout.run_local(event, max_workers=args.workers)
+    print(json.dumps(json.loads(response['body']), indent=2))
+    return 0 if response['statusCode'] == 200 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,10 +3,15 @@
 View advanced resource scan results
 """
 import boto3
+import os
+import sys
 from datetime import datetime, timedelta
 from decimal import Decimal
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import read_date_range
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('AdvancedResourceScans')
 
@@ -15,19 +20,7 @@ def view_advanced_scans():
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=7)
     
-    all_findings = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        try:
-            response = table.query(
-                KeyConditionExpression='scan_date = :date',
-                ExpressionAttributeValues={':date': str(current_date)}
-            )
-            all_findings.extend(response['Items'])
-        except:
-            pass
-        current_date += timedelta(days=1)
+    all_findings = read_date_range(table, start_date, end_date)
     
     if not all_findings:
         print("No advanced scan data found.")
@@ -79,7 +72,7 @@ def view_advanced_scans():
             elif resource_type == 'lambda_function':
                 print(f"  Memory: {finding.get('memory_mb', 'N/A')} MB")
                 print(f"  Weekly Invocations: {finding.get('weekly_invocations', 'N/A')}")
-            elif resource_type == 'ec2_untagged':
+            elif resource_type.endswith('_untagged'):
                 print(f"  Missing Tags: {finding.get('missing_tags', 'N/A')}")
     
     print(f"\n{'='*70}\n")
@@ -3,14 +3,18 @@
 View cost analysis history
 """
 import boto3
+import os
+import sys
 from decimal import Decimal
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+from dynamo_reader import read_table
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('CostAnalysisHistory')
 
 def view_cost_history():
-    response = table.scan()
-    items = response['Items']
+    items = read_table(table)
     
     if not items:
         print("No cost analysis data found.")
@@ -15,6 +15,40 @@ resource "aws_dynamodb_table" "scans" {
     type = "S"
   }
 
+  attribute {
+    name = "instance_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "scan_timestamp"
+    type = "S"
+  }
+
+  attribute {
+    name = "idle_key"
+    type = "S"
+  }
+
+  # Per-instance history: one Query for any instance and time range
+  global_secondary_index {
+    name               = "InstanceHistoryIndex"
+    hash_key           = "instance_id"
+    range_key          = "scan_timestamp"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["scan_date", "scan_hour", "account_id", "region", "instance_name", "instance_type", "instance_state", "avg_cpu", "is_idle"]
+  }
+
+  # Sparse index of idle scans only - the scanner sets idle_key to the scan_date
+  # on idle instances, so each day is its own partition instead of one hot key
+  global_secondary_index {
+    name               = "IdleScansIndex"
+    hash_key           = "idle_key"
+    range_key          = "scan_timestamp"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["scan_date", "account_id", "region", "instance_id", "instance_type"]
+  }
+
   ttl {
     attribute_name = "ttl"
     enabled        = false
@@ -74,4 +108,100 @@ resource "aws_dynamodb_table" "advanced_scans" {
     Name        = "Advanced Resource Scans"
     Description = "Stores multi-resource scan results (EBS, RDS, S3, Lambda)"
   }
-}
\ No newline at end of file
+}
+
+# Daily rollups of EC2 scans - per account/region and day, plus sharded per-instance rows
+resource "aws_dynamodb_table" "rollups" {
+  name         = "CostOptimizerRollups"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "rollup_date"
+  range_key    = "rollup_key"
+
+  attribute {
+    name = "rollup_date"
+    type = "S"
+  }
+
+  attribute {
+    name = "rollup_key"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "Cost Optimizer Rollups"
+    Description = "Stores daily and per-instance scan counters maintained by the EC2 scanner"
+  }
+}
+
+# Closed days' Cost Explorer results, per service - avoids re-requesting final days
+resource "aws_dynamodb_table" "cost_cache" {
+  name         = "CostExplorerCache"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cost_date"
+
+  attribute {
+    name = "cost_date"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "Cost Explorer Cache"
+    Description = "Stores per-day service costs for closed days"
+  }
+}
+
+# Per-instance hourly CPU datapoints (last 7 days) for incremental EC2 scans
+resource "aws_dynamodb_table" "metric_state" {
+  name         = "CostOptimizerMetricState"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "instance_id"
+
+  attribute {
+    name = "instance_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "Cost Optimizer Metric State"
+    Description = "Stores per-instance CPU aggregates for incremental scans"
+  }
+}
+
+# Shared resource inventory snapshots, one per account/region/kind - written by
+# the scanners and reused within a run instead of listing resources again
+resource "aws_dynamodb_table" "inventory" {
+  name         = "CostOptimizerInventory"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "snapshot_id"
+  range_key    = "part"
+
+  attribute {
+    name = "snapshot_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "part"
+    type = "N"
+  }
+
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "Cost Optimizer Inventory"
+    Description = "Stores columnar resource inventory snapshots with a TTL"
+  }
+}
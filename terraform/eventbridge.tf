@@ -9,12 +9,20 @@ resource "aws_cloudwatch_event_rule" "ec2_scanner_schedule" {
   }
 }
 
+# With sharded_scan the schedule starts the sharded scan state machine instead
+# (see stepfunctions.tf)
 resource "aws_cloudwatch_event_target" "ec2_scanner_target" {
+  count     = var.sharded_scan ? 0 : 1
   rule      = aws_cloudwatch_event_rule.ec2_scanner_schedule.name
   target_id = "EC2ScannerLambda"
   arn       = aws_lambda_function.ec2_scanner.arn
 }
 
+moved {
+  from = aws_cloudwatch_event_target.ec2_scanner_target
+  to   = aws_cloudwatch_event_target.ec2_scanner_target[0]
+}
+
 resource "aws_lambda_permission" "allow_eventbridge_ec2_scanner" {
   statement_id  = "AllowExecutionFromEventBridge"
   action        = "lambda:InvokeFunction"
@@ -25,6 +25,11 @@ resource "aws_iam_role_policy_attachment" "lambda_basic" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# Bucket part of s3://bucket/prefix
+locals {
+  s3_inventory_bucket = split("/", trimprefix(var.s3_inventory_destination, "s3://"))[0]
+}
+
 # Custom policy for cost optimizer permissions
 resource "aws_iam_role_policy" "lambda_policy" {
   name = "CostOptimizerPolicy"
@@ -32,7 +37,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
 
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [
+    Statement = concat([
       {
         Effect = "Allow"
         Action = [
@@ -40,10 +45,14 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "ec2:DescribeVolumes",
           "ec2:DescribeImages",
           "rds:DescribeDBInstances",
+          "rds:DescribeDBClusters",
           "s3:ListAllMyBuckets",
           "s3:GetBucketLocation",
           "lambda:ListFunctions",
+          "tag:GetResources",
           "cloudwatch:GetMetricStatistics",
+          "cloudwatch:GetMetricData",
+          "cloudwatch:ListMetrics",
           "ce:GetCostAndUsage"
         ]
         Resource = "*"
@@ -52,17 +61,55 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:Query",
           "dynamodb:Scan",
           "dynamodb:UpdateItem"
         ]
         Resource = [
           aws_dynamodb_table.scans.arn,
+          "${aws_dynamodb_table.scans.arn}/index/*",
           aws_dynamodb_table.cost_history.arn,
-          aws_dynamodb_table.advanced_scans.arn
+          aws_dynamodb_table.advanced_scans.arn,
+          aws_dynamodb_table.metric_state.arn,
+          aws_dynamodb_table.rollups.arn,
+          aws_dynamodb_table.cost_cache.arn,
+          aws_dynamodb_table.inventory.arn
+        ]
+      }
+      ], var.s3_inventory_destination == "" ? [] : [
+      # Inventory reports used for S3 object-age histograms
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:ListBucket"
+        ]
+        Resource = [
+          "arn:aws:s3:::${local.s3_inventory_bucket}",
+          "arn:aws:s3:::${local.s3_inventory_bucket}/*"
         ]
       }
+    ])
+  })
+}
+
+# Cross-account scanning - only created when member-account roles are configured
+resource "aws_iam_role_policy" "cross_account_scan" {
+  count = length(var.scan_role_arns) > 0 ? 1 : 0
+  name  = "CostOptimizerCrossAccountScan"
+  role  = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "sts:AssumeRole"
+        Resource = var.scan_role_arns
+      }
     ]
   })
-}
\ No newline at end of file
+}
@@ -17,6 +17,21 @@ data "archive_file" "advanced_scanner" {
   output_path = "${path.module}/builds/advanced-scanner.zip"
 }
 
+# Shared helpers packaged as a Lambda layer (importable as `common`)
+data "archive_file" "common_layer" {
+  type        = "zip"
+  source_dir  = "${path.module}/../lambda/layers/common"
+  output_path = "${path.module}/builds/common-layer.zip"
+}
+
+resource "aws_lambda_layer_version" "common" {
+  filename            = data.archive_file.common_layer.output_path
+  layer_name          = "cost-optimizer-common"
+  description         = "Shared helpers for the cost optimizer Lambda functions"
+  source_code_hash    = data.archive_file.common_layer.output_base64sha256
+  compatible_runtimes = ["python3.13"]
+}
+
 # Lambda function: EC2 Idle Scanner
 resource "aws_lambda_function" "ec2_scanner" {
   filename         = data.archive_file.ec2_scanner.output_path
@@ -25,13 +40,23 @@ resource "aws_lambda_function" "ec2_scanner" {
   handler          = "handler.lambda_handler"
   source_code_hash = data.archive_file.ec2_scanner.output_base64sha256
   runtime          = "python3.13"
-  timeout          = 60
-  memory_size      = 256
+  layers           = [aws_lambda_layer_version.common.arn]
+  timeout          = var.scanner_timeout
+  memory_size      = var.scanner_memory_size
 
   environment {
     variables = {
-      IDLE_CPU_THRESHOLD = var.idle_cpu_threshold
-      DYNAMODB_TABLE     = aws_dynamodb_table.scans.name
+      IDLE_CPU_THRESHOLD  = var.idle_cpu_threshold
+      DYNAMODB_TABLE      = aws_dynamodb_table.scans.name
+      SCAN_REGIONS        = join(",", var.scan_regions)
+      MAX_REGION_WORKERS  = var.max_region_workers
+      SCAN_ROLE_ARNS      = join(",", var.scan_role_arns)
+      MAX_ACCOUNT_WORKERS = var.max_account_workers
+      INCREMENTAL_METRICS = var.incremental_metrics
+      METRIC_STATE_TABLE  = aws_dynamodb_table.metric_state.name
+      ROLLUP_TABLE        = aws_dynamodb_table.rollups.name
+      INVENTORY_TABLE     = aws_dynamodb_table.inventory.name
+      INVENTORY_TTL_HOURS = var.inventory_ttl_hours
     }
   }
 
@@ -49,13 +74,18 @@ resource "aws_lambda_function" "cost_analyzer" {
   handler          = "handler.lambda_handler"
   source_code_hash = data.archive_file.cost_analyzer.output_base64sha256
   runtime          = "python3.13"
+  layers           = [aws_lambda_layer_version.common.arn]
   timeout          = 60
   memory_size      = 256
 
   environment {
     variables = {
-      SCANS_TABLE = aws_dynamodb_table.scans.name
-      COST_TABLE  = aws_dynamodb_table.cost_history.name
+      SCANS_TABLE         = aws_dynamodb_table.scans.name
+      COST_TABLE          = aws_dynamodb_table.cost_history.name
+      COST_CACHE_BACKEND  = "dynamodb"
+      COST_CACHE_TABLE    = aws_dynamodb_table.cost_cache.name
+      COST_SETTLE_DAYS    = var.cost_settle_days
+      SCAN_INTERVAL_HOURS = var.scan_interval_hours
     }
   }
 
@@ -73,12 +103,20 @@ resource "aws_lambda_function" "advanced_scanner" {
   handler          = "handler.lambda_handler"
   source_code_hash = data.archive_file.advanced_scanner.output_base64sha256
   runtime          = "python3.13"
+  layers           = [aws_lambda_layer_version.common.arn]
   timeout          = 300
   memory_size      = 512
 
   environment {
     variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.advanced_scans.name
+      DYNAMODB_TABLE           = aws_dynamodb_table.advanced_scans.name
+      SCAN_REGIONS             = join(",", var.scan_regions)
+      SCAN_ROLE_ARNS           = join(",", var.scan_role_arns)
+      S3_INVENTORY_DESTINATION = var.s3_inventory_destination
+      INVENTORY_TABLE          = aws_dynamodb_table.inventory.name
+      INVENTORY_TTL_HOURS      = var.inventory_ttl_hours
+      REQUIRED_TAGS            = join(",", var.required_tags)
+      DETECTORS                = join(",", var.detectors)
     }
   }
 
@@ -4,6 +4,10 @@ output "dynamodb_tables" {
     scans_table          = aws_dynamodb_table.scans.name
     cost_history_table   = aws_dynamodb_table.cost_history.name
     advanced_scans_table = aws_dynamodb_table.advanced_scans.name
+    metric_state_table   = aws_dynamodb_table.metric_state.name
+    rollups_table        = aws_dynamodb_table.rollups.name
+    cost_cache_table     = aws_dynamodb_table.cost_cache.name
+    inventory_table      = aws_dynamodb_table.inventory.name
   }
 }
 
@@ -25,6 +29,16 @@ output "lambda_functions" {
   }
 }
 
+output "sharded_scan_state_machine" {
+  description = "Step Functions state machine running sharded EC2 scans"
+  value       = aws_sfn_state_machine.sharded_scan.arn
+}
+
+output "sharded_scan_results_bucket" {
+  description = "S3 bucket holding the sharded scan's map results"
+  value       = aws_s3_bucket.sharded_scan_results.id
+}
+
 output "iam_role" {
   description = "IAM role for Lambda functions"
   value = {
@@ -54,6 +68,10 @@ output "deployment_summary" {
      • ${aws_dynamodb_table.scans.name}
      • ${aws_dynamodb_table.cost_history.name}
      • ${aws_dynamodb_table.advanced_scans.name}
+     • ${aws_dynamodb_table.metric_state.name}
+     • ${aws_dynamodb_table.rollups.name}
+     • ${aws_dynamodb_table.cost_cache.name}
+     • ${aws_dynamodb_table.inventory.name}
   
   🔧 Lambda Functions:
      • ${aws_lambda_function.ec2_scanner.function_name} (Every 6 hours)
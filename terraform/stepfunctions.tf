@@ -0,0 +1,322 @@
+# Sharded EC2 scan for large fleets: a coordinator lists and stores each
+# account/region's inventory and splits it into chunks, a Distributed Map
+# scores the chunks in parallel worker invocations, and a merge step sums
+# their results. The functions share the EC2 scanner's package.
+#
+# Workers write their scan items and rollups themselves and return only
+# counts. The map writes those results to S3 (ResultWriter) instead of the
+# state payload, which is limited to 256 KB, and the merge step reads them
+# back from the result manifest.
+
+resource "aws_lambda_function" "ec2_scan_coordinator" {
+  filename         = data.archive_file.ec2_scanner.output_path
+  function_name    = "EC2ScanCoordinator"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "fanout.coordinator_handler"
+  source_code_hash = data.archive_file.ec2_scanner.output_base64sha256
+  runtime          = "python3.13"
+  layers           = [aws_lambda_layer_version.common.arn]
+  timeout          = 300
+  memory_size      = 512
+
+  environment {
+    variables = {
+      SCAN_REGIONS        = join(",", var.scan_regions)
+      MAX_REGION_WORKERS  = var.max_region_workers
+      SCAN_ROLE_ARNS      = join(",", var.scan_role_arns)
+      MAX_ACCOUNT_WORKERS = var.max_account_workers
+      INVENTORY_TABLE     = aws_dynamodb_table.inventory.name
+      INVENTORY_TTL_HOURS = var.inventory_ttl_hours
+    }
+  }
+
+  tags = {
+    Name        = "EC2 Scan Coordinator"
+    Description = "Lists EC2 inventory and plans sharded scan chunks"
+  }
+}
+
+# Worker timeout stays inside the 5 minute limit of the map's express child executions
+resource "aws_lambda_function" "ec2_scan_worker" {
+  filename         = data.archive_file.ec2_scanner.output_path
+  function_name    = "EC2ScanWorker"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "fanout.worker_handler"
+  source_code_hash = data.archive_file.ec2_scanner.output_base64sha256
+  runtime          = "python3.13"
+  layers           = [aws_lambda_layer_version.common.arn]
+  timeout          = 240
+  memory_size      = 512
+
+  environment {
+    variables = {
+      IDLE_CPU_THRESHOLD  = var.idle_cpu_threshold
+      DYNAMODB_TABLE      = aws_dynamodb_table.scans.name
+      INCREMENTAL_METRICS = var.incremental_metrics
+      METRIC_STATE_TABLE  = aws_dynamodb_table.metric_state.name
+      ROLLUP_TABLE        = aws_dynamodb_table.rollups.name
+      INVENTORY_TABLE     = aws_dynamodb_table.inventory.name
+    }
+  }
+
+  tags = {
+    Name        = "EC2 Scan Worker"
+    Description = "Scores one chunk of a sharded EC2 scan"
+  }
+}
+
+resource "aws_lambda_function" "ec2_scan_merge" {
+  filename         = data.archive_file.ec2_scanner.output_path
+  function_name    = "EC2ScanMerge"
+  role             = aws_iam_role.lambda_role.arn
+  handler          = "fanout.merge_handler"
+  source_code_hash = data.archive_file.ec2_scanner.output_base64sha256
+  runtime          = "python3.13"
+  layers           = [aws_lambda_layer_version.common.arn]
+  timeout          = 60
+  memory_size      = 256
+
+  tags = {
+    Name        = "EC2 Scan Merge"
+    Description = "Merges the results of a sharded EC2 scan"
+  }
+}
+
+# Map run results - only read by the merge step, so they expire quickly
+resource "aws_s3_bucket" "sharded_scan_results" {
+  bucket_prefix = "cost-optimizer-scan-results-"
+  force_destroy = true
+
+  tags = {
+    Name        = "Cost Optimizer Sharded Scan Results"
+    Description = "Distributed Map results of sharded EC2 scans"
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "sharded_scan_results" {
+  bucket                  = aws_s3_bucket.sharded_scan_results.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_lifecycle_configuration" "sharded_scan_results" {
+  bucket = aws_s3_bucket.sharded_scan_results.id
+
+  rule {
+    id     = "expire-results"
+    status = "Enabled"
+
+    filter {}
+
+    expiration {
+      days = 7
+    }
+  }
+}
+
+# The merge function reads the result manifest and files
+resource "aws_iam_role_policy" "sharded_scan_results_read" {
+  name = "CostOptimizerShardedScanResultsRead"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "s3:GetObject"
+        Resource = "${aws_s3_bucket.sharded_scan_results.arn}/*"
+      }
+    ]
+  })
+}
+
+resource "aws_cloudwatch_log_group" "ec2_scan_worker_logs" {
+  name              = "/aws/lambda/${aws_lambda_function.ec2_scan_worker.function_name}"
+  retention_in_days = 7
+
+  tags = {
+    Name = "EC2 Scan Worker Logs"
+  }
+}
+
+# Step Functions execution role - invokes the three functions, runs the
+# Distributed Map's child executions and writes their results to S3
+resource "aws_iam_role" "sharded_scan" {
+  name = "CostOptimizerShardedScanRole"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "states.amazonaws.com"
+        }
+      }
+    ]
+  })
+
+  tags = {
+    Name = "Cost Optimizer Sharded Scan Role"
+  }
+}
+
+resource "aws_iam_role_policy" "sharded_scan" {
+  name = "CostOptimizerShardedScanPolicy"
+  role = aws_iam_role.sharded_scan.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = "lambda:InvokeFunction"
+        Resource = [
+          aws_lambda_function.ec2_scan_coordinator.arn,
+          aws_lambda_function.ec2_scan_worker.arn,
+          aws_lambda_function.ec2_scan_merge.arn
+        ]
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "states:StartExecution",
+          "states:DescribeExecution",
+          "states:StopExecution"
+        ]
+        Resource = "*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject",
+          "s3:GetObject",
+          "s3:ListMultipartUploadParts",
+          "s3:AbortMultipartUpload"
+        ]
+        Resource = "${aws_s3_bucket.sharded_scan_results.arn}/*"
+      }
+    ]
+  })
+}
+
+resource "aws_sfn_state_machine" "sharded_scan" {
+  name     = "CostOptimizerShardedScan"
+  role_arn = aws_iam_role.sharded_scan.arn
+
+  definition = jsonencode({
+    Comment = "Sharded EC2 idle scan: coordinate, score chunks in parallel, merge"
+    StartAt = "Coordinate"
+    States = {
+      Coordinate = {
+        Type       = "Task"
+        Resource   = "arn:aws:states:::lambda:invoke"
+        Parameters = { FunctionName = aws_lambda_function.ec2_scan_coordinator.arn, "Payload.$" = "$" }
+        OutputPath = "$.Payload"
+        Retry = [
+          {
+            ErrorEquals     = ["Lambda.ServiceException", "Lambda.TooManyRequestsException", "Lambda.SdkClientException"]
+            IntervalSeconds = 2
+            MaxAttempts     = 3
+            BackoffRate     = 2
+          }
+        ]
+        Next = "ScoreChunks"
+      }
+      ScoreChunks = {
+        Type           = "Map"
+        ItemsPath      = "$.chunks"
+        ItemSelector   = { "scan.$" = "$.scan", "chunk.$" = "$$.Map.Item.Value" }
+        MaxConcurrency = var.scan_max_concurrency
+        ItemProcessor = {
+          ProcessorConfig = { Mode = "DISTRIBUTED", ExecutionType = "EXPRESS" }
+          StartAt         = "ScoreChunk"
+          States = {
+            ScoreChunk = {
+              Type       = "Task"
+              Resource   = "arn:aws:states:::lambda:invoke"
+              Parameters = { FunctionName = aws_lambda_function.ec2_scan_worker.arn, "Payload.$" = "$" }
+              OutputPath = "$.Payload"
+              Retry = [
+                {
+                  ErrorEquals     = ["Lambda.ServiceException", "Lambda.TooManyRequestsException", "Lambda.SdkClientException"]
+                  IntervalSeconds = 2
+                  MaxAttempts     = 6
+                  BackoffRate     = 2
+                }
+              ]
+              End = true
+            }
+          }
+        }
+        # Results go to S3 and failed chunks are reported by the merge step rather than failing the scan
+        ResultWriter = {
+          Resource   = "arn:aws:states:::s3:putObject"
+          Parameters = { Bucket = aws_s3_bucket.sharded_scan_results.id, Prefix = "map-runs" }
+        }
+        ResultSelector             = { "bucket.$" = "$.ResultWriterDetails.Bucket", "manifest_key.$" = "$.ResultWriterDetails.Key" }
+        ResultPath                 = "$.results_location"
+        ToleratedFailurePercentage = 100
+        Next                       = "Merge"
+      }
+      Merge = {
+        Type       = "Task"
+        Resource   = "arn:aws:states:::lambda:invoke"
+        Parameters = { FunctionName = aws_lambda_function.ec2_scan_merge.arn, "Payload.$" = "$" }
+        OutputPath = "$.Payload"
+        End        = true
+      }
+    }
+  })
+
+  tags = {
+    Name        = "Cost Optimizer Sharded Scan"
+    Description = "Fans EC2 scans out over chunks of the inventory"
+  }
+}
+
+# Scheduled starts of the state machine when sharded_scan is enabled
+resource "aws_iam_role" "sharded_scan_schedule" {
+  count = var.sharded_scan ? 1 : 0
+  name  = "CostOptimizerShardedScanScheduleRole"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "events.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "sharded_scan_schedule" {
+  count = var.sharded_scan ? 1 : 0
+  name  = "CostOptimizerShardedScanSchedulePolicy"
+  role  = aws_iam_role.sharded_scan_schedule[0].id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = "states:StartExecution"
+        Resource = aws_sfn_state_machine.sharded_scan.arn
+      }
+    ]
+  })
+}
+
+resource "aws_cloudwatch_event_target" "sharded_scan_target" {
+  count     = var.sharded_scan ? 1 : 0
+  rule      = aws_cloudwatch_event_rule.ec2_scanner_schedule.name
+  target_id = "ShardedScanStateMachine"
+  arn       = aws_sfn_state_machine.sharded_scan.arn
+  role_arn  = aws_iam_role.sharded_scan_schedule[0].arn
+}
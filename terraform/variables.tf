@@ -38,4 +38,95 @@ variable "idle_cpu_threshold" {
   description = "CPU threshold for idle detection (%)"
   type        = number
   default     = 5
-}
\ No newline at end of file
+}
+
+variable "scan_regions" {
+  description = "Regions scanned by the EC2 and advanced scanners (empty = deployment region only)"
+  type        = list(string)
+  default     = []
+}
+
+variable "max_region_workers" {
+  description = "Maximum number of regions scanned concurrently"
+  type        = number
+  default     = 8
+}
+
+variable "scan_role_arns" {
+  description = "Member-account IAM roles assumed by the scanners (empty = deployment account only)"
+  type        = list(string)
+  default     = []
+}
+
+variable "max_account_workers" {
+  description = "Maximum number of accounts scanned concurrently by the EC2 scanner"
+  type        = number
+  default     = 4
+}
+
+# Single-function EC2 scan sizing - see "Scanner sizing" in README.md
+variable "scanner_timeout" {
+  description = "EC2 scanner function timeout in seconds (Lambda maximum 900)"
+  type        = number
+  default     = 900
+}
+
+variable "scanner_memory_size" {
+  description = "EC2 scanner function memory in MB; also sets its CPU share for the concurrent region/account scans"
+  type        = number
+  default     = 1024
+}
+
+variable "incremental_metrics" {
+  description = "Fetch only new CPU datapoints on each EC2 scan, using stored per-instance aggregates"
+  type        = bool
+  default     = true
+}
+
+variable "cost_settle_days" {
+  description = "Days after which a day's Cost Explorer results are final and cached"
+  type        = number
+  default     = 1
+}
+
+variable "scan_interval_hours" {
+  description = "Hours each EC2 scan represents when totalling idle instance-hours (matches scanner_schedule)"
+  type        = number
+  default     = 6
+}
+
+variable "s3_inventory_destination" {
+  description = "s3://bucket/prefix where S3 Inventory reports are delivered (empty disables object-age analysis)"
+  type        = string
+  default     = ""
+}
+
+variable "inventory_ttl_hours" {
+  description = "Hours a stored resource inventory snapshot is kept before DynamoDB expires it"
+  type        = number
+  default     = 24
+}
+
+variable "required_tags" {
+  description = "Tag keys the advanced scanner expects on EC2, EBS, RDS and Lambda resources"
+  type        = list(string)
+  default     = ["Environment", "Owner", "Project"]
+}
+
+variable "detectors" {
+  description = "Advanced scanner detectors to run (ebs, rds, lambda, untagged, s3); empty runs all registered detectors"
+  type        = list(string)
+  default     = []
+}
+
+variable "sharded_scan" {
+  description = "Run scheduled EC2 scans through the sharded Step Functions pipeline instead of the single scanner function"
+  type        = bool
+  default     = false
+}
+
+variable "scan_max_concurrency" {
+  description = "Maximum EC2 scan chunks scored concurrently by the sharded scan"
+  type        = number
+  default     = 40
+}
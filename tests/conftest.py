@@ -0,0 +1,59 @@
+"""
+Shared fixtures. The Lambda functions import the layer as `common` and
+their sibling modules by name, and the dashboard is a flat directory, so
+all of them are put on sys.path the way their runtimes see them.
+"""
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+REPO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# scanner before the other functions: each has a handler.py and fanout imports the scanner's
+sys.path[:0] = [
+    os.path.join(REPO_DIR, 'lambda', 'layers', 'common', 'python'),
+    os.path.join(REPO_DIR, 'lambda', 'scanner'),
+    os.path.join(REPO_DIR, 'lambda', 'advanced_scanner'),
+    os.path.join(REPO_DIR, 'lambda', 'cost_analyzer'),
+    os.path.join(REPO_DIR, 'dashboard')
+]
+
+# Never reach real AWS, even when the environment has credentials
+os.environ.update({
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_SECURITY_TOKEN': 'testing',
+    'AWS_SESSION_TOKEN': 'testing',
+    'AWS_DEFAULT_REGION': 'us-east-1'
+})
+
+
+@pytest.fixture
+def aws():
+    """moto-backed AWS for the duration of a test"""
+    with mock_aws():
+        yield
+
+
+@pytest.fixture
+def dynamodb(aws):
+    return boto3.resource('dynamodb', region_name='us-east-1')
+
+
+def create_table(dynamodb, name: str, hash_key: str, range_key: str = None):
+    """PAY_PER_REQUEST table with string keys"""
+    key_schema = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+    attributes = [{'AttributeName': hash_key, 'AttributeType': 'S'}]
+    if range_key:
+        key_schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        attributes.append({'AttributeName': range_key, 'AttributeType': 'S'})
+
+    return dynamodb.create_table(
+        TableName=name,
+        KeySchema=key_schema,
+        AttributeDefinitions=attributes,
+        BillingMode='PAY_PER_REQUEST'
+    )
@@ -0,0 +1,36 @@
+"""Shared client settings and throttle counting"""
+from types import SimpleNamespace
+
+from botocore.hooks import HierarchicalEmitter
+
+from common.clients import ThrottleCounter, get_client_config
+
+
+def test_pool_size_follows_worker_count(monkeypatch):
+    monkeypatch.delenv('MAX_POOL_CONNECTIONS', raising=False)
+
+    assert get_client_config().max_pool_connections == 10
+    assert get_client_config(64).max_pool_connections == 64
+
+
+def test_throttled_responses_are_counted_per_service():
+    counter = ThrottleCounter()
+    # Only the counter's handler, without botocore's own retry handlers
+    client = SimpleNamespace(meta=SimpleNamespace(events=HierarchicalEmitter()))
+    counter.attach(client, 'ec2')
+
+    # What botocore emits after each attempt, with (http response, parsed response)
+    for code in ('RequestLimitExceeded', 'InvalidParameterValue', 'RequestLimitExceeded'):
+        client.meta.events.emit('needs-retry.ec2.DescribeRegions', response=(None, {'Error': {'Code': code}}), attempts=1)
+    client.meta.events.emit('needs-retry.ec2.DescribeRegions', response=None, attempts=1)
+
+    assert counter.counts() == {'ec2': 2}
+    counter.reset()
+    assert counter.counts() == {}
+
+
+def test_retry_mode_from_environment(monkeypatch):
+    monkeypatch.setenv('RETRY_MODE', 'standard')
+    monkeypatch.setenv('RETRY_MAX_ATTEMPTS', '4')
+
+    assert get_client_config().retries == {'mode': 'standard', 'max_attempts': 4}
@@ -0,0 +1,68 @@
+"""Lazy, cached client construction"""
+import boto3
+
+from common import clients as clients_module
+from common.clients import ClientCache, LazyTable, new_session
+
+
+class CountingSession:
+    """Session stand-in that records what gets built"""
+
+    region_name = 'us-east-1'
+
+    def __init__(self):
+        self.session = boto3.session.Session(region_name='us-east-1')
+        self.built = []
+
+    def client(self, service_name, **kwargs):
+        self.built.append(('client', service_name, kwargs['region_name']))
+        return self.session.client(service_name, **kwargs)
+
+    def resource(self, service_name, **kwargs):
+        self.built.append(('resource', service_name, kwargs['region_name']))
+        return self.session.resource(service_name, **kwargs)
+
+
+def test_clients_are_built_once_per_service_and_region():
+    session = CountingSession()
+    cache = ClientCache(session)
+
+    first = cache.get('ec2')
+    assert cache.get('ec2', 'us-east-1') is first
+    assert cache.get('ec2', 'eu-west-1') is not first
+
+    assert session.built == [('client', 'ec2', 'us-east-1'), ('client', 'ec2', 'eu-west-1')]
+
+
+def test_tables_are_built_on_first_use(dynamodb):
+    dynamodb.create_table(
+        TableName='Scans',
+        KeySchema=[{'AttributeName': 'pk', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'pk', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    session = CountingSession()
+    table = ClientCache(session).table('Scans')
+
+    assert isinstance(table, LazyTable)
+    assert table.name == 'Scans'
+    assert session.built == []
+
+    table.put_item(Item={'pk': 'a'})
+    assert table.get_item(Key={'pk': 'a'})['Item'] == {'pk': 'a'}
+    assert session.built == [('resource', 'dynamodb', 'us-east-1')]
+
+
+def test_no_session_until_first_client(monkeypatch):
+    monkeypatch.setattr(clients_module, '_default_session', None)
+    cache = ClientCache()
+
+    assert clients_module._default_session is None
+    cache.get('sts')
+    assert clients_module._default_session is not None
+
+
+def test_sessions_share_one_data_loader():
+    first, second = new_session(), new_session()
+
+    assert first._session.get_component('data_loader') is second._session.get_component('data_loader')
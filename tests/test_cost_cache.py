@@ -0,0 +1,127 @@
+"""Cost Explorer caching: which days are cached, fetched and re-fetched"""
+from datetime import date, timedelta
+
+import pytest
+
+import cost_cache
+from conftest import create_table
+from cost_cache import DynamoCostCache, LocalCostCache, contiguous_ranges, get_cost_by_service_cached
+
+TODAY = date(2026, 3, 10)
+
+
+class FakeCostExplorer:
+    """get_cost_and_usage over fixed daily costs, one page per pagination_days"""
+
+    def __init__(self, pagination_days: int = 31):
+        self.pagination_days = pagination_days
+        self.requests = []
+
+    def get_cost_and_usage(self, TimePeriod, NextPageToken=None, **kwargs):
+        self.requests.append((TimePeriod['Start'], TimePeriod['End'], NextPageToken))
+        start = date.fromisoformat(NextPageToken or TimePeriod['Start'])
+        end = min(date.fromisoformat(TimePeriod['End']), start + timedelta(days=self.pagination_days))
+
+        results = []
+        day = start
+        while day < end:
+            results.append({
+                'TimePeriod': {'Start': str(day), 'End': str(day + timedelta(days=1))},
+                'Groups': [
+                    {'Keys': ['Amazon EC2'], 'Metrics': {'UnblendedCost': {'Amount': '10.0'}}},
+                    {'Keys': ['Amazon S3'], 'Metrics': {'UnblendedCost': {'Amount': '1.5'}}}
+                ]
+            })
+            day += timedelta(days=1)
+
+        response = {'ResultsByTime': results}
+        if end < date.fromisoformat(TimePeriod['End']):
+            response['NextPageToken'] = str(end)
+        return response
+
+
+@pytest.fixture
+def dynamo_cache(dynamodb):
+    return DynamoCostCache(create_table(dynamodb, 'CostExplorerCache', 'cost_date'))
+
+
+@pytest.fixture
+def local_cache(tmp_path):
+    return LocalCostCache(str(tmp_path / 'cache' / 'costs.json'))
+
+
+@pytest.fixture(params=['dynamo', 'local'])
+def cache(request):
+    return request.getfixturevalue(f"{request.param}_cache")
+
+
+def test_only_settled_days_are_cached(cache, monkeypatch):
+    monkeypatch.setattr(cost_cache, 'COST_SETTLE_DAYS', 1)
+    ce = FakeCostExplorer()
+
+    costs, stats = get_cost_by_service_cached(ce, cache, TODAY - timedelta(days=7), TODAY, today=TODAY)
+
+    assert costs == {'Amazon EC2': 70.0, 'Amazon S3': 10.5}
+    # 03-03 .. 03-08 are settled; 03-09 ended less than a day ago
+    assert stats['newly_cached_days'] == 6
+    assert sorted(cache.get_days([str(TODAY - timedelta(days=offset)) for offset in range(1, 8)])) == [
+        '2026-03-03', '2026-03-04', '2026-03-05', '2026-03-06', '2026-03-07', '2026-03-08'
+    ]
+
+
+def test_next_run_fetches_only_unsettled_and_new_days(cache, monkeypatch):
+    monkeypatch.setattr(cost_cache, 'COST_SETTLE_DAYS', 1)
+    get_cost_by_service_cached(FakeCostExplorer(), cache, TODAY - timedelta(days=7), TODAY, today=TODAY)
+
+    ce = FakeCostExplorer()
+    tomorrow = TODAY + timedelta(days=1)
+    costs, stats = get_cost_by_service_cached(ce, cache, tomorrow - timedelta(days=7), tomorrow, today=tomorrow)
+
+    # 03-09 (now settled) and 03-10 are fetched in one range
+    assert ce.requests == [('2026-03-09', '2026-03-11', None)]
+    assert stats['cached_days'] == 5
+    assert stats['fetched_days'] == 2
+    assert stats['newly_cached_days'] == 1
+    assert costs == {'Amazon EC2': 70.0, 'Amazon S3': 10.5}
+
+
+def test_settle_days_widens_the_uncached_tail(cache, monkeypatch):
+    monkeypatch.setattr(cost_cache, 'COST_SETTLE_DAYS', 3)
+
+    _, stats = get_cost_by_service_cached(FakeCostExplorer(), cache, TODAY - timedelta(days=7), TODAY, today=TODAY)
+
+    assert stats['newly_cached_days'] == 4
+    assert '2026-03-06' in cache.get_days(['2026-03-06'])
+    assert cache.get_days(['2026-03-07']) == {}
+
+
+def test_missing_days_are_fetched_per_contiguous_range_with_pagination(local_cache):
+    local_cache.put_days({'2026-02-05': {'Amazon EC2': 1.0}})
+    ce = FakeCostExplorer(pagination_days=2)
+
+    _, stats = get_cost_by_service_cached(ce, local_cache, date(2026, 2, 1), date(2026, 2, 10), today=TODAY)
+
+    assert ce.requests == [
+        ('2026-02-01', '2026-02-05', None),
+        ('2026-02-01', '2026-02-05', '2026-02-03'),
+        ('2026-02-06', '2026-02-10', None),
+        ('2026-02-06', '2026-02-10', '2026-02-08')
+    ]
+    assert stats['api_calls'] == 4
+    assert stats['cached_days'] == 1
+
+
+def test_without_a_cache_everything_is_fetched():
+    ce = FakeCostExplorer()
+
+    costs, stats = get_cost_by_service_cached(ce, None, date(2026, 2, 1), date(2026, 2, 3), today=TODAY)
+
+    assert costs == {'Amazon EC2': 20.0, 'Amazon S3': 3.0}
+    assert stats['newly_cached_days'] == 0
+
+
+def test_contiguous_ranges():
+    assert contiguous_ranges(['2026-01-03', '2026-01-01', '2026-01-02', '2026-01-05']) == [
+        ('2026-01-01', '2026-01-04'),
+        ('2026-01-05', '2026-01-06')
+    ]
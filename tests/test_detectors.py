@@ -0,0 +1,157 @@
+"""Detector conditions, registration and the shared-fetch engine"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import boto3
+import pytest
+
+import engine
+from common.clients import ClientCache
+from common.inventory import Inventory
+from detectors import IdleRDSDatabases, UntaggedResources
+from engine import Detector, MetricNeed, run_detectors
+
+
+@pytest.fixture
+def rds():
+    return IdleRDSDatabases()
+
+
+def test_required_condition_fails_on_missing_signal(rds):
+    assert not rds.matches({'avg_cpu': None, 'peak_connections': 0, 'avg_iops': 0.0})
+
+
+def test_optional_conditions_ignore_missing_signals(rds):
+    assert rds.matches({'avg_cpu': 1.0, 'peak_connections': None, 'avg_iops': None})
+
+
+@pytest.mark.parametrize('signals, expected', [
+    ({'avg_cpu': 4.9, 'peak_connections': 0, 'avg_iops': 1.0}, True),
+    ({'avg_cpu': 1.0, 'peak_connections': 50, 'avg_iops': 1.0}, False),
+    ({'avg_cpu': 1.0, 'peak_connections': 0, 'avg_iops': 1000.0}, False),
+    ({'avg_cpu': 90.0, 'peak_connections': 0, 'avg_iops': 1.0}, False)
+])
+def test_all_conditions_must_hold(rds, signals, expected):
+    assert rds.matches(signals) is expected
+
+
+def test_conditions_compare_against_named_thresholds(rds, monkeypatch):
+    monkeypatch.setitem(rds.thresholds, 'cpu', 50.0)
+
+    assert rds.matches({'avg_cpu': 40.0})
+
+
+def test_register_rejects_detectors_without_finding():
+    class NoFinding(Detector):
+        name = 'no_finding'
+
+    with pytest.raises(TypeError):
+        engine.register(NoFinding)
+    assert 'no_finding' not in engine._registry
+
+
+def test_register_rejects_duplicate_names():
+    class Duplicate(UntaggedResources):
+        pass
+
+    with pytest.raises(ValueError):
+        engine.register(Duplicate)
+
+
+class BusyFunctions(Detector):
+    """Test detector: functions invoked more than a threshold, from one metric"""
+
+    name = 'busy'
+    inventory = ['lambda_function']
+    resource_types = ['lambda_function']
+    metrics = [MetricNeed('lambda_function', 'AWS/Lambda', 'Invocations', 'FunctionName', 'Sum', 86400)]
+    thresholds = {'invocations': 10}
+    conditions = [('invocations', '>', 'invocations', True)]
+
+    def signals(self, row, data):
+        points = self.points(data, row, 'Invocations')
+        return {'invocations': sum(value for _, value in points)}
+
+    def finding(self, row, signals, data):
+        return {'resource_id': row['resource_id'], 'invocations': Decimal(str(signals['invocations']))}
+
+
+class QuietFunctions(BusyFunctions):
+    """Same metric as BusyFunctions, so the engine fetches it once"""
+
+    name = 'quiet'
+    conditions = [('invocations', '<=', 'invocations', True)]
+
+
+def test_engine_shares_one_fetch_and_evaluates_conditions(aws):
+    cloudwatch = boto3.client('cloudwatch', region_name='us-east-1')
+    now = datetime.utcnow()
+    for function, count in (('busy-fn', 40.0), ('quiet-fn', 2.0)):
+        cloudwatch.put_metric_data(Namespace='AWS/Lambda', MetricData=[{
+            'MetricName': 'Invocations',
+            'Dimensions': [{'Name': 'FunctionName', 'Value': function}],
+            'Timestamp': now - timedelta(days=1),
+            'Value': count
+        }])
+    inventory = Inventory()
+    inventory.add('lambda_function', 'busy-fn')
+    inventory.add('lambda_function', 'quiet-fn')
+
+    result = run_detectors(
+        [BusyFunctions(), QuietFunctions()], ClientCache(boto3.session.Session(region_name='us-east-1')),
+        '123456789012', 'us-east-1', lambda kind: inventory
+    )
+
+    assert result['errors'] == {}
+    assert result['metric_queries'] == 2
+    assert set(result['detector_seconds']) == {'busy', 'quiet'}
+    assert result['fetch_seconds'] >= 0
+    assert sorted((f['detector'], f['resource_id']) for f in result['findings']) == [
+        ('busy', 'busy-fn'), ('quiet', 'quiet-fn')
+    ]
+
+
+def test_engine_isolates_failed_inventories_and_detectors(aws):
+    class Broken(BusyFunctions):
+        name = 'broken'
+        inventory = ['ebs_volume']
+        metrics = []
+
+        def evaluate(self, data):
+            raise RuntimeError('boom')
+
+    def load_inventory(kind):
+        if kind == 'lambda_function':
+            raise RuntimeError('AccessDenied')
+        return Inventory()
+
+    result = run_detectors(
+        [BusyFunctions(), Broken()], ClientCache(boto3.session.Session(region_name='us-east-1')),
+        '123456789012', 'us-east-1', load_inventory
+    )
+
+    assert result['findings'] == []
+    assert result['errors'] == {
+        'busy': 'lambda_function inventory unavailable: AccessDenied',
+        'broken': 'boom'
+    }
+    # Detectors that could not run have no time; failed ones are still timed
+    assert set(result['detector_seconds']) == {'broken'}
+
+
+def test_untagged_findings_come_from_the_tag_index():
+    inventory = Inventory()
+    inventory.add('ebs_volume', 'vol-1', tags={'Environment': 'prod', 'Owner': 'a', 'Project': 'x'})
+    inventory.add('ebs_volume', 'vol-2', tags={'Owner': 'a'})
+    empty = Inventory()
+    data = engine.ScanData(None, '123456789012', 'us-east-1', {
+        'ec2_instance': empty, 'ebs_volume': inventory, 'rds': empty, 'lambda_function': empty
+    }, {}, datetime.utcnow())
+    detector = UntaggedResources()
+    detector.required_tags = ['Environment', 'Owner', 'Project']
+
+    findings = detector.evaluate(data)
+
+    assert [(f['resource_id'], f['resource_type'], f['missing_tags']) for f in findings] == [
+        ('vol-2', 'ebs_untagged', str(['Environment', 'Project']))
+    ]
@@ -0,0 +1,107 @@
+"""Sharded scan planning and merging, including the Distributed Map result manifest"""
+import json
+
+import boto3
+import pytest
+
+import fanout
+
+SCAN = {'scan_date': '2026-03-01', 'scan_timestamp': '2026-03-01T00:00:00', 'scan_hour': '00:00'}
+
+
+def chunk_result(region, part, total, idle, **extra):
+    return {'account_id': '123456789012', 'region': region, 'part': part, 'total_instances': total,
+            'idle_instances': idle, 'written': total, 'failed': 0, 'rollups_written': 1, 'rollups_failed': 0, **extra}
+
+
+def test_plan_chunks_inline_covers_every_instance(aws):
+    ec2 = boto3.client('ec2', region_name='us-east-1')
+    image_id = ec2.describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+    ec2.run_instances(ImageId=image_id, MinCount=5, MaxCount=5, InstanceType='t3.micro')
+
+    plan = fanout.plan_chunks({'regions': ['us-east-1']}, inline=True)
+
+    assert plan['failed_targets'] == {}
+    assert plan['total_instances'] == 5
+    assert sum(len(chunk['rows']['resource_id']) for chunk in plan['chunks']) == 5
+    assert all(chunk['region'] == 'us-east-1' for chunk in plan['chunks'])
+
+
+def test_merge_results_sums_chunks_and_reports_failures():
+    plan = {
+        'scan': SCAN,
+        'total_instances': 30,
+        'failed_targets': {'123456789012/ap-south-1': 'AccessDenied'},
+        'results': [
+            chunk_result('us-east-1', 0, 10, 2, metric_fetch={'calls': 1}),
+            chunk_result('us-east-1', 1, 15, 3, metric_fetch={'calls': 2}),
+            {'account_id': '123456789012', 'region': 'eu-west-1', 'part': 0, 'error': 'timeout'}
+        ]
+    }
+
+    response = fanout.merge_results(plan)
+    body = json.loads(response['body'])
+
+    assert response['statusCode'] == 200
+    assert (body['total_instances'], body['idle_instances'], body['stored_in_dynamodb']) == (25, 5, 25)
+    assert body['metric_fetch'] == {'calls': 3}
+    assert body['failed_chunks'] == [{'account_id': '123456789012', 'region': 'eu-west-1', 'part': 0, 'error': 'timeout'}]
+    assert body['accounts']['123456789012']['us-east-1'] == {'total_instances': 25, 'idle_instances': 5, 'chunks': 2}
+
+
+def test_merge_results_fails_when_every_chunk_failed():
+    plan = {'scan': SCAN, 'results': [{'account_id': 'a', 'region': 'r', 'part': 0, 'error': 'boom'}]}
+
+    assert fanout.merge_results(plan)['statusCode'] == 500
+
+
+@pytest.fixture
+def results_bucket(aws):
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='map-results')
+
+    def put(key, body):
+        s3.put_object(Bucket='map-results', Key=key, Body=json.dumps(body).encode('utf-8'))
+
+    return s3, put
+
+
+def test_load_map_results_reads_succeeded_and_failed_executions(results_bucket):
+    s3, put = results_bucket
+    failed_chunk = {'account_id': '123456789012', 'region': 'eu-west-1', 'part': 3, 'instance_count': 7}
+    put('map-runs/run/SUCCEEDED_0.json', [
+        {'Status': 'SUCCEEDED', 'Input': '{}', 'Output': json.dumps(chunk_result('us-east-1', 0, 10, 2))}
+    ])
+    put('map-runs/run/FAILED_0.json', [
+        {'Status': 'FAILED', 'Input': json.dumps({'scan': SCAN, 'chunk': failed_chunk}), 'Error': 'States.Timeout', 'Cause': 'task timed out'}
+    ])
+    put('map-runs/run/manifest.json', {
+        'DestinationBucket': 'map-results',
+        'ResultFiles': {
+            'SUCCEEDED': [{'Key': 'map-runs/run/SUCCEEDED_0.json', 'Size': 1}],
+            'FAILED': [{'Key': 'map-runs/run/FAILED_0.json', 'Size': 1}],
+            'PENDING': []
+        }
+    })
+
+    results = fanout.load_map_results(s3, 'map-results', 'map-runs/run/manifest.json')
+
+    assert results == [
+        chunk_result('us-east-1', 0, 10, 2),
+        {'account_id': '123456789012', 'region': 'eu-west-1', 'part': 3, 'error': 'task timed out'}
+    ]
+
+
+def test_merge_handler_loads_results_from_s3(results_bucket, monkeypatch):
+    s3, put = results_bucket
+    put('m/SUCCEEDED_0.json', [{'Status': 'SUCCEEDED', 'Output': json.dumps(chunk_result('us-east-1', 0, 4, 1))}])
+    put('m/manifest.json', {'ResultFiles': {'SUCCEEDED': [{'Key': 'm/SUCCEEDED_0.json'}]}})
+    monkeypatch.setattr(fanout.clients, 'get', lambda service, region=None: s3)
+
+    response = fanout.merge_handler({
+        'scan': SCAN,
+        'total_instances': 4,
+        'results_location': {'bucket': 'map-results', 'manifest_key': 'm/manifest.json'}
+    }, None)
+
+    assert json.loads(response['body'])['total_instances'] == 4
@@ -0,0 +1,36 @@
+"""Typed DataFrame construction from DynamoDB items"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frames import SCAN_SCHEMA, items_to_frame
+
+ITEMS = [
+    {'scan_date': '2026-03-01', 'scan_timestamp': '2026-03-01T00:00:00', 'instance_id': 'i-1', 'region': 'us-east-1',
+     'avg_cpu': Decimal('1.25'), 'is_idle': True, 'tags': {'Owner': 'a'}},
+    {'scan_date': '2026-03-01', 'scan_timestamp': '2026-03-01T06:00:00', 'instance_id': 'i-2', 'region': 'eu-west-1',
+     'avg_cpu': Decimal('42'), 'is_idle': False},
+    {'scan_date': '2026-03-02', 'scan_timestamp': '2026-03-02T00:00:00', 'instance_id': 'i-1', 'region': 'us-east-1',
+     'avg_cpu': Decimal('0.000001'), 'is_idle': True}
+]
+
+
+
+def test_items_to_frame_converts_decimals_once():
+    df = items_to_frame(ITEMS, SCAN_SCHEMA)
+
+    assert df['avg_cpu'].dtype == np.float32
+    assert df['avg_cpu'].tolist() == pytest.approx([1.25, 42.0, 0.000001])
+    assert df['is_idle'].tolist() == [True, False, True]
+    assert isinstance(df['region'].dtype, pd.CategoricalDtype)
+    # Compound values outside the schema are stringified
+    assert df['tags'][0] == "{'Owner': 'a'}"
+
+
+def test_columns_missing_from_some_items_become_nan():
+    df = items_to_frame([{'avg_cpu': Decimal('1')}, {'instance_id': 'i-1'}], SCAN_SCHEMA)
+
+    assert list(df.columns) == ['instance_id', 'avg_cpu']
+    assert np.isnan(df['avg_cpu'][1])
@@ -0,0 +1,106 @@
+"""Parquet history cache: closed days are read once, open days are refreshed"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import boto3
+import pytest
+
+import history_cache
+from conftest import create_table
+from frames import SCAN_SCHEMA
+from history_cache import load_history
+
+TODAY = datetime.utcnow().date()
+CLOSED_DAY = TODAY - timedelta(days=5)
+
+
+@pytest.fixture
+def scans(dynamodb, tmp_path, monkeypatch):
+    monkeypatch.setattr(history_cache, 'CACHE_DIR', str(tmp_path))
+    table = create_table(dynamodb, 'CostOptimizerScans', 'scan_date', 'scan_timestamp')
+    for day in (CLOSED_DAY, TODAY):
+        put_scan(table, day, 'i-1', 2.5)
+    return table
+
+
+def put_scan(table, day: date, instance_id: str, avg_cpu: float):
+    table.put_item(Item={
+        'scan_date': str(day),
+        'scan_timestamp': f"{day}T00:00:00#{instance_id}",
+        'instance_id': instance_id,
+        'region': 'us-east-1',
+        'avg_cpu': Decimal(str(avg_cpu)),
+        'is_idle': avg_cpu < 5
+    })
+
+
+@pytest.fixture(params=['resource', 'wire'])
+def client(request, scans):
+    return boto3.client('dynamodb', region_name='us-east-1') if request.param == 'wire' else None
+
+
+def test_closed_days_are_served_from_the_cache(scans, client):
+    load_history(scans, CLOSED_DAY, TODAY, client=client)
+    put_scan(scans, CLOSED_DAY, 'i-late', 1.0)
+    put_scan(scans, TODAY, 'i-new', 1.0)
+
+    df = load_history(scans, CLOSED_DAY, TODAY, client=client)
+
+    # The closed day is not fetched again; today is
+    assert sorted(df.loc[df['scan_date'] == str(CLOSED_DAY), 'instance_id']) == ['i-1']
+    assert sorted(df.loc[df['scan_date'] == str(TODAY), 'instance_id']) == ['i-1', 'i-new']
+
+
+def test_empty_closed_days_are_marked_and_not_refetched(scans, client):
+    empty_day = CLOSED_DAY - timedelta(days=1)
+    assert load_history(scans, empty_day, empty_day, client=client).empty
+
+    put_scan(scans, empty_day, 'i-late', 1.0)
+
+    assert load_history(scans, empty_day, empty_day, client=client).empty
+
+
+def test_columns_and_schema_are_applied(scans, client):
+    df = load_history(scans, CLOSED_DAY, TODAY, columns=['instance_id', 'avg_cpu', 'missing'], schema=SCAN_SCHEMA, client=client)
+
+    assert list(df.columns) == ['instance_id', 'avg_cpu']
+    assert str(df['avg_cpu'].dtype) == 'float32'
+    assert df['avg_cpu'].tolist() == [2.5, 2.5]
+
+
+def test_days_with_different_columns_unify(scans, client):
+    scans.put_item(Item={
+        'scan_date': str(CLOSED_DAY - timedelta(days=1)),
+        'scan_timestamp': 'x',
+        'instance_id': 'i-old',
+        'avg_cpu': Decimal('1'),
+        'instance_name': 'legacy'
+    })
+
+    df = load_history(scans, CLOSED_DAY - timedelta(days=1), TODAY, client=client)
+
+    assert len(df) == 3
+    assert df['instance_name'].notna().sum() == 1
+
+
+def test_days_with_conflicting_column_types_unify(scans, client):
+    older_day = CLOSED_DAY - timedelta(days=1)
+    scans.put_item(Item={
+        'scan_date': str(older_day),
+        'scan_timestamp': 'x',
+        'instance_id': 'i-old',
+        'avg_cpu': Decimal('1'),
+        'launch_time': 'unknown'
+    })
+    scans.put_item(Item={
+        'scan_date': str(CLOSED_DAY),
+        'scan_timestamp': 'y',
+        'instance_id': 'i-new',
+        'avg_cpu': Decimal('1'),
+        'launch_time': Decimal('1767225600')
+    })
+
+    df = load_history(scans, older_day, TODAY, columns=['instance_id', 'launch_time'], client=client)
+
+    assert len(df) == 4
+    assert sorted(df['launch_time'].dropna().tolist()) == ['1767225600', 'unknown']
@@ -0,0 +1,80 @@
+"""Idle instance-hours read from the date-partitioned IdleScansIndex"""
+import importlib.util
+import os
+from datetime import date
+
+import pytest
+
+from conftest import REPO_DIR
+
+# The scanner's handler.py wins the module name, so load the cost analyzer's by path
+_spec = importlib.util.spec_from_file_location(
+    'cost_analyzer_handler', os.path.join(REPO_DIR, 'lambda', 'cost_analyzer', 'handler.py')
+)
+cost_handler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(cost_handler)
+
+
+@pytest.fixture
+def scans_table(dynamodb):
+    return dynamodb.create_table(
+        TableName='CostOptimizerScans',
+        KeySchema=[
+            {'AttributeName': 'scan_date', 'KeyType': 'HASH'},
+            {'AttributeName': 'scan_id', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'scan_date', 'AttributeType': 'S'},
+            {'AttributeName': 'scan_id', 'AttributeType': 'S'},
+            {'AttributeName': 'idle_key', 'AttributeType': 'S'},
+            {'AttributeName': 'scan_timestamp', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': cost_handler.IDLE_SCANS_INDEX,
+            'KeySchema': [
+                {'AttributeName': 'idle_key', 'KeyType': 'HASH'},
+                {'AttributeName': 'scan_timestamp', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST'
+    )
+
+
+def put_scan(table, day: str, instance_id: str, is_idle: bool, instance_type: str = 't3.micro'):
+    item = {
+        'scan_date': day,
+        'scan_id': f"{instance_id}#{day}T00:00:00",
+        'scan_timestamp': f"{day}T00:00:00",
+        'region': 'us-east-1',
+        'instance_id': instance_id,
+        'instance_type': instance_type,
+        'is_idle': is_idle
+    }
+    if is_idle:
+        item['idle_key'] = day
+    table.put_item(Item=item)
+
+
+def test_idle_hours_sum_each_day_in_window(scans_table):
+    put_scan(scans_table, '2026-03-01', 'i-1', True)
+    put_scan(scans_table, '2026-03-02', 'i-1', True)
+    put_scan(scans_table, '2026-03-02', 'i-2', True, 'm5.large')
+    put_scan(scans_table, '2026-03-02', 'i-3', False)
+    # Outside the half-open window
+    put_scan(scans_table, '2026-02-28', 'i-1', True)
+    put_scan(scans_table, '2026-03-03', 'i-1', True)
+
+    idle_hours = cost_handler.get_idle_hours_by_type(date(2026, 3, 1), date(2026, 3, 3))
+
+    hours = cost_handler.SCAN_INTERVAL_HOURS
+    assert idle_hours == {
+        ('us-east-1', 't3.micro'): 2 * hours,
+        ('us-east-1', 'm5.large'): hours
+    }
+
+
+def test_empty_window_reads_nothing(scans_table):
+    put_scan(scans_table, '2026-03-01', 'i-1', True)
+
+    assert cost_handler.get_idle_hours_by_type(date(2026, 3, 1), date(2026, 3, 1)) == {}
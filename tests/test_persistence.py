@@ -0,0 +1,123 @@
+"""BatchWriter / write_items / get_items against a moto table"""
+import pytest
+from botocore.exceptions import ClientError
+
+from common import persistence
+from common.persistence import BatchWriter, get_items, write_items
+from conftest import create_table
+
+
+class FlakyClient:
+    """
+    Wraps a DynamoDB client so the first calls leave items unprocessed or
+    throttle, then passes requests through to moto.
+    """
+
+    def __init__(self, client, unprocessed=(), throttles=0, error_code='ProvisionedThroughputExceededException'):
+        self.client = client
+        self.unprocessed = list(unprocessed)
+        self.throttles = throttles
+        self.error_code = error_code
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):
+        (table_name, requests), = RequestItems.items()
+        self.calls.append(len(requests))
+
+        if self.throttles:
+            self.throttles -= 1
+            raise ClientError({'Error': {'Code': self.error_code, 'Message': 'slow down'}}, 'BatchWriteItem')
+
+        keep = self.unprocessed.pop(0) if self.unprocessed else 0
+        written, left = requests[:len(requests) - keep], requests[len(requests) - keep:]
+        if written:
+            self.client.batch_write_item(RequestItems={table_name: written})
+        return {'UnprocessedItems': {table_name: left} if left else {}}
+
+
+@pytest.fixture
+def table(dynamodb):
+    return create_table(dynamodb, 'Items', 'pk')
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(persistence.time, 'sleep', delays.append)
+    return delays
+
+
+def items(count):
+    return [{'pk': f"item-{index:03d}", 'value': index} for index in range(count)]
+
+
+def stored_keys(table):
+    return sorted(item['pk'] for item in table.scan()['Items'])
+
+
+def test_write_items_batches_by_25(table):
+    counts = write_items(table, items(60))
+
+    assert counts == {'written': 60, 'failed': 0}
+    assert len(stored_keys(table)) == 60
+
+
+def test_unprocessed_items_are_retried_until_written(table, sleeps):
+    writer = BatchWriter(table)
+    writer.client = FlakyClient(table.meta.client, unprocessed=[10, 3])
+
+    with writer:
+        for item in items(25):
+            writer.put(item)
+
+    # Only the unprocessed items are re-sent
+    assert writer.client.calls == [25, 10, 3]
+    assert writer.counts() == {'written': 25, 'failed': 0}
+    assert stored_keys(table) == [item['pk'] for item in items(25)]
+    assert len(sleeps) == 2
+
+
+def test_unprocessed_items_fail_after_max_attempts(table, sleeps):
+    writer = BatchWriter(table, max_attempts=3)
+    writer.client = FlakyClient(table.meta.client, unprocessed=[5, 5, 5])
+
+    with writer:
+        for item in items(20):
+            writer.put(item)
+
+    assert writer.client.calls == [20, 5, 5]
+    assert writer.counts() == {'written': 15, 'failed': 5}
+    # No sleep after the last attempt
+    assert len(sleeps) == 2
+
+
+def test_backoff_is_exponential_with_full_jitter(table, sleeps, monkeypatch):
+    monkeypatch.setattr(persistence.random, 'uniform', lambda low, high: high)
+    writer = BatchWriter(table, max_attempts=8, base_delay=0.05, max_delay=0.3)
+    writer.client = FlakyClient(table.meta.client, throttles=5)
+
+    with writer:
+        writer.put({'pk': 'a'})
+
+    assert sleeps == [0.05, 0.1, 0.2, 0.3, 0.3]
+    assert writer.counts() == {'written': 1, 'failed': 0}
+
+
+def test_non_retryable_errors_fail_the_batch(table, sleeps):
+    writer = BatchWriter(table)
+    writer.client = FlakyClient(table.meta.client, throttles=1, error_code='ValidationException')
+
+    with writer:
+        writer.put({'pk': 'a'})
+
+    assert writer.client.calls == [1]
+    assert writer.counts() == {'written': 0, 'failed': 1}
+    assert sleeps == []
+
+
+def test_get_items_reads_more_than_100_keys(table):
+    write_items(table, items(150))
+
+    found = get_items(table, [{'pk': f"item-{index:03d}"} for index in range(0, 160, 2)])
+
+    assert len(found) == 75
@@ -0,0 +1,121 @@
+"""Day and per-instance rollups written by the scanner and summarized by the readers"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import create_table
+from dynamo_reader import SKETCH_PRECISION as READER_PRECISION
+from dynamo_reader import (
+    ROLLUP_INSTANCES_PREFIX, add_to_sketch, estimate_distinct, is_rolled_up, merge_sketch_entries, new_sketch,
+    raw_scan_days, read_rollups, summarize_instance_rollups, summarize_rollups
+)
+from handler import get_scan_time
+from rollups import INSTANCE_SHARDS, SKETCH_PRECISION, RollupAccumulator, sketch_entries
+
+DAY = '2026-03-01'
+
+
+@pytest.fixture
+def table(dynamodb):
+    return create_table(dynamodb, 'CostOptimizerRollups', 'rollup_date', 'rollup_key')
+
+
+def scan(table, timestamp, samples, chunk=None):
+    """Roll up one scan of (instance_id, cpu, idle) samples"""
+    rollups = RollupAccumulator(table, DAY, timestamp, '123456789012', 'us-east-1', chunk=chunk)
+    for instance_id, cpu, idle in samples:
+        rollups.add(instance_id, cpu, idle, f"name-{instance_id}", 't3.micro')
+    rollups.flush()
+    return rollups
+
+
+def instance_totals(table):
+    return summarize_instance_rollups(read_rollups(table, date(2026, 3, 1), date(2026, 3, 1), prefix=ROLLUP_INSTANCES_PREFIX))
+
+
+def test_instance_rollups_accumulate_across_scans(table):
+    scan(table, f"{DAY}T00:00:00", [('i-1', 2.0, True), ('i-2', 50.0, False)])
+    scan(table, f"{DAY}T06:00:00", [('i-1', 4.0, True)])
+
+    totals = instance_totals(table)
+
+    assert totals['i-1'] == {
+        'name': 'name-i-1', 'type': 't3.micro', 'scan_count': 2, 'idle_count': 2,
+        'cpu_sum': 6.0, 'cpu_min': 2.0, 'cpu_max': 4.0
+    }
+    assert totals['i-2']['scan_count'] == 1 and totals['i-2']['idle_count'] == 0
+
+
+def test_repeated_scan_is_not_counted_twice(table):
+    samples = [(f"i-{n}", 1.0, True) for n in range(40)]
+    scan(table, f"{DAY}T00:00:00", samples)
+
+    retried = scan(table, f"{DAY}T00:00:00", samples)
+
+    assert retried.failed == 0
+    assert sum(t['scan_count'] for t in instance_totals(table).values()) == 40
+    day = summarize_rollups(read_rollups(table, date(2026, 3, 1), date(2026, 3, 1)))[DAY]
+    assert day['scan_count'] == 40
+
+
+def test_concurrent_chunks_merge_into_shared_shard_rows(table):
+    chunks = [[(f"i-{chunk}-{n}", 1.0, False) for n in range(30)] for chunk in range(6)]
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda c: scan(table, f"{DAY}T00:00:00", chunks[c], chunk=str(c)), range(6)))
+
+    assert sum(r.failed for r in results) == 0
+    totals = instance_totals(table)
+    assert len(totals) == 180
+    assert all(t['scan_count'] == 1 for t in totals.values())
+    rows = read_rollups(table, date(2026, 3, 1), date(2026, 3, 1), prefix=ROLLUP_INSTANCES_PREFIX)
+    # Each chunk writes its own shard rows
+    assert all(row['rollup_key'].count('#') == 4 for row in rows)
+    assert len(rows) <= INSTANCE_SHARDS * 6
+
+
+def test_raw_scans_are_only_needed_before_the_first_rollup(table):
+    scan(table, f"{DAY}T06:00:00", [('i-1', 1.0, True), ('i-2', 1.0, True)])
+    rows = read_rollups(table, date(2026, 2, 28), date(2026, 3, 1), prefix=ROLLUP_INSTANCES_PREFIX)
+
+    raw_days = raw_scan_days(rows, date(2026, 2, 28), date(2026, 3, 1))
+
+    assert raw_days == {'2026-02-28': {}, DAY: {('123456789012', 'us-east-1'): f"{DAY}T06:00:00"}}
+    earlier = {'account_id': '123456789012', 'region': 'us-east-1', 'scan_timestamp': f"{DAY}T00:00:00"}
+    assert not is_rolled_up(earlier, raw_days[DAY])
+    assert is_rolled_up(dict(earlier, scan_timestamp=f"{DAY}T06:00:00"), raw_days[DAY])
+
+
+def test_scan_time_comes_from_the_event():
+    assert get_scan_time({'time': '2026-03-01T06:00:00Z'}) == datetime(2026, 3, 1, 6, 0)
+    assert abs((get_scan_time({}) - datetime.utcnow()).total_seconds()) < 5
+
+
+def test_summarize_rollups_decodes_decimals_and_merges_sketches():
+    sketch_a, sketch_b = new_sketch(), new_sketch()
+    add_to_sketch(sketch_a, [f"i-{n}" for n in range(300)])
+    add_to_sketch(sketch_b, [f"i-{n}" for n in range(200, 500)])
+    rows = [
+        {'rollup_date': '2026-03-01', 'scan_count': Decimal('3'), 'idle_count': Decimal('1'), 'cpu_sum': Decimal('7.5'),
+         'cpu_min': Decimal('0.5'), 'cpu_max': Decimal('5'), 'instance_sketch': {Decimal(r * 64 + k) for r, k in enumerate(sketch_a) if k}},
+        {'rollup_date': '2026-03-01', 'scan_count': Decimal('2'), 'idle_count': Decimal('2'), 'cpu_sum': Decimal('1'),
+         'cpu_min': Decimal('0.25'), 'cpu_max': Decimal('0.75'), 'instance_sketch': {Decimal(r * 64 + k) for r, k in enumerate(sketch_b) if k}}
+    ]
+
+    day = summarize_rollups(rows)['2026-03-01']
+
+    assert (day['scan_count'], day['idle_count'], day['cpu_sum']) == (5, 3, 8.5)
+    assert (day['cpu_min'], day['cpu_max']) == (0.25, 5.0)
+    assert estimate_distinct(day['sketch']) == pytest.approx(500, rel=0.05)
+
+
+def test_dashboard_sketch_hashes_like_the_scanner():
+    ids = [f"i-{n:017x}" for n in range(1000)]
+    from_scanner, from_dashboard = new_sketch(), new_sketch()
+    merge_sketch_entries(from_scanner, sketch_entries(ids))
+    add_to_sketch(from_dashboard, ids)
+
+    assert SKETCH_PRECISION == READER_PRECISION
+    assert from_scanner == from_dashboard
@@ -0,0 +1,67 @@
+"""Decoding wire-format DynamoDB attributes straight into typed columns"""
+from decimal import Decimal
+
+import boto3
+import numpy as np
+import pandas as pd
+
+from conftest import create_table
+from frames import SCAN_SCHEMA, items_to_frame
+from wire_reader import _MISSING, decode_column, decode_pages, read_days_frame, wire_kind
+
+ITEMS = [
+    {'scan_date': '2026-03-01', 'scan_timestamp': '2026-03-01T00:00:00', 'instance_id': 'i-1', 'region': 'us-east-1',
+     'avg_cpu': Decimal('1.25'), 'is_idle': True, 'tags': {'Owner': 'a'}},
+    {'scan_date': '2026-03-01', 'scan_timestamp': '2026-03-01T06:00:00', 'instance_id': 'i-2', 'region': 'eu-west-1',
+     'avg_cpu': Decimal('42'), 'is_idle': False},
+    {'scan_date': '2026-03-02', 'scan_timestamp': '2026-03-02T00:00:00', 'instance_id': 'i-1', 'region': 'us-east-1',
+     'avg_cpu': Decimal('0.000001'), 'is_idle': True}
+]
+
+
+def test_decode_numbers_with_missing_values():
+    values = decode_column([{'N': '1.5'}, _MISSING, {'N': '-2'}, {'NULL': True}], 'float64')
+
+    assert values.dtype == np.float64
+    assert values[0] == 1.5 and values[2] == -2.0
+    assert np.isnan(values[1]) and np.isnan(values[3])
+
+
+def test_decode_bools_strings_and_compound_values():
+    assert decode_column([{'BOOL': True}, {'BOOL': False}, _MISSING], 'bool').tolist() == [True, False, False]
+    assert decode_column([{'S': 'a'}, _MISSING, {'N': '3'}, {'M': {'k': {'S': 'v'}}}]).tolist() == ['a', None, '3', "{'k': 'v'}"]
+
+
+def test_wire_kind_from_tags():
+    assert wire_kind([{'N': '1'}, _MISSING]) == 'float64'
+    assert wire_kind([{'BOOL': True}]) == 'bool'
+    assert wire_kind([{'N': '1'}, {'S': 'x'}]) == 'string'
+    assert wire_kind([_MISSING, {'NULL': True}]) == 'null'
+
+
+def test_decode_pages_backfills_columns_that_appear_later():
+    pages = [
+        [{'instance_id': {'S': 'i-1'}}],
+        [{'instance_id': {'S': 'i-2'}, 'avg_cpu': {'N': '3.5'}}]
+    ]
+
+    df = decode_pages(pages, schema={'avg_cpu': 'float32'})
+
+    assert list(df.columns) == ['avg_cpu', 'instance_id']
+    assert df['avg_cpu'].dtype == np.float32
+    assert np.isnan(df['avg_cpu'][0]) and df['avg_cpu'][1] == 3.5
+
+
+def test_wire_path_matches_resource_path(dynamodb):
+    table = create_table(dynamodb, 'Scans', 'scan_date', 'scan_timestamp')
+    for item in ITEMS:
+        table.put_item(Item=item)
+    client = boto3.client('dynamodb', region_name='us-east-1')
+    columns = ['scan_date', 'instance_id', 'region', 'avg_cpu', 'is_idle']
+
+    wire = read_days_frame(client, 'Scans', ['2026-03-01', '2026-03-02'], columns=columns, schema=SCAN_SCHEMA)
+    resource = items_to_frame(table.scan()['Items'], SCAN_SCHEMA, columns=[c for c in SCAN_SCHEMA if c in columns])
+
+    wire = wire.sort_values('scan_date', kind='stable').reset_index(drop=True)
+    resource = resource.sort_values('scan_date', kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(wire, resource, check_categorical=False)